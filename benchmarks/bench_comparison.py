@@ -0,0 +1,48 @@
+"""
+Micro-benchmark of getCoreGPR for reactions with wide isozyme GPRs in 8
+models, computed for every core size like in table_reactions_confidence.
+Run with `python benchmarks/bench_comparison.py`.
+"""
+
+import operator
+import random
+import time
+
+from gemsembler.comparison import getCoreGPR, getGPRClauseSupport
+
+
+def make_gprs(n_sources: int, n_isozymes: int, n_genes: int):
+    """GPR of every source as 'or' of n_isozymes single genes and complexes."""
+    genes = [f"G{i:04d}" for i in range(n_genes)]
+    gprs = {}
+    for i in range(n_sources):
+        gene_ands = []
+        for _ in range(n_isozymes):
+            complex_genes = sorted(random.sample(genes, random.choice([1, 1, 2, 3])))
+            if len(complex_genes) > 1:
+                gene_ands.append("(" + " and ".join(complex_genes) + ")")
+            else:
+                gene_ands.append(complex_genes[0])
+        gprs[f"model{i}"] = [" or ".join(gene_ands)]
+    return gprs
+
+
+def main():
+    random.seed(0)
+    sources = [f"model{i}" for i in range(8)]
+    for n_isozymes in [2, 5, 10, 20]:
+        reactions = [make_gprs(8, n_isozymes, 3 * n_isozymes) for _ in range(100)]
+        getGPRClauseSupport.cache_clear()
+        start = time.perf_counter()
+        for gprs in reactions:
+            for core_size in range(len(sources), 0, -1):
+                getCoreGPR(gprs, core_size, operator.ge, sources, False)
+        run_time = time.perf_counter() - start
+        print(
+            f"{n_isozymes} isozymes per model: "
+            f"{run_time / len(reactions) * 1000:.2f}ms per reaction for all core sizes"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Benchmark of get_locus_tag_genes on synthetic NCBI assemblies of growing
+size. Time per gene should stay constant. Run with
+`python benchmarks/bench_genes.py`.
+"""
+
+import gzip
+import random
+import tempfile
+import time
+from pathlib import Path
+
+import pandas as pd
+
+from gemsembler.genes import get_locus_tag_genes
+
+
+def make_assembly(path: Path, n_genes: int):
+    """Writing CDS and protein fasta files and feature table for n_genes."""
+    rows = []
+    with gzip.open(path / "cds.fna.gz", "wt") as cds, gzip.open(
+        path / "protein.faa.gz", "wt"
+    ) as proteins:
+        for i in range(n_genes):
+            locus_tag = f"ABC_{i:05d}"
+            protein_id = f"WP_{i:09d}.1"
+            cds.write(f">lcl|NZ_CP000001.1_cds_{protein_id}_{i} ")
+            cds.write(f"[locus_tag={locus_tag}] [protein_id={protein_id}]\n")
+            cds.write("".join(random.choices("ACGT", k=900)) + "\n")
+            proteins.write(f">{protein_id} hypothetical protein\n")
+            proteins.write("".join(random.choices("ACDEFGHIKLMNPQRSTVWY", k=300)))
+            proteins.write("\n")
+            rows.append(["gene", locus_tag, None, f"old_locus_tag=OLD_{i:05d}"])
+            rows.append(["CDS", locus_tag, protein_id, None])
+    pd.DataFrame(
+        rows, columns=["# feature", "locus_tag", "product_accession", "attributes"]
+    ).to_csv(path / "feature_table.txt.gz", sep="\t", index=False)
+
+
+def main():
+    random.seed(0)
+    for n_genes in [1000, 2000, 4000, 8000]:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp)
+            make_assembly(path, n_genes)
+            start = time.perf_counter()
+            get_locus_tag_genes(
+                path / "cds.fna.gz",
+                path / "protein.faa.gz",
+                path / "feature_table.txt.gz",
+                path / "final_nt.fna",
+                path / "final_aa.faa",
+                True,
+            )
+            run_time = time.perf_counter() - start
+        print(
+            f"{n_genes} genes: get_locus_tag_genes {run_time:.3f}s, "
+            f"{run_time / n_genes * 1e6:.1f}us per gene"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+"""
+Benchmark of the selection stage on the bundled LP and BU models. Run with
+`python benchmarks/bench_selection.py`.
+"""
+
+import time
+
+from gemsembler import GatheredModels, bu_example, lp_example
+from gemsembler.selection import checkDBConsistency, run_selection
+
+
+def timeit(func, *args, repeat=5):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func(*args)
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    for name, example in [("LP", lp_example), ("BU", bu_example)]:
+        g = GatheredModels()
+        for model in example:
+            g.add_model(**model)
+        for species, converted in [
+            ("metabolites", g.converted_metabolites),
+            ("reactions", g.converted_reactions),
+        ]:
+            consistency_time = timeit(
+                checkDBConsistency, g.same_db_models, converted, "highest", True
+            )
+            selection_time = timeit(
+                run_selection, g.same_db_models, converted, "highest"
+            )
+            print(
+                f"{name} {species}: checkDBConsistency {consistency_time:.3f}s, "
+                f"run_selection {selection_time:.3f}s"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,18 @@
 from importlib.resources import files
 
+# defined before submodules are imported, as they use it in cache keys
+__version__ = "0.11.16"
+
 from . import data
-from .anticreation import get_model_of_interest, get_models_with_all_confidence_levels
+from .anticreation import (
+    get_model_of_interest,
+    get_models_with_all_confidence_levels,
+    read_levels_matrices,
+    write_levels_matrices,
+)
 from .creation import read_supermodel_from_json
 from .gathering import GatheredModels, load_sbml_model
 
-__version__ = "0.11.16"
-
 
 lp_example = [
     dict(
@@ -1,39 +1,68 @@
+import multiprocessing
+import os
+import sys
 import warnings
+import weakref
+from collections import defaultdict
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor
 from copy import deepcopy
+from functools import lru_cache
 from pathlib import Path
 from pprint import pprint
 
-from cobra import Metabolite, Model, Reaction
-from cobra.io import validate_sbml_model, write_sbml_model
+import numpy
+from cobra import Configuration, Metabolite, Model, Reaction
+from cobra.io import read_sbml_model, validate_sbml_model, write_sbml_model
+from scipy.sparse import csc_matrix, csr_matrix
 
+from .comparison import ComparisonView
 from .creation import NewElement, SuperModel
 
 
+# indexes of transport reactions per supermodel, made once for all levels
+_transport_indexes = weakref.WeakKeyDictionary()
+
+
+def get_transport_index(supermodel: SuperModel) -> dict:
+    """Getting index of supermodel assembly reactions, which transport metabolite
+    between compartments, by pairs of metabolite ids with the same base id. Pair is
+    indexed in both directions, so reactions for (met_e, met_c) are found regardless
+    of whether met_e is reactant or product."""
+    if supermodel not in _transport_indexes:
+        transport_index = defaultdict(dict)
+        for r in supermodel.reactions.assembly.values():
+            rs_pro = [m.id for m in r.products.get("assembly")]
+            for met_react in r.reactants.get("assembly"):
+                for met_pro in rs_pro:
+                    if met_react.id[:-1] == met_pro[:-1]:
+                        transport_index[(met_react.id, met_pro)][r.id] = r
+                        transport_index[(met_pro, met_react.id)][r.id] = r
+        _transport_indexes[supermodel] = dict(transport_index)
+    return _transport_indexes[supermodel]
+
+
 def gapfill_transport_r(cobra_model: Model, supermodel: SuperModel):
-    transport_r = []
+    """Adding transport reactions from supermodel assembly for exchanged metabolites,
+    which are not transported to cytosol in cobra model."""
+    transport_index = get_transport_index(supermodel)
+    transport_r = {}
     for exchange in cobra_model.exchanges:
-        met_e = list(exchange.reactants)[0].id
-        met_c = list(exchange.reactants)[0].id[:-1] + "c"
-        cobra_transport = False
-        for r in cobra_model.metabolites.get_by_id(met_e).reactions:
-            r_react = [m.id for m in r.reactants]
-            r_pro = [m.id for m in r.products]
-            if ((met_e in r_react) & (met_c in r_pro)) | (
-                (met_e in r_pro) & (met_c in r_react)
-            ):
-                cobra_transport = True
-        if not cobra_transport:
-            if met_c in supermodel.metabolites.assembly.keys():
-                for r_super in supermodel.metabolites.assembly.get(met_e).reactions.get(
-                    "assembly"
-                ):
-                    rs_react = [m.id for m in r_super.reactants.get("assembly")]
-                    rs_pro = [m.id for m in r_super.products.get("assembly")]
-                    if ((met_e in rs_react) & (met_c in rs_pro)) | (
-                        (met_e in rs_pro) & (met_c in rs_react)
-                    ):
-                        transport_r.append(r_super)
-    for tr in list(set(transport_r)):
+        met_e = list(exchange.reactants)[0]
+        met_c = met_e.id[:-1] + "c"
+        if met_c in cobra_model.metabolites:
+            met_c = cobra_model.metabolites.get_by_id(met_c)
+            cobra_transport = any(
+                r.metabolites[met_e] * r.metabolites[met_c] < 0
+                for r in met_e.reactions & met_c.reactions
+            )
+            if cobra_transport:
+                continue
+            met_c = met_c.id
+        transport_r.update(transport_index.get((met_e.id, met_c), {}))
+    transport_mets = {}
+    tr_reactions = []
+    for tr in transport_r.values():
         tr_r = Reaction(tr.id)
         if tr.name:
             tr_r.name = tr.name
@@ -47,10 +76,196 @@ def gapfill_transport_r(cobra_model: Model, supermodel: SuperModel):
         tr_r.subsystem = out_subsystem
         tr_r.lower_bound = tr.lower_bound.get("assembly")[0]
         tr_r.upper_bound = tr.upper_bound.get("assembly")[0]
+        tr_metabolites = {}
         for met, k in tr.metabolites.get("assembly").items():
-            tr_met = Metabolite(met.id, name=met.name, compartment=met.id[-1])
-            tr_r.add_metabolites({tr_met: k})
-        cobra_model.add_reactions([tr_r])
+            if met.id not in transport_mets:
+                transport_mets[met.id] = Metabolite(
+                    met.id, name=met.name, compartment=met.id[-1]
+                )
+            tr_metabolites[transport_mets[met.id]] = k
+        tr_r.add_metabolites(tr_metabolites)
+        tr_reactions.append(tr_r)
+    cobra_model.add_reactions(tr_reactions)
+
+
+def get_interest_level(supermodel: SuperModel, interest_level, and_as_solid=False):
+    """Getting level of interest as source model id, "assembly" or comparison view.
+    Comparison levels given by name (like core2) are resolved with
+    SuperModel.get_level_view: levels saved before keep their sources and
+    and_as_solid, other levels are calculated lazily with and_as_solid."""
+    if isinstance(interest_level, ComparisonView):
+        return interest_level
+    if interest_level in supermodel.sources + ["assembly"]:
+        return interest_level
+    return supermodel.get_level_view(interest_level, and_as_solid=and_as_solid)
+
+
+def get_level_attribute(element: NewElement, attr: str, level):
+    """Getting attribute of supermodel element for source model, assembly or
+    comparison view."""
+    if isinstance(level, ComparisonView):
+        return level.get(element, attr)
+    return getattr(element, attr).get(level)
+
+
+class ModelBuilder(object):
+    """Bulk builder of COBRA model from supermodel reactions. Every metabolite is
+    made once and all reactions are added to the model with one add_reactions call,
+    so the solver is populated only once."""
+
+    def __init__(self, model_id: str):
+        self.model = Model(model_id)
+        self.reactions = []
+        self._metabolites = {}
+
+    def get_metabolite(self, met: NewElement) -> Metabolite:
+        if met.id not in self._metabolites:
+            self._metabolites[met.id] = Metabolite(
+                met.id,
+                name=met.name,
+                compartment=met.compartments["assembly"][0],
+                formula=met.formula_bigg,
+                charge=met.charge_bigg,
+            )
+        return self._metabolites[met.id]
+
+    def get_metabolites(self, metabolites: dict) -> dict:
+        """Getting metabolites with not zero coefficients like in cobra reaction."""
+        return {self.get_metabolite(met): k for met, k in metabolites.items() if k != 0}
+
+    def add_reaction(self, reaction: Reaction):
+        self.reactions.append(reaction)
+
+    def build(self) -> Model:
+        self.model.add_reactions(self.reactions)
+        self.reactions = []
+        return self.model
+
+
+@lru_cache(maxsize=None)
+def get_formula_elements(formula) -> dict:
+    """Getting elements with counts from chemical formula like cobra
+    Metabolite.elements (None if formula can't be parsed). Every formula is parsed
+    once."""
+    return Metabolite("formula", formula=formula).elements
+
+
+class MassBalance(object):
+    """Mass and charge balance of supermodel reactions like cobra
+    Reaction.check_mass_balance. Metabolites are represented as vectors of charge and
+    element counts, so balance of reactions is product of stoichiometric matrix and
+    matrix of metabolite vectors. Balance is calculated at once for all reactions of
+    every source and assembly and once per metabolites with coefficients for other
+    levels."""
+
+    def __init__(self, supermodel: SuperModel):
+        self.tolerance = Configuration().tolerance
+        self.met_index = {}
+        self.no_elements = set()
+        self._columns = {"charge": 0}
+        met_vectors = []
+        level_reactions = {level: [] for level in supermodel.sources + ["assembly"]}
+        for r in supermodel.reactions.assembly.values():
+            for level in r.in_models["models_list"] + ["assembly"]:
+                r_metabolites = {
+                    met.id: k for met, k in r.metabolites[level].items() if k != 0
+                }
+                level_reactions[level].append((r.id, r_metabolites))
+                for met in r.metabolites[level].keys():
+                    if met.id not in self.met_index:
+                        self.met_index[met.id] = len(met_vectors)
+                        met_vectors.append(self.__get_vector(met))
+        self.columns = list(self._columns.keys())
+        self.elements = numpy.zeros((len(met_vectors), len(self.columns)))
+        for i, vector in enumerate(met_vectors):
+            for j, amount in vector.items():
+                self.elements[i, j] = amount
+        # metabolites without elements per level and reaction, like in cobra
+        # error is raised only when balance of the reaction is requested
+        self.errors = defaultdict(dict)
+        self.balances = {
+            level: self.__get_balances(level, reactions)
+            for level, reactions in level_reactions.items()
+        }
+        self._balances = {}
+
+    def __get_vector(self, met: NewElement) -> dict:
+        vector = {}
+        if met.charge_bigg is not None:
+            vector[0] = met.charge_bigg
+        elements = get_formula_elements(met.formula_bigg)
+        if elements is None:
+            self.no_elements.add(met.id)
+        else:
+            for element, amount in elements.items():
+                vector[self._columns.setdefault(element, len(self._columns))] = amount
+        return vector
+
+    def __get_balance(self, values) -> dict:
+        return {
+            self.columns[j]: float(values[j])
+            for j in numpy.flatnonzero(~(numpy.abs(values) <= self.tolerance))
+        }
+
+    def __get_balances(self, level: str, reactions: list) -> dict:
+        # indices of every row are kept in order of reaction metabolites, so values
+        # are summed in the same order as in cobra
+        indptr, indices, data = [0], [], []
+        for r_id, r_metabolites in reactions:
+            for met_id, k in r_metabolites.items():
+                indices.append(self.met_index[met_id])
+                data.append(k)
+            indptr.append(len(indices))
+        stoichiometry = csr_matrix(
+            (numpy.array(data, dtype=float), indices, indptr),
+            shape=(len(reactions), len(self.met_index)),
+        )
+        values = stoichiometry @ self.elements
+        balances = {}
+        for i, (r_id, r_metabolites) in enumerate(reactions):
+            balances[r_id] = self.__get_balance(values[i])
+            for met_id in r_metabolites.keys():
+                if met_id in self.no_elements:
+                    self.errors[level][r_id] = met_id
+                    break
+        return balances
+
+    def get_balance(self, reaction: NewElement, level) -> dict:
+        """Getting balance of reaction in source model, assembly or comparison view."""
+        if isinstance(level, ComparisonView):
+            return self.check_mass_balance(level.get(reaction, "metabolites"))
+        if reaction.id in self.errors[level]:
+            raise ValueError(
+                f"No elements found in metabolite {self.errors[level][reaction.id]}"
+            )
+        return self.balances[level][reaction.id]
+
+    def check_mass_balance(self, metabolites: dict) -> dict:
+        """Calculating balance of supermodel metabolites with coefficients (for
+        comparison levels), results are cached per metabolites with coefficients."""
+        key = tuple((met.id, k) for met, k in metabolites.items() if k != 0)
+        if key not in self._balances:
+            values = numpy.zeros(len(self.columns))
+            for met_id, k in key:
+                if met_id in self.no_elements:
+                    raise ValueError(f"No elements found in metabolite {met_id}")
+                values += k * self.elements[self.met_index[met_id]]
+            self._balances[key] = self.__get_balance(values)
+        return self._balances[key]
+
+
+# mass balance per supermodel, made once for all levels
+_mass_balances = weakref.WeakKeyDictionary()
+
+
+def get_mass_balance(supermodel: SuperModel) -> MassBalance:
+    """Getting mass balance of supermodel, which is made on the first call and
+    reused for all levels while supermodel exists. Balance is not updated, if
+    assembly reactions or metabolites of the same supermodel object are changed
+    after that, changed copy of supermodel (like deepcopy) gets its own balance."""
+    if supermodel not in _mass_balances:
+        _mass_balances[supermodel] = MassBalance(supermodel)
+    return _mass_balances[supermodel]
 
 
 def get_model_of_interest(
@@ -65,57 +280,63 @@ def get_model_of_interest(
     do_balance=True,
     reactions_include: [NewElement] = None,
     reactions_exclude: [NewElement] = None,
+    and_as_solid=False,
+    validate=True,
 ):
     """Creating COBRA model from supermodel based on specific level of interest for example core or union.
-    Additionaly, some reactions"""
+    Additionaly, some reactions. Level of interest can be source model id, assembly, name of comparison level or
+    comparison view. Comparison levels, which were not saved before, are read through comparison views calculated
+    with and_as_solid, supermodel is not changed. If output_name is given, model is written to SBML file, which is read again and validated only if
+    validate is True."""
     if not gene_interest_level:
         gene_interest_level = interest_level
     if not biomass_interest_level:
         biomass_interest_level = interest_level
-    outmodel = Model(interest_level)
+    interest_level = get_interest_level(supermodel, interest_level, and_as_solid)
+    gene_interest_level = get_interest_level(
+        supermodel, gene_interest_level, and_as_solid
+    )
+    biomass_interest_level = get_interest_level(
+        supermodel, biomass_interest_level, and_as_solid
+    )
+    if isinstance(interest_level, ComparisonView):
+        builder = ModelBuilder(interest_level.name)
+        in_reactions = interest_level.reactions.values()
+    else:
+        builder = ModelBuilder(interest_level)
+        in_reactions = getattr(supermodel.reactions, interest_level).values()
+    outmodel = builder.model
     outmodel.notes = {
         "Summary": f"Generated withe GEMsembler supermodel based on models: "
         f"{' '.join(supermodel.sources)}"
     }
     outmodel.notes.update(supermodel.notes)
-    if interest_level in supermodel.sources + ["assembly"]:
-        in_reactions = getattr(supermodel.reactions, interest_level).values()
-    elif interest_level in supermodel.reactions.comparison.keys():
-        in_reactions = supermodel.reactions.comparison[interest_level].values()
-    else:
-        raise ValueError(
-            f"Interest level {interest_level} is not determined yet. "
-            f"Please run corresponding supermodel comparison first."
-        )
+    # reactions are kept in the order of the level, so the model is the same every run
+    in_reactions = {r.id: r for r in in_reactions}
     if reactions_include:
-        in_reactions = list(set(in_reactions) | set(reactions_include))
+        for r in reactions_include:
+            in_reactions.setdefault(r.id, r)
     else:
         reactions_include = []
     if reactions_exclude:
-        in_reactions = list(set(in_reactions) - set(reactions_exclude))
-    if supermodel.reactions.assembly.get("Biomass") in in_reactions:
-        in_reactions = list(
-            set(list(in_reactions)) - {supermodel.reactions.assembly.get("Biomass")}
-        )
-    for r in in_reactions:
+        for r in reactions_exclude:
+            in_reactions.pop(r.id, None)
+    in_reactions.pop("Biomass", None)
+    if do_balance:
+        mass_balance = get_mass_balance(supermodel)
+    for r in in_reactions.values():
         if r in reactions_include:
             interest_level_r = "assembly"
             gene_interest_level_r = "assembly"
         else:
             interest_level_r = interest_level
             gene_interest_level_r = gene_interest_level
-        if interest_level_r in supermodel.sources + ["assembly"]:
-            r_upper_bound = r.upper_bound
-            r_lower_bound = r.lower_bound
-            r_metabolites = r.metabolites
-        else:
-            r_upper_bound = r.upper_bound["comparison"]
-            r_lower_bound = r.lower_bound["comparison"]
-            r_metabolites = r.metabolites["comparison"]
-        if gene_interest_level_r in supermodel.sources + ["assembly"]:
-            r_gene_reaction_rule = r.gene_reaction_rule
-        else:
-            r_gene_reaction_rule = r.gene_reaction_rule["comparison"]
+        r_upper_bound = get_level_attribute(r, "upper_bound", interest_level_r)
+        r_lower_bound = get_level_attribute(r, "lower_bound", interest_level_r)
+        r_metabolites = get_level_attribute(r, "metabolites", interest_level_r)
+        r_gene_reaction_rule = get_level_attribute(
+            r, "gene_reaction_rule", gene_interest_level_r
+        )
         out_reaction = Reaction(r.id)
         out_reaction.name = r.name
         out_subsystem = ""
@@ -124,40 +345,22 @@ def get_model_of_interest(
                 out_subsystem + "#" + source + "#" + r.subsystem.get(source)[0]
             )
         out_reaction.subsystem = out_subsystem
-        if extend_zero_bounds and (
-            r_upper_bound.get(interest_level_r)[0]
-            - r_lower_bound.get(interest_level_r)[0]
-            == 0
-        ):
+        if extend_zero_bounds and (r_upper_bound[0] - r_lower_bound[0] == 0):
             out_reaction.lower_bound = -1000.0
             out_reaction.upper_bound = 1000.0
         else:
-            out_reaction.lower_bound = r_lower_bound.get(interest_level_r)[0]
-            out_reaction.upper_bound = r_upper_bound.get(interest_level_r)[0]
-        for met, k in r_metabolites.get(interest_level_r).items():
-            out_met = Metabolite(
-                met.id,
-                name=met.name,
-                compartment=met.compartments["assembly"][0],
-                formula=met.formula_bigg,
-                charge=met.charge_bigg,
-            )
-            out_reaction.add_metabolites({out_met: k})
-        balance = out_reaction.check_mass_balance()
-        if balance and do_balance:
+            out_reaction.lower_bound = r_lower_bound[0]
+            out_reaction.upper_bound = r_upper_bound[0]
+        out_reaction.add_metabolites(builder.get_metabolites(r_metabolites))
+        if do_balance:
+            balance = mass_balance.get_balance(r, interest_level_r)
+        else:
+            balance = {}
+        if balance:
             only_charge_source = {}
             for source in r.in_models["models_list"]:
-                sr = Reaction(r.id + source)
-                for mm, kk in r.metabolites[source].items():
-                    tmp_met = Metabolite(
-                        mm.id,
-                        name=mm.name,
-                        compartment=mm.compartments["assembly"][0],
-                        formula=mm.formula_bigg,
-                        charge=mm.charge_bigg,
-                    )
-                    sr.add_metabolites({tmp_met: kk})
-                sbalance = sr.check_mass_balance()
+                sr_metabolites = builder.get_metabolites(r.metabolites[source])
+                sbalance = mass_balance.get_balance(r, source)
                 if not sbalance:
                     out_reaction.add_metabolites(
                         {
@@ -165,12 +368,10 @@ def get_model_of_interest(
                             for old_met, old_k in out_reaction.metabolites.items()
                         }
                     )
-                    out_reaction.add_metabolites(
-                        {new_met: new_k for new_met, new_k in sr.metabolites.items()}
-                    )
+                    out_reaction.add_metabolites(sr_metabolites)
                     break
                 if sbalance.keys() == {"charge"}:
-                    only_charge_source[sbalance["charge"]] = sr
+                    only_charge_source[sbalance["charge"]] = sr_metabolites
             if balance == {"charge": -1.0, "H": -1.0}:
                 for hmmet in out_reaction.metabolites.keys():
                     if hmmet.id == "h_c":
@@ -206,54 +407,36 @@ def get_model_of_interest(
             elif only_charge_source and (
                 (len(balance) > 1) or "charge" not in balance.keys()
             ):
-                scr = only_charge_source[
-                    min(only_charge_source.keys(), key=abs)
-                ]
+                scr = only_charge_source[min(only_charge_source.keys(), key=abs)]
                 out_reaction.add_metabolites(
                     {
                         old_met: -old_k
                         for old_met, old_k in out_reaction.metabolites.items()
                     }
                 )
-                out_reaction.add_metabolites(
-                    {new_met: new_k for new_met, new_k in scr.metabolites.items()}
-                )
+                out_reaction.add_metabolites(scr)
 
-        if r_gene_reaction_rule.get(gene_interest_level_r):
-            out_reaction.gene_reaction_rule = r_gene_reaction_rule.get(
-                gene_interest_level_r
-            )[0]
+        if r_gene_reaction_rule:
+            out_reaction.gene_reaction_rule = r_gene_reaction_rule[0]
         else:
             out_reaction.gene_reaction_rule = ""
-        outmodel.add_reactions([out_reaction])
+        builder.add_reaction(out_reaction)
 
     # Adding biomass to the model
     biomass_reaction = Reaction("Biomass")
-    if biomass_interest_level in supermodel.sources + ["assembly"]:
-        biomass_reaction.upper_bound = supermodel.reactions.assembly[
-            "Biomass"
-        ].upper_bound.get(biomass_interest_level)[0]
-        biomass_reaction.lower_bound = supermodel.reactions.assembly[
-            "Biomass"
-        ].lower_bound.get(biomass_interest_level)[0]
-        bio_r_metabolites = supermodel.reactions.assembly["Biomass"].metabolites
-    else:
-        biomass_reaction.upper_bound = (
-            supermodel.reactions.assembly["Biomass"]
-            .upper_bound["comparison"]
-            .get(biomass_interest_level)[0]
-        )
-        biomass_reaction.lower_bound = (
-            supermodel.reactions.assembly["Biomass"]
-            .lower_bound["comparison"]
-            .get(biomass_interest_level)[0]
-        )
-        bio_r_metabolites = supermodel.reactions.assembly["Biomass"].metabolites[
-            "comparison"
-        ]
+    biomass_r = supermodel.reactions.assembly["Biomass"]
+    biomass_reaction.upper_bound = get_level_attribute(
+        biomass_r, "upper_bound", biomass_interest_level
+    )[0]
+    biomass_reaction.lower_bound = get_level_attribute(
+        biomass_r, "lower_bound", biomass_interest_level
+    )[0]
+    bio_r_metabolites = get_level_attribute(
+        biomass_r, "metabolites", biomass_interest_level
+    )
     if simple_biomass_products:
         biomass_prod_id = ["adp_c", "h_c", "pi_c", "ppi_c"]
-        for met, k in bio_r_metabolites.get(biomass_interest_level).items():
+        for met, k in bio_r_metabolites.items():
             if met.id in biomass_prod_id:
                 biomass_prod_id.remove(met.id)
                 bio_met = Metabolite(
@@ -270,22 +453,81 @@ def get_model_of_interest(
                 f"Some expected biomass products are not found: {' '.join(biomass_prod_id)}"
             )
     else:
-        for met, k in bio_r_metabolites.get(biomass_interest_level).items():
+        for met, k in bio_r_metabolites.items():
             bio_met = Metabolite(
                 met.id, name=met.name, compartment=met.compartments["assembly"][0]
             )
             biomass_reaction.add_metabolites({bio_met: k})
-    outmodel.add_reactions([biomass_reaction])
+    builder.add_reaction(biomass_reaction)
+    outmodel = builder.build()
     outmodel.objective = "Biomass"
     if gapfill_transport:
         gapfill_transport_r(outmodel, supermodel)
     if output_name is not None:
         write_sbml_model(outmodel, output_name)
-        report = validate_sbml_model(filename=output_name)
-        pprint(report)
+        if validate:
+            report = validate_sbml_model(filename=output_name)
+            pprint(report)
     return outmodel
 
 
+def get_confidence_levels(supermodel: SuperModel) -> list:
+    """Getting names of all sources and confidence levels from coreN to core2 and
+    assembly."""
+    confidence_levels = deepcopy(supermodel.sources)
+    for i in range(len(supermodel.sources), 1, -1):
+        confidence_levels.append("core" + str(i))
+    confidence_levels.append("assembly")
+    return confidence_levels
+
+
+# supermodel and arguments of get_models_with_all_confidence_levels in its worker
+# process, set by _init_level_worker
+_level_worker_args = None
+
+
+def _init_level_worker(supermodel: SuperModel, kwargs: dict):
+    # with fork initargs are inherited by worker processes and never pickled
+    global _level_worker_args
+    _level_worker_args = (supermodel, kwargs)
+
+
+def _get_level_model(level, output_name):
+    """Building model of level in worker process. If model is written to SBML
+    file, only validation errors are returned to the parent process, so reports
+    of different levels are not mixed up in output and model isn't pickled."""
+    supermodel, kwargs = _level_worker_args
+    outmodel = get_model_of_interest(
+        supermodel, level, output_name, **{**kwargs, "validate": False}
+    )
+    if output_name is None:
+        return outmodel, None
+    errors = None
+    if kwargs["validate"]:
+        errors = validate_sbml_model(filename=output_name)[1]
+    return None, errors
+
+
+class _WrittenLevelModels(Mapping):
+    """Models of confidence levels written to SBML files by worker processes.
+    Model is read from its file at first access and then kept."""
+
+    def __init__(self, output_names: dict):
+        self._output_names = output_names
+        self._models = {}
+
+    def __getitem__(self, level):
+        if level not in self._models:
+            self._models[level] = read_sbml_model(str(self._output_names[level]))
+        return self._models[level]
+
+    def __iter__(self):
+        return iter(self._output_names)
+
+    def __len__(self):
+        return len(self._output_names)
+
+
 def get_models_with_all_confidence_levels(
     supermodel: SuperModel,
     output_dir=None,
@@ -297,37 +539,183 @@ def get_models_with_all_confidence_levels(
     do_balance=True,
     reactions_include: [NewElement] = None,
     reactions_exclude: [NewElement] = None,
+    and_as_solid=False,
+    validate=True,
+    n_jobs: int = 1,
 ):
-    output_models = {}
-    confidence_levels = deepcopy(supermodel.sources)
-    for i in range(len(supermodel.sources), 1, -1):
-        confidence_levels.append("core" + str(i))
-    confidence_levels.append("assembly")
+    """Creating COBRA models for all sources and all confidence levels from coreN to core2 and assembly and writing
+    them to output_dir if given. Written SBML files are read again and validated only if validate is True. With n_jobs
+    other than 1 levels are built and written in a pool of n_jobs processes (all CPUs if n_jobs is -1), which are
+    forked from current process and so share supermodel snapshot without copying it. Workers are used only on Linux,
+    on other platforms levels are built one after another. Validation reports of workers are printed in the order of
+    levels. If output_dir is given, models aren't sent back from workers, returned mapping reads model of level from
+    its SBML file at first access, so coefficients and bounds have precision of SBML file.
+    """
+    confidence_levels = get_confidence_levels(supermodel)
 
     if output_dir is not None:
         output_dir = Path(output_dir)
         output_dir.mkdir(exist_ok=True, parents=True)
 
+    output_names = []
     for level in confidence_levels:
         output_dir_lev = None
         if output_dir is not None:
             output_dir_lev = output_dir / (level + ".xml")
+        output_names.append(output_dir_lev)
+    kwargs = {
+        "gene_interest_level": gene_interest_level,
+        "biomass_interest_level": biomass_interest_level,
+        "simple_biomass_products": simple_biomass_products,
+        "extend_zero_bounds": extend_zero_bounds,
+        "gapfill_transport": gapfill_transport,
+        "do_balance": do_balance,
+        "reactions_include": reactions_include,
+        "reactions_exclude": reactions_exclude,
+        "and_as_solid": and_as_solid,
+        "validate": validate,
+    }
 
-        output_models.update(
-            {
-                level: get_model_of_interest(
-                    supermodel,
-                    level,
-                    output_name=output_dir_lev,
-                    gene_interest_level=gene_interest_level,
-                    biomass_interest_level=biomass_interest_level,
-                    simple_biomass_products=simple_biomass_products,
-                    extend_zero_bounds=extend_zero_bounds,
-                    gapfill_transport=gapfill_transport,
-                    do_balance=do_balance,
-                    reactions_include=reactions_include,
-                    reactions_exclude=reactions_exclude,
-                )
-            }
+    # fork is unsafe on macOS and isn't available on Windows
+    if n_jobs != 1 and not sys.platform.startswith("linux"):
+        warnings.warn(
+            "Worker processes are used only on Linux, confidence levels are built one after another"
         )
+        n_jobs = 1
+    if n_jobs == 1:
+        output_models = {
+            level: get_model_of_interest(supermodel, level, output_name, **kwargs)
+            for level, output_name in zip(confidence_levels, output_names)
+        }
+    else:
+        # indexes shared by all levels are made before forking, so every worker
+        # doesn't make its own
+        if do_balance:
+            get_mass_balance(supermodel)
+        if gapfill_transport:
+            get_transport_index(supermodel)
+        with ProcessPoolExecutor(
+            max_workers=os.cpu_count() if n_jobs == -1 else n_jobs,
+            mp_context=multiprocessing.get_context("fork"),
+            initializer=_init_level_worker,
+            initargs=(supermodel, kwargs),
+        ) as executor:
+            output_models = {}
+            for level, output_name, (outmodel, errors) in zip(
+                confidence_levels,
+                output_names,
+                executor.map(_get_level_model, confidence_levels, output_names),
+            ):
+                if errors is not None:
+                    pprint((output_name, errors))
+                output_models[level] = outmodel
+        if output_dir is not None:
+            output_models = _WrittenLevelModels(
+                dict(zip(confidence_levels, output_names))
+            )
     return output_models
+
+
+def get_levels_matrices(supermodel: SuperModel, and_as_solid=False) -> dict:
+    """Getting stoichiometric matrices, bounds and GPRs for all sources and all
+    confidence levels in one pass over supermodel reactions. All levels share one
+    index of assembly metabolites (rows) and assembly reactions (columns). For every
+    level there is sparse stoichiometric matrix S, boolean mask of level reactions,
+    lower and upper bounds (nan for reactions not in level) and gene reaction rules.
+    Level attributes are taken as they are in supermodel, without curation done in
+    get_model_of_interest like balancing or transport gap-filling."""
+    metabolites = list(supermodel.metabolites.assembly.keys())
+    reactions = list(supermodel.reactions.assembly.keys())
+    met_index = {met_id: i for i, met_id in enumerate(metabolites)}
+    levels = {
+        level: get_interest_level(supermodel, level, and_as_solid)
+        for level in get_confidence_levels(supermodel)
+    }
+    level_reactions = {
+        level: (
+            view.reactions
+            if isinstance(view, ComparisonView)
+            else getattr(supermodel.reactions, view)
+        )
+        for level, view in levels.items()
+    }
+    entries = {level: ([], [], []) for level in levels}
+    out_levels = {
+        level: {
+            "reactions": numpy.zeros(len(reactions), dtype=bool),
+            "lower_bound": numpy.full(len(reactions), numpy.nan),
+            "upper_bound": numpy.full(len(reactions), numpy.nan),
+            "gene_reaction_rule": [""] * len(reactions),
+        }
+        for level in levels
+    }
+    for j, r in enumerate(supermodel.reactions.assembly.values()):
+        for level, view in levels.items():
+            if r.id not in level_reactions[level]:
+                continue
+            out_level = out_levels[level]
+            out_level["reactions"][j] = True
+            out_level["lower_bound"][j] = get_level_attribute(r, "lower_bound", view)[0]
+            out_level["upper_bound"][j] = get_level_attribute(r, "upper_bound", view)[0]
+            r_gene_reaction_rule = get_level_attribute(r, "gene_reaction_rule", view)
+            if r_gene_reaction_rule:
+                out_level["gene_reaction_rule"][j] = r_gene_reaction_rule[0]
+            data, rows, cols = entries[level]
+            for met, k in get_level_attribute(r, "metabolites", view).items():
+                if k != 0:
+                    data.append(k)
+                    rows.append(met_index[met.id])
+                    cols.append(j)
+    for level, (data, rows, cols) in entries.items():
+        out_levels[level]["S"] = csc_matrix(
+            (numpy.array(data, dtype=float), (rows, cols)),
+            shape=(len(metabolites), len(reactions)),
+        )
+    return {"metabolites": metabolites, "reactions": reactions, "levels": out_levels}
+
+
+def write_levels_matrices(supermodel: SuperModel, output_name, and_as_solid=False):
+    """Writing matrices from get_levels_matrices for all levels of supermodel to one
+    compressed numpy .npz file, which can be read with read_levels_matrices."""
+    matrices = get_levels_matrices(supermodel, and_as_solid)
+    arrays = {
+        "metabolites": numpy.array(matrices["metabolites"], dtype=str),
+        "reactions": numpy.array(matrices["reactions"], dtype=str),
+        "levels": numpy.array(list(matrices["levels"].keys()), dtype=str),
+    }
+    for i, level in enumerate(matrices["levels"].values()):
+        arrays[f"{i}.S_data"] = level["S"].data
+        arrays[f"{i}.S_indices"] = level["S"].indices
+        arrays[f"{i}.S_indptr"] = level["S"].indptr
+        arrays[f"{i}.reactions"] = level["reactions"]
+        arrays[f"{i}.lower_bound"] = level["lower_bound"]
+        arrays[f"{i}.upper_bound"] = level["upper_bound"]
+        arrays[f"{i}.gene_reaction_rule"] = numpy.array(
+            level["gene_reaction_rule"], dtype=str
+        )
+    numpy.savez_compressed(output_name, **arrays)
+
+
+def read_levels_matrices(input_name) -> dict:
+    """Reading matrices of supermodel levels written by write_levels_matrices in the
+    same format as returned by get_levels_matrices."""
+    with numpy.load(input_name) as arrays:
+        metabolites = arrays["metabolites"].tolist()
+        reactions = arrays["reactions"].tolist()
+        out_levels = {}
+        for i, level in enumerate(arrays["levels"].tolist()):
+            out_levels[level] = {
+                "S": csc_matrix(
+                    (
+                        arrays[f"{i}.S_data"],
+                        arrays[f"{i}.S_indices"],
+                        arrays[f"{i}.S_indptr"],
+                    ),
+                    shape=(len(metabolites), len(reactions)),
+                ),
+                "reactions": arrays[f"{i}.reactions"],
+                "lower_bound": arrays[f"{i}.lower_bound"],
+                "upper_bound": arrays[f"{i}.upper_bound"],
+                "gene_reaction_rule": arrays[f"{i}.gene_reaction_rule"].tolist(),
+            }
+    return {"metabolites": metabolites, "reactions": reactions, "levels": out_levels}
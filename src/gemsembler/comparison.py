@@ -1,13 +1,15 @@
 import itertools
+import math
 import operator
 import sys
+import weakref
 from collections import Counter
+from fractions import Fraction
+from functools import lru_cache
 
 import numpy
 from scipy.stats import mode
 
-from .general import findKeysByValue
-
 
 def getCoreConnections(
     connections: dict, core_size: int, compare_operator: operator, sources: [str]
@@ -28,36 +30,140 @@ def getCoreConnections(
     return selected_connection
 
 
+def getBoundValue(bound, lower_limit, upper_limit):
+    """ Limiting core bound by lower_limit and upper_limit. Bounds at limits are returned as limits (like in
+    combination loops, where limits are replaced only by strictly smaller or bigger bounds). """
+    if bound <= lower_limit:
+        return lower_limit
+    if bound >= upper_limit:
+        return upper_limit
+    return bound
+
+
 def getCoreUpperBounds(bounds: dict, core_size: int, sources: [str]) -> [str]:
-    """ Getting upper bounds via uniting all possible intersections of core_size number sources """
+    """ Getting upper bounds via uniting all possible intersections of core_size number sources. Union of intersections
+    (max of min over combinations) is core_size-th largest upper bound, limited by 0 and 1000 """
     if len(sources) < core_size:
         return []
-    combinations = list(itertools.combinations(sources, core_size))
-    union_bound = 0
-    for combination in combinations:
-        intersection_bound = 1000
-        for c in combination:
-            if intersection_bound > bounds.get(c)[0]:
-                intersection_bound = bounds.get(c)[0]
-        if union_bound < intersection_bound:
-            union_bound = intersection_bound
-    return [union_bound]
+    source_bounds = sorted((bounds.get(s)[0] for s in sources), reverse=True)
+    return [getBoundValue(source_bounds[core_size - 1], 0, 1000)]
 
 
 def getCoreLowerBounds(bounds: dict, core_size: int, sources: [str]) -> [str]:
-    """ Getting lower bounds via uniting all possible intersections of core_size number sources """
+    """ Getting lower bounds via uniting all possible intersections of core_size number sources. Union of intersections
+    (min of max over combinations) is core_size-th smallest lower bound, limited by -1000 and 0 """
     if len(sources) < core_size:
         return []
-    combinations = list(itertools.combinations(sources, core_size))
-    union_bound = 0
-    for combination in combinations:
-        intersection_bound = -1000
-        for c in combination:
-            if intersection_bound < bounds.get(c)[0]:
-                intersection_bound = bounds.get(c)[0]
-        if union_bound > intersection_bound:
-            union_bound = intersection_bound
-    return [union_bound]
+    source_bounds = sorted(bounds.get(s)[0] for s in sources)
+    return [getBoundValue(source_bounds[core_size - 1], -1000, 0)]
+
+
+class CoreBounds(object):
+    """ Array-backed engine for core lower and upper bounds of many reactions. Lower and upper bounds of sources, in
+    which reactions are present, are put in reactions x sources tables and sorted once, then core bounds for any
+    core_size are core_size-th columns of sorted tables limited like in getCoreLowerBounds and getCoreUpperBounds. """
+
+    def __init__(self, reactions: dict):
+        self.reaction_ids = list(reactions.keys())
+        self.lower_values = []
+        self.upper_values = []
+        for react in reactions.values():
+            sources = react.in_models["models_list"]
+            self.lower_values.append([react.lower_bound.get(s)[0] for s in sources])
+            self.upper_values.append([react.upper_bound.get(s)[0] for s in sources])
+        self.models_amount = numpy.array([len(v) for v in self.lower_values], dtype=int)
+        n_sources = self.models_amount.max(initial=0)
+        # missing sources are padded with values, which are sorted to the end
+        lower = numpy.full((len(self.reaction_ids), n_sources), numpy.inf)
+        upper = numpy.full((len(self.reaction_ids), n_sources), numpy.inf)
+        for i, (low, up) in enumerate(zip(self.lower_values, self.upper_values)):
+            lower[i, : len(low)] = low
+            upper[i, : len(up)] = numpy.negative(up)
+        # positions of sources in ascending order of lower bounds and descending order of upper bounds
+        self.lower_order = numpy.argsort(lower, axis=1, kind="stable")
+        self.upper_order = numpy.argsort(upper, axis=1, kind="stable")
+        self.lower_sorted = numpy.take_along_axis(lower, self.lower_order, axis=1)
+        self.upper_sorted = -numpy.take_along_axis(upper, self.upper_order, axis=1)
+
+    def getBounds(self, core_size: int) -> dict:
+        """ Getting core lower and upper bounds for all reactions as dictionary reaction id - (lower bound list, upper
+        bound list), lists are empty if reaction is present in less than core_size sources. """
+        core_bounds = {r_id: ([], []) for r_id in self.reaction_ids}
+        if core_size < 1 or core_size > self.lower_sorted.shape[1]:
+            return core_bounds
+        k = core_size - 1
+        lower_k = self.lower_sorted[:, k]
+        upper_k = self.upper_sorted[:, k]
+        # bounds between limits are taken from models as they are, bounds outside of limits are replaced with limits
+        lower_inside = (lower_k > -1000) & (lower_k < 0)
+        upper_inside = (upper_k > 0) & (upper_k < 1000)
+        for i in numpy.flatnonzero(self.models_amount >= core_size):
+            if lower_inside[i]:
+                lower_bound = self.lower_values[i][self.lower_order[i, k]]
+            else:
+                lower_bound = -1000 if lower_k[i] <= -1000 else 0
+            if upper_inside[i]:
+                upper_bound = self.upper_values[i][self.upper_order[i, k]]
+            else:
+                upper_bound = 1000 if upper_k[i] >= 1000 else 0
+            core_bounds[self.reaction_ids[i]] = ([lower_bound], [upper_bound])
+        return core_bounds
+
+
+# Above this number of source combinations mean of modes is calculated via counting combinations for every mode
+# instead of enumerating combinations
+MAX_ENUMERATED_COMBINATIONS = 5000
+
+
+def getCombinationModes(
+    values: numpy.ndarray, combinations: numpy.ndarray
+) -> numpy.ndarray:
+    """ Getting modes (the smallest of the most frequent values like scipy.stats.mode) of values (metabolites x
+    sources, nan if there is no value) for every combination of sources (combinations x core_size indexes of sources)
+    at once. Returns modes as metabolites x combinations, nan if there are no values in combination. """
+    comb_values = numpy.sort(values[:, combinations], axis=-1)
+    # nan values are sorted to the end and are not equal to anything, so they are never modes if there are values
+    counts = (comb_values[..., :, None] == comb_values[..., None, :]).sum(axis=-1)
+    # argmax gives the first of the most frequent values, which is the smallest as values are sorted
+    first = numpy.argmax(counts, axis=-1)
+    return numpy.take_along_axis(comb_values, first[..., None], axis=-1)[..., 0]
+
+
+def getModesMeanByCounting(values: list, n_sources: int, core_size: int) -> float:
+    """ Getting mean of modes of values over all combinations of core_size out of n_sources sources (sources without
+    value are not in values) via counting combinations with every mode instead of enumerating them. Mean is calculated
+    exactly and rounded once. """
+    counted = sorted(Counter(values).items())
+    missing = n_sources - len(values)
+
+    def polynomial(n: int, max_b: int) -> [int]:
+        # number of ways to choose b of n sources for b <= max_b
+        return [math.comb(n, b) for b in range(min(n, max_b) + 1)]
+
+    def multiply(p1: [int], p2: [int]) -> [int]:
+        product = [0] * min(len(p1) + len(p2) - 1, core_size + 1)
+        for i, x in enumerate(p1[: core_size + 1]):
+            for j, y in enumerate(p2[: core_size + 1 - i]):
+                product[i + j] += x * y
+        return product
+
+    total_count = 0
+    total_sum = Fraction(0)
+    for j, (value, n_value) in enumerate(counted):
+        for t in range(1, min(n_value, core_size) + 1):
+            # value is the mode if it is chosen t times, smaller values less than t times and bigger values not more
+            # than t times
+            ways = polynomial(missing, core_size)
+            for i, (_, n_other) in enumerate(counted):
+                if i != j:
+                    ways = multiply(ways, polynomial(n_other, t - 1 if i < j else t))
+            if core_size - t < len(ways):
+                count = math.comb(n_value, t) * ways[core_size - t]
+                total_count += count
+                total_sum += count * Fraction(value)
+    if total_count == 0:
+        return numpy.float64(numpy.nan)
+    return numpy.float64(float(total_sum / total_count))
 
 
 def getCoreCoefficients(
@@ -68,35 +174,85 @@ def getCoreCoefficients(
     core_size: int,
     sources: [str],
 ) -> dict:
-    """ Getting core coefficients for metabolites via average of all possible modes of core_size number sources """
+    """ Getting core coefficients for metabolites via average of all possible modes of core_size number sources.
+    Modes are calculated for all combinations of sources and metabolites of reaction at once from matrix of
+    coefficients (metabolites x sources), giving the same values as calculating modes one by one. For large number
+    of combinations mean of modes is calculated via counting (getModesMeanByCounting). """
     core_metabolites = {}
     if len(sources) >= core_size:
-        combinations = list(itertools.combinations(sources, core_size))
-        for rea in reactants.get(core_name):
-            k_mean = []
-            for combination in combinations:
-                k_mod = []
-                for c in combination:
-                    if metabolites.get(c).get(rea):
-                        k_mod.append(metabolites.get(c).get(rea))
-                if k_mod:
-                    k_mean.append(mode(k_mod, keepdims=False)[0])
-            k = numpy.mean(k_mean)
-            core_metabolites.update({rea: k})
-        for pro in products.get(core_name):
-            k_mean = []
-            for combination in combinations:
-                k_mod = []
-                for c in combination:
-                    if metabolites.get(c).get(pro):
-                        k_mod.append(metabolites.get(c).get(pro))
-                if k_mod:
-                    k_mean.append(mode(k_mod, keepdims=False)[0])
-            k = numpy.mean(k_mean)
-            core_metabolites.update({pro: k})
+        core_mets = list(reactants.get(core_name)) + list(products.get(core_name))
+        if not core_mets:
+            return core_metabolites
+        # coefficients that are missing or 0 are not used for modes
+        coefficients = [
+            [metabolites.get(c).get(met) or numpy.nan for c in sources]
+            for met in core_mets
+        ]
+        if math.comb(len(sources), core_size) > MAX_ENUMERATED_COMBINATIONS:
+            for met, met_coefficients in zip(core_mets, coefficients):
+                core_metabolites.update(
+                    {
+                        met: getModesMeanByCounting(
+                            [k for k in met_coefficients if not numpy.isnan(k)],
+                            len(sources),
+                            core_size,
+                        )
+                    }
+                )
+            return core_metabolites
+        combinations = numpy.array(
+            list(itertools.combinations(range(len(sources)), core_size)), dtype=int
+        ).reshape(-1, core_size)
+        modes = getCombinationModes(
+            numpy.array(coefficients, dtype=float), combinations
+        )
+        for met, met_modes in zip(core_mets, modes):
+            k = numpy.mean(met_modes[~numpy.isnan(met_modes)])
+            core_metabolites.update({met: k})
     return core_metabolites
 
 
+@lru_cache(maxsize=4096)
+def getGPRClauseSupport(source_gprs: tuple) -> tuple:
+    """ Getting logical (or) parts of gene_reaction_rules (...and...) of sources (source_gprs is tuple with one gpr
+    string or None per source) as gene sets together with all their non-empty intersections. For every gene set
+    support is counted once: number of sources with at least one (...and...) part containing the gene set. Returns
+    set of original (...and...) parts and list of (gene set, support). Memoized per reaction (per source_gprs). """
+    source_clauses = []
+    for gpr in source_gprs:
+        clauses = set()
+        if gpr:
+            for gene_and in gpr.split(" or "):
+                clauses.add(
+                    frozenset(gene_and.replace("(", "").replace(")", "").split(" and "))
+                )
+        source_clauses.append(clauses)
+    original_clauses = set().union(*source_clauses)
+    # all intersections of original gene sets, which can be results for some core size
+    gene_sets = set(original_clauses)
+    new_sets = set(original_clauses)
+    while new_sets:
+        intersections = set()
+        for new_set in new_sets:
+            for clause in original_clauses:
+                intersection = new_set & clause
+                if intersection and intersection not in gene_sets:
+                    intersections.add(intersection)
+        gene_sets.update(intersections)
+        new_sets = intersections
+    support = [
+        (
+            gene_set,
+            sum(
+                any(gene_set <= clause for clause in clauses)
+                for clauses in source_clauses
+            ),
+        )
+        for gene_set in gene_sets
+    ]
+    return original_clauses, support
+
+
 def getCoreGPR(
     gprs: dict,
     core_size: int,
@@ -107,50 +263,25 @@ def getCoreGPR(
     """ Getting logical (or) parts of gene_reaction_rules (...and...)or(...)
     for reaction that are present in more than core_size sources = original models.
     While whether consider genes in (...and...) as solid thing is controlled
-    by binary variable"""
+    by binary variable. If not solid, original (...and...) parts contained in (...and...) parts of at least core_size
+    sources are selected together with intersections of (...and...) parts from core_size sources, which are not inside
+    other selected ones. Support of gene sets is calculated once per reaction with getGPRClauseSupport."""
     if not and_as_solid:
-        s_comb = []
-        if compare_operator == operator.ge:
-            for i in range(core_size, len(sources) + 1):
-                s_comb = s_comb + list(itertools.combinations(sources, i))
-        elif compare_operator == operator.eq:
-            s_comb = s_comb + list(itertools.combinations(sources, core_size))
-        ands_selected = []
-        original_ands = []
-        for comb in s_comb:
-            all_gpr_ands = []
-            for s in comb:
-                s_gpr_ands = []
-                if gprs.get(s):
-                    gpr = gprs.get(s)[0]
-                    for gene_and in gpr.split(" or "):
-                        s_gpr_ands.append(
-                            gene_and.replace("(", "").replace(")", "").split(" and ")
-                        )
-                else:
-                    s_gpr_ands.append([])
-                all_gpr_ands.append(s_gpr_ands)
-            ands_comb = list(itertools.product(*all_gpr_ands))
-            for ands in ands_comb:
-                intersect = set(ands[0])
-                for a in ands:
-                    intersect = set(intersect) & set(a)
-                    original_ands.append(sorted(a))
-                if intersect:
-                    ands_selected.append(list(intersect))
-        ands_selected_uniq = [
-            sorted(list(x)) for x in set(tuple(x) for x in ands_selected)
-        ]
-        artificial_ands = [y for y in ands_selected_uniq if y not in original_ands]
+        if (
+            compare_operator not in (operator.ge, operator.eq)
+            or len(sources) < core_size
+        ):
+            return []
+        # the same results are selected for operator.eq and operator.ge, as intersections of more than core_size
+        # sources are always inside intersections of core_size sources
+        original_clauses, support = getGPRClauseSupport(
+            tuple(gprs.get(s)[0] if gprs.get(s) else None for s in sources)
+        )
+        supported = [gene_set for gene_set, n in support if n >= core_size]
         ands_selected_simple = []
-        for u in ands_selected_uniq:
-            inside = False
-            if u in artificial_ands:
-                for o in ands_selected_uniq:
-                    if (u != o) and (set(u) & set(o) == set(u)):
-                        inside = True
-            if not inside:
-                ands_selected_simple.append(u)
+        for u in supported:
+            if u in original_clauses or not any(u < o for o in supported):
+                ands_selected_simple.append(sorted(u))
         selected_gpr_ands = []
         for gpr_ands in ands_selected_simple:
             if len(gpr_ands) > 1 and len(ands_selected_simple) > 1:
@@ -177,88 +308,136 @@ def getCoreGPR(
         return []
 
 
+def getCoreName(core_size: int, compare_operator: operator) -> str:
+    """ Getting name of core comparison level: coreN for operator.ge (>=) and InN for operator.eq (==) """
+    if compare_operator == operator.ge:
+        return "core" + str(core_size)
+    elif compare_operator == operator.eq:
+        return "In" + str(core_size)
+    else:
+        raise ValueError(
+            "Comparison operator is not supported. Has to be operator.ge (>=) or operator.eq (==)"
+        )
+
+
 def getCore(
-    supermodel, core_size: int, compare_operator: operator, and_as_solid: bool,
+    supermodel,
+    core_size: int,
+    compare_operator: operator,
+    and_as_solid: bool,
+    core_bounds: CoreBounds = None,
 ):
     """ Getting supermodel core: intersection of at least core_size amount of sources (by default, intersection of all
-     sources). Getting supermodel union of all sources. """
+     sources). Getting supermodel union of all sources. Bounds engine can be provided to reuse sorted bounds of
+     reactions for several core sizes. Results are calculated with ComparisonView and saved in "comparison"
+     attributes of supermodel and its elements. """
     if compare_operator == operator.ge:
-        coreN = "core" + str(core_size)
+        kind = "core"
     elif compare_operator == operator.eq:
-        coreN = "In" + str(core_size)
+        kind = "in"
     else:
         raise ValueError(
             "Comparison operator is not supported. Has to be operator.ge (>=) or operator.eq (==)"
         )
-    for met in supermodel.metabolites.assembly.values():
-        core_r = getCoreConnections(
-            met.reactions, core_size, compare_operator, supermodel.sources
-        )
-        met.reactions["comparison"].update({coreN: core_r})
-        if compare_operator(met.in_models["models_amount"], core_size):
-            supermodel.metabolites.comparison[coreN].update({met.id: met})
-    for gene in supermodel.genes.assembly.values():
-        core_rg = getCoreConnections(
-            gene.reactions, core_size, compare_operator, supermodel.sources
-        )
-        gene.reactions["comparison"].update({coreN: core_rg})
-        if compare_operator(gene.in_models["models_amount"], core_size):
-            supermodel.genes.comparison[coreN].update({gene.id: gene})
-    for react in supermodel.reactions.assembly.values():
-        core_reactants = getCoreConnections(
-            react.reactants, core_size, compare_operator, supermodel.sources
-        )
-        core_products = getCoreConnections(
-            react.products, core_size, compare_operator, supermodel.sources
-        )
-        core_genes = getCoreConnections(
-            react.genes, core_size, compare_operator, supermodel.sources
-        )
-        core_gpr = getCoreGPR(
-            react.gene_reaction_rule,
-            core_size,
-            compare_operator,
-            supermodel.sources,
-            and_as_solid,
-        )
-        core_lower_bound = getCoreLowerBounds(
-            react.lower_bound, core_size, react.in_models["models_list"]
-        )
-        core_upper_bound = getCoreUpperBounds(
-            react.upper_bound, core_size, react.in_models["models_list"]
-        )
-        react.reactants["comparison"].update({coreN: core_reactants})
-        react.products["comparison"].update({coreN: core_products})
-        react.genes["comparison"].update({coreN: core_genes})
-        react.gene_reaction_rule["comparison"].update({coreN: core_gpr})
-        react.lower_bound["comparison"].update({coreN: core_lower_bound})
-        react.upper_bound["comparison"].update({coreN: core_upper_bound})
-        core_metabolites = getCoreCoefficients(
-            react.metabolites,
-            react.reactants["comparison"],
-            react.products["comparison"],
-            coreN,
-            core_size,
-            react.in_models["models_list"],
-        )
-        react.metabolites["comparison"].update({coreN: core_metabolites})
-        if compare_operator(react.in_models["models_amount"], core_size):
-            supermodel.reactions.comparison[coreN].update({react.id: react})
-    return coreN
+    view = ComparisonView(
+        supermodel,
+        kind,
+        core_size=core_size,
+        and_as_solid=and_as_solid,
+        core_bounds=core_bounds,
+    )
+    writeComparisonView(supermodel, view)
+    return view.name
+
+
+class SourceIndex(object):
+    """ Index of supermodel elements by sources for Yes/No comparisons. Sources, in which element is present or
+    absent, are kept as bitmasks (bit i for i-th source in sorted order) and connections of element are kept as
+    frozensets of ids per source. Index is made once per supermodel (getSourceIndex) and filled on access. """
 
+    def __init__(self, sources: [str]):
+        self.sources = sorted(sources)
+        self.bits = {s: 1 << i for i, s in enumerate(self.sources)}
+        self._masks = {}
+        self._mask_sources = {}
+        self._connection_sets = {}
 
-def getDifConnections(connections: dict, sourceIn: [str], sourceNotIn: [str]):
+    def getMask(self, sources: [str]) -> int:
+        mask = 0
+        for s in sources:
+            mask |= self.bits[s]
+        return mask
+
+    def getSources(self, mask: int) -> [str]:
+        """ Getting sorted list of sources from bitmask """
+        if mask not in self._mask_sources:
+            self._mask_sources[mask] = [s for s in self.sources if mask & self.bits[s]]
+        return self._mask_sources[mask]
+
+    def getElementMasks(self, element) -> (int, int):
+        """ Getting bitmasks of sources, in which element is present and absent """
+        key = (type(element).__name__, element.id)
+        if key not in self._masks:
+            present = 0
+            absent = 0
+            for s, amount in element.sources.items():
+                if amount >= 1:
+                    present |= self.bits.get(s, 0)
+                elif amount == 0:
+                    absent |= self.bits.get(s, 0)
+            self._masks[key] = (present, absent)
+        return self._masks[key]
+
+    def getConnectionSets(self, element, attr: str) -> dict:
+        """ Getting frozensets of ids of connections (attr like reactants) of element per source """
+        key = (type(element).__name__, element.id, attr)
+        if key not in self._connection_sets:
+            connections = getattr(element, attr)
+            self._connection_sets[key] = {
+                s: frozenset(c.id for c in connections.get(s, [])) for s in self.sources
+            }
+        return self._connection_sets[key]
+
+
+# Source indexes of supermodels, which are removed together with supermodels
+_source_indexes = weakref.WeakKeyDictionary()
+
+
+def getSourceIndex(supermodel) -> SourceIndex:
+    if supermodel not in _source_indexes:
+        _source_indexes[supermodel] = SourceIndex(supermodel.sources)
+    return _source_indexes[supermodel]
+
+
+def getDifConnections(
+    connections: dict,
+    sourceIn: [str],
+    sourceNotIn: [str],
+    connection_sets: dict = None,
+):
     """ Getting connections (reactants/products/ for reaction or reactions for metabolites or genes for reactions and vv)
      that are present in "sourceIn" list of sources = original models and not present in "sourceNotIn"
-     list of sources = original models. """
-    connectionIn = set(connections.get(sourceIn[0]))
-    for sIn in sourceIn:
-        connectionIn = connectionIn & set(connections.get(sIn))
-    connectionNotIn = []
+     list of sources = original models. Difference is calculated with frozensets of connection ids per source
+     (from SourceIndex.getConnectionSets or made here), connections are returned in order of the first sourceIn. """
+    if connection_sets is None:
+        connection_sets = {
+            s: frozenset(c.id for c in connections.get(s))
+            for s in list(sourceIn) + list(sourceNotIn)
+        }
+    ids_in = connection_sets[sourceIn[0]]
+    for sIn in sourceIn[1:]:
+        ids_in = ids_in & connection_sets[sIn]
     for sNotIn in sourceNotIn:
-        connectionNotIn = connectionNotIn + connections.get(sNotIn)
-    difConnection = set(connectionIn) - set(connectionNotIn)
-    return list(difConnection)
+        if not ids_in:
+            break
+        ids_in = ids_in - connection_sets[sNotIn]
+    if not ids_in:
+        return []
+    difConnection = {}
+    for c in connections.get(sourceIn[0]):
+        if c.id in ids_in:
+            difConnection.setdefault(c.id, c)
+    return list(difConnection.values())
 
 
 def getSomeBound(bounds: dict, bounds_type: str, sourceIn: [str]):
@@ -378,12 +557,9 @@ def getDifGPR(gprs: dict, sourceIn: [str], sourceNotIn: [str], and_as_solid: boo
         return []
 
 
-def getDifference(
-    supermodel, sourceIn: [str], sourceNotIn: [str], and_as_solid: bool, nletter: int,
-):
-    """ Getting metabolites and reactions that are present in "sourceIn"
-    list of sources = original models
-    and not present in "sourceNotIn" list of sources = original models. """
+def getDifferenceName(sourceIn: [str], sourceNotIn: [str], nletter: int) -> str:
+    """ Getting name of comparison level from short names (first nletter letters) of sources in "sourceIn" and
+    "sourceNotIn" lists """
     if sourceIn:
         name = "Yes_"
         for sI in sorted(sourceIn):
@@ -396,68 +572,290 @@ def getDifference(
         name = "No_"
         for sNI in sourceNotIn:
             name = name + sNI[:nletter]
-    for met in supermodel.metabolites.assembly.values():
-        sm_present = findKeysByValue(met.sources, 1, operator.ge)
-        sm_absent = findKeysByValue(met.sources, 0, operator.eq)
-        if sourceIn:
-            dif_r = getDifConnections(met.reactions, sourceIn, sourceNotIn)
-        else:
-            dif_r = getDifConnections(met.reactions, sm_present, sourceNotIn)
-        met.reactions["comparison"].update({name: dif_r})
-        if (set(sourceIn) <= set(sm_present)) & (set(sourceNotIn) <= set(sm_absent)):
-            supermodel.metabolites.comparison[name].update({met.id: met})
-    for gene in supermodel.genes.assembly.values():
-        sg_present = findKeysByValue(gene.sources, 1, operator.ge)
-        sg_absent = findKeysByValue(gene.sources, 0, operator.eq)
-        if sourceIn:
-            dif_rg = getDifConnections(gene.reactions, sourceIn, sourceNotIn)
+    return name
+
+
+def getShortNamesSplits(names: str, short_names: dict) -> [[str]]:
+    """ Getting all ways to split concatenated short names of sources into sources, every source is used once """
+    if not names:
+        return [[]]
+    splits = []
+    for short_name, source in short_names.items():
+        if short_name and names.startswith(short_name):
+            for split in getShortNamesSplits(names[len(short_name) :], short_names):
+                if source not in split:
+                    splits.append([source] + split)
+    return splits
+
+
+def getDifferenceSources(name: str, sources: [str]) -> [([str], [str], int)]:
+    """ Getting all "sourceIn" and "sourceNotIn" lists of sources with number of letters in short names, for which
+    getDifferenceName gives exactly this name. Only short names, which are unique among sources, are considered.
+    Lists of sources are the same for all returned variants if the name is not ambiguous. """
+    variants = []
+    for nletter in range(1, len(max(sources, key=len)) + 1):
+        short_names = {source[:nletter]: source for source in sources}
+        if len(short_names) != len(sources):
+            continue
+        # "_No_" can be also part of short names, so all its positions are checked
+        parts = []
+        if name.startswith("No_"):
+            parts.append(("", name[len("No_") :]))
+        if name.startswith("Yes_"):
+            yes_no = name[len("Yes_") :]
+            parts.append((yes_no, ""))
+            start = yes_no.find("_No_")
+            while start != -1:
+                parts.append((yes_no[:start], yes_no[start + len("_No_") :]))
+                start = yes_no.find("_No_", start + 1)
+        for yes_names, no_names in parts:
+            for yes in getShortNamesSplits(yes_names, short_names):
+                for no in getShortNamesSplits(no_names, short_names):
+                    if (
+                        (yes or no)
+                        and not set(yes) & set(no)
+                        and getDifferenceName(yes, no, nletter) == name
+                    ):
+                        variants.append((sorted(yes), no, nletter))
+    return variants
+
+
+def getDifference(
+    supermodel, sourceIn: [str], sourceNotIn: [str], and_as_solid: bool, nletter: int,
+):
+    """ Getting metabolites and reactions that are present in "sourceIn"
+    list of sources = original models
+    and not present in "sourceNotIn" list of sources = original models. Results are calculated with ComparisonView
+    and saved in "comparison" attributes of supermodel and its elements. """
+    view = ComparisonView(
+        supermodel,
+        "present",
+        yes=sourceIn,
+        no=sourceNotIn,
+        and_as_solid=and_as_solid,
+        short_name_len=nletter,
+    )
+    writeComparisonView(supermodel, view)
+    return view.name
+
+
+class ComparisonView(object):
+    """ Comparison level of supermodel, which is calculated lazily on access without changing supermodel. Kind of
+    level is "core" (present in at least core_size sources, like getCore with operator.ge), "in" (present in exactly
+    core_size sources, like getCore with operator.eq) or "present" (present in yes sources and not present in no
+    sources, like getDifference). Elements of the level and attributes of elements (the same as
+    element.attribute["comparison"][name] after getCore/getDifference) are calculated on the first access and kept in
+    the view. View has only weak reference to supermodel, so it doesn't keep supermodel in memory. """
+
+    def __init__(
+        self,
+        supermodel,
+        kind: str,
+        core_size: int = None,
+        yes: [str] = None,
+        no: [str] = None,
+        and_as_solid: bool = False,
+        short_name_len: int = None,
+        core_bounds: CoreBounds = None,
+    ):
+        self._supermodel = weakref.ref(supermodel)
+        self.kind = kind
+        self.and_as_solid = and_as_solid
+        if kind in ("core", "in"):
+            self.core_size = core_size
+            self.compare_operator = operator.ge if kind == "core" else operator.eq
+            self.yes = self.no = self.short_name_len = None
+            self.name = getCoreName(core_size, self.compare_operator)
+        elif kind == "present":
+            self.core_size = self.compare_operator = None
+            self.yes = list(yes) if yes else []
+            self.no = list(no) if no else []
+            if short_name_len is None:
+                short_name_len = supermodel.get_short_name_len()
+            self.short_name_len = short_name_len
+            self.name = getDifferenceName(self.yes, self.no, short_name_len)
+            self._source_index = getSourceIndex(supermodel)
+            self._yes_mask = self._source_index.getMask(self.yes)
+            self._no_mask = self._source_index.getMask(self.no)
         else:
-            dif_rg = getDifConnections(gene.reactions, sg_present, sourceNotIn)
-        gene.reactions["comparison"].update({name: dif_rg})
-        if (set(sourceIn) <= set(sg_present)) & (set(sourceNotIn) <= set(sg_absent)):
-            supermodel.genes.comparison[name].update({gene.id: gene})
-    for react in supermodel.reactions.assembly.values():
-        sr_present = findKeysByValue(react.sources, 1, operator.ge)
-        sr_absent = findKeysByValue(react.sources, 0, operator.eq)
-        if sourceIn:
-            dif_reactants = getDifConnections(react.reactants, sourceIn, sourceNotIn)
-            dif_products = getDifConnections(react.products, sourceIn, sourceNotIn)
-            dif_genes = getDifConnections(react.genes, sourceIn, sourceNotIn)
-            dif_gpr = getDifGPR(
-                react.gene_reaction_rule, sourceIn, sourceNotIn, and_as_solid
+            raise ValueError(
+                f"Comparison kind {kind} is not supported. Has to be core, in or present"
+            )
+        self._core_bounds = core_bounds
+        self._bounds = None
+        self._elements = {}
+        self._values = {}
+
+    def __repr__(self):
+        return f"<ComparisonView {self.name} (and_as_solid={self.and_as_solid})>"
+
+    @property
+    def supermodel(self):
+        supermodel = self._supermodel()
+        if supermodel is None:
+            raise ReferenceError("Supermodel of the comparison view does not exist")
+        return supermodel
+
+    @property
+    def metabolites(self) -> dict:
+        return self._getElements("metabolites")
+
+    @property
+    def reactions(self) -> dict:
+        return self._getElements("reactions")
+
+    @property
+    def genes(self) -> dict:
+        return self._getElements("genes")
+
+    def _getElements(self, element_type: str) -> dict:
+        """ Getting elements of the level from supermodel assembly """
+        if element_type not in self._elements:
+            elements = getattr(self.supermodel, element_type).assembly
+            self._elements[element_type] = {
+                e_id: element
+                for e_id, element in elements.items()
+                if self._isInLevel(element)
+            }
+        return self._elements[element_type]
+
+    def _isInLevel(self, element) -> bool:
+        if self.kind == "present":
+            present, absent = self._source_index.getElementMasks(element)
+            return ((present & self._yes_mask) == self._yes_mask) and (
+                (absent & self._no_mask) == self._no_mask
+            )
+        return self.compare_operator(element.in_models["models_amount"], self.core_size)
+
+    def get(self, element, attr: str):
+        """ Getting attribute (reactions for metabolites and genes; reactants, products, genes, gene_reaction_rule,
+        lower_bound, upper_bound or metabolites for reactions) of element for the level """
+        key = (type(element).__name__, element.id, attr)
+        if key not in self._values:
+            if self.kind == "present":
+                self._values[key] = self._getDifferenceValue(element, attr)
+            else:
+                self._values[key] = self._getCoreValue(element, attr)
+        return self._values[key]
+
+    def _getCoreValue(self, element, attr: str):
+        sources = self.supermodel.sources
+        if attr in ("reactions", "reactants", "products", "genes"):
+            return getCoreConnections(
+                getattr(element, attr), self.core_size, self.compare_operator, sources
+            )
+        elif attr == "gene_reaction_rule":
+            return getCoreGPR(
+                element.gene_reaction_rule,
+                self.core_size,
+                self.compare_operator,
+                sources,
+                self.and_as_solid,
             )
-            sI_lower_bound = getSomeBound(react.lower_bound, "lower", sourceIn)
-            sI_upper_bound = getSomeBound(react.upper_bound, "upper", sourceIn)
+        elif attr in ("lower_bound", "upper_bound"):
+            if self._bounds is None:
+                if self._core_bounds is None:
+                    self._core_bounds = CoreBounds(self.supermodel.reactions.assembly)
+                self._bounds = self._core_bounds.getBounds(self.core_size)
+            if element.id in self._bounds:
+                lower_bound, upper_bound = self._bounds[element.id]
+            else:
+                sources = element.in_models["models_list"]
+                lower_bound = getCoreLowerBounds(
+                    element.lower_bound, self.core_size, sources
+                )
+                upper_bound = getCoreUpperBounds(
+                    element.upper_bound, self.core_size, sources
+                )
+            return lower_bound if attr == "lower_bound" else upper_bound
+        elif attr == "metabolites":
+            return getCoreCoefficients(
+                element.metabolites,
+                {self.name: self.get(element, "reactants")},
+                {self.name: self.get(element, "products")},
+                self.name,
+                self.core_size,
+                element.in_models["models_list"],
+            )
+        else:
+            raise ValueError(f"Attribute {attr} is not compared between sources")
+
+    def _getDifferenceValue(self, element, attr: str):
+        if self.yes:
+            sourceIn = self.yes
         else:
-            dif_reactants = getDifConnections(react.reactants, sr_present, sourceNotIn)
-            dif_products = getDifConnections(react.products, sr_present, sourceNotIn)
-            dif_genes = getDifConnections(react.genes, sr_present, sourceNotIn)
-            dif_gpr = getDifGPR(
-                react.gene_reaction_rule, sr_present, sourceNotIn, and_as_solid
+            present, _ = self._source_index.getElementMasks(element)
+            sourceIn = self._source_index.getSources(present)
+        if attr in ("reactions", "reactants", "products", "genes"):
+            return getDifConnections(
+                getattr(element, attr),
+                sourceIn,
+                self.no,
+                self._source_index.getConnectionSets(element, attr),
             )
-            sI_lower_bound = getSomeBound(react.lower_bound, "lower", sr_present)
-            sI_upper_bound = getSomeBound(react.upper_bound, "upper", sr_present)
-        react.reactants["comparison"].update({name: dif_reactants})
-        react.products["comparison"].update({name: dif_products})
-        react.genes["comparison"].update({name: dif_genes})
-        react.gene_reaction_rule["comparison"].update({name: dif_gpr})
-        react.lower_bound["comparison"].update({name: sI_lower_bound})
-        react.upper_bound["comparison"].update({name: sI_upper_bound})
-        if sourceIn:
-            sI_metabolites = getSomeCoefficients(
-                react.metabolites, react.reactants, react.products, name, sourceIn
+        elif attr == "gene_reaction_rule":
+            return getDifGPR(
+                element.gene_reaction_rule, sourceIn, self.no, self.and_as_solid
+            )
+        elif attr == "lower_bound":
+            return getSomeBound(element.lower_bound, "lower", sourceIn)
+        elif attr == "upper_bound":
+            return getSomeBound(element.upper_bound, "upper", sourceIn)
+        elif attr == "metabolites":
+            return getSomeCoefficients(
+                element.metabolites,
+                {"comparison": {self.name: self.get(element, "reactants")}},
+                {"comparison": {self.name: self.get(element, "products")}},
+                self.name,
+                sourceIn,
             )
         else:
-            sI_metabolites = getSomeCoefficients(
-                react.metabolites, react.reactants, react.products, name, sr_present
+            raise ValueError(f"Attribute {attr} is not compared between sources")
+
+
+class StoredComparisonView(ComparisonView):
+    """ Comparison level, which is already saved in "comparison" attributes of supermodel and its elements (for
+    example by getCore or getDifference), read with the same interface as ComparisonView. Sources and and_as_solid of
+    the level are not known, only its name. """
+
+    def __init__(self, supermodel, name: str):
+        if name not in supermodel.reactions.comparison:
+            raise ValueError(f"Comparison level {name} is not saved in supermodel")
+        self._supermodel = weakref.ref(supermodel)
+        self.kind = "stored"
+        self.name = name
+        self.and_as_solid = None
+        self.core_size = self.compare_operator = None
+        self.yes = self.no = self.short_name_len = None
+        self._elements = {}
+        self._values = {}
+
+    def _getElements(self, element_type: str) -> dict:
+        return getattr(self.supermodel, element_type).comparison[self.name]
+
+    def get(self, element, attr: str):
+        return getattr(element, attr)["comparison"][self.name]
+
+
+def writeComparisonView(supermodel, view: ComparisonView):
+    """ Saving comparison level from view in "comparison" attributes of supermodel and its elements """
+    for met in supermodel.metabolites.assembly.values():
+        met.reactions["comparison"].update({view.name: view.get(met, "reactions")})
+    for gene in supermodel.genes.assembly.values():
+        gene.reactions["comparison"].update({view.name: view.get(gene, "reactions")})
+    for react in supermodel.reactions.assembly.values():
+        for attr in [
+            "reactants",
+            "products",
+            "genes",
+            "gene_reaction_rule",
+            "lower_bound",
+            "upper_bound",
+            "metabolites",
+        ]:
+            getattr(react, attr)["comparison"].update(
+                {view.name: view.get(react, attr)}
             )
-        react.metabolites["comparison"].update({name: sI_metabolites})
-        if (set(sourceIn) <= set(sr_present)) & (set(sourceNotIn) <= set(sr_absent)):
-            supermodel.reactions.comparison[name].update({react.id: react})
-    if name not in supermodel.metabolites.comparison.keys():
-        supermodel.metabolites.comparison.update({name: {}})
-    if name not in supermodel.reactions.comparison.keys():
-        supermodel.reactions.comparison.update({name: {}})
-    if name not in supermodel.genes.comparison.keys():
-        supermodel.genes.comparison.update({name: {}})
-    return name
+    supermodel.metabolites.comparison[view.name].update(view.metabolites)
+    supermodel.reactions.comparison[view.name].update(view.reactions)
+    supermodel.genes.comparison[view.name].update(view.genes)
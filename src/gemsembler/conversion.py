@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 
 import re
+import sys
 from abc import ABC, abstractmethod
 
 from .dbs import (
@@ -18,8 +19,21 @@ from .dbs import (
 )
 
 
-# TODO: this could be a simple function
+CONVERSION_LEVELS = ("annot_and_main", "annot", "main", "addit", "pattern", "no_conv")
+
+
 class Converted(object):
+    """
+    Results of conversion of one metabolite or reaction. Candidate bigg ids are
+    prioritised into levels (CONVERSION_LEVELS) and stored as tuples of interned
+    ids without compartment. For metabolites compartment suffix is added to all
+    levels at first access and the interned results are cached, so level
+    attributes return the same tuples every time. Highest is the first not
+    empty level.
+    """
+
+    __slots__ = ("compartments", "level", "_levels", "_suffix", "_suffixed")
+
     def __init__(
         self,
         check_db,
@@ -40,31 +54,67 @@ class Converted(object):
         no_conv = set() if no_conv is None else {x for x in no_conv if x in check_db}
 
         # Do prioritisation
-        self.annot_and_main = list(annot.intersection(main))
-        self.annot = list(annot - main)
-        self.main = list(main - annot)
-        self.addit = list(addit - annot - main)
-        self.pattern = list(pattern - annot - main - addit)
-        self.no_conv = list(no_conv - annot - main - addit - pattern)
-
-        # If metabolite add compartment to metabolite id
-        if metabolite:
-            self.annot_and_main = [
-                i + "_" + self.compartments[0] for i in self.annot_and_main
-            ]
-            self.annot = [i + "_" + self.compartments[0] for i in self.annot]
-            self.main = [i + "_" + self.compartments[0] for i in self.main]
-            self.addit = [i + "_" + self.compartments[0] for i in self.addit]
-            self.pattern = [i + "_" + self.compartments[0] for i in self.pattern]
-            self.no_conv = [i + "_" + self.compartments[0] for i in self.no_conv]
+        self._levels = tuple(
+            tuple(sys.intern(x) for x in level) if level else ()
+            for level in (
+                annot.intersection(main),
+                annot - main,
+                main - annot,
+                addit - annot - main,
+                pattern - annot - main - addit,
+                no_conv - annot - main - addit - pattern,
+            )
+        )
+
+        # If metabolite compartment is added to metabolite id
+        self._suffix = sys.intern("_" + compartment[0]) if metabolite else ""
+        self._suffixed = None
 
         # Find 1st not empty conversion and set it as highest available
-        for attr in ["annot_and_main", "annot", "main", "addit", "pattern", "no_conv"]:
-            if getattr(self, attr) or attr == "no_conv":
-                self.highest = getattr(self, attr)
-                self.level = attr
+        self.level = "no_conv"
+        for level, ids in zip(CONVERSION_LEVELS, self._levels):
+            if ids:
+                self.level = level
                 break
 
+    def __get_level(self, level):
+        if not self._suffix:
+            return self._levels[CONVERSION_LEVELS.index(level)]
+        if self._suffixed is None:
+            self._suffixed = tuple(
+                tuple(sys.intern(i + self._suffix) for i in ids) if ids else ()
+                for ids in self._levels
+            )
+        return self._suffixed[CONVERSION_LEVELS.index(level)]
+
+    @property
+    def highest(self):
+        return self.__get_level(self.level)
+
+    @property
+    def annot_and_main(self):
+        return self.__get_level("annot_and_main")
+
+    @property
+    def annot(self):
+        return self.__get_level("annot")
+
+    @property
+    def main(self):
+        return self.__get_level("main")
+
+    @property
+    def addit(self):
+        return self.__get_level("addit")
+
+    @property
+    def pattern(self):
+        return self.__get_level("pattern")
+
+    @property
+    def no_conv(self):
+        return self.__get_level("no_conv")
+
     def __repr__(self):
         return (
             "Converted class object\n"
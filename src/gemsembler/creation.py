@@ -6,7 +6,7 @@ import operator
 import re
 import sys
 import warnings
-from collections import defaultdict
+from collections import OrderedDict, defaultdict
 from math import ceil
 from os.path import exists
 from pathlib import PosixPath
@@ -15,16 +15,20 @@ import dill
 import pandas as pd
 
 from .comparison import (
-    getCore,
+    ComparisonView,
+    CoreBounds,
+    StoredComparisonView,
     getCoreCoefficients,
     getCoreConnections,
     getCoreGPR,
-    getCoreLowerBounds,
-    getCoreUpperBounds,
-    getDifference,
+    getDifferenceSources,
+    writeComparisonView,
 )
 from .genes import makeNewGPR, uniteGPR
 
+# Number of comparison views kept in the cache of every supermodel
+COMPARISON_VIEWS_CACHE_SIZE = 32
+
 
 class KnowledgeConnectingOldNew:
     """Gathering methods to connect old and new models"""
@@ -1812,6 +1816,7 @@ class SuperModel:  # TODO REAL 30.08.23 add transport reactions for periplasmic
                     gene.reactions, 1, operator.ge, self.sources
                 )
                 gene.reactions.update({"assembly": ass_rg})
+            reactions_bounds = CoreBounds(getattr(self.reactions, atr)).getBounds(1)
             for react in getattr(self.reactions, atr).values():
                 ass_reactants = getCoreConnections(
                     react.reactants, 1, operator.ge, self.sources
@@ -1829,12 +1834,7 @@ class SuperModel:  # TODO REAL 30.08.23 add transport reactions for periplasmic
                     self.sources,
                     and_as_solid,
                 )
-                ass_lower_bound = getCoreLowerBounds(
-                    react.lower_bound, 1, react.in_models["models_list"]
-                )
-                ass_upper_bound = getCoreUpperBounds(
-                    react.upper_bound, 1, react.in_models["models_list"]
-                )
+                ass_lower_bound, ass_upper_bound = reactions_bounds[react.id]
                 react.reactants.update({"assembly": ass_reactants})
                 react.products.update({"assembly": ass_products})
                 react.genes.update({"assembly": ass_genes})
@@ -1875,6 +1875,8 @@ class SuperModel:  # TODO REAL 30.08.23 add transport reactions for periplasmic
             )
 
         args = args_dict["args"]
+        self._comparison_views = OrderedDict()
+        self._saved_levels = {}
 
         if is_loading:
             print("loading supermodel...")
@@ -2059,6 +2061,34 @@ class SuperModel:  # TODO REAL 30.08.23 add transport reactions for periplasmic
         json_dict_out["genes"] = args_dict_out["genes"]._to_json()
         return json.dumps(json_dict_out)
 
+    def __getstate__(self):
+        # cached comparison views are not copied or pickled with supermodel, only
+        # parameters of saved levels are
+        state = self.__dict__.copy()
+        state.pop("_comparison_views", None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._comparison_views = OrderedDict()
+        self.__dict__.setdefault("_saved_levels", {})
+
+    def __save_comparison(self, view: ComparisonView) -> str:
+        """Saving comparison level in "comparison" attributes and keeping parameters
+        of its view under the name of the level, so the name is always resolved to
+        the same sources and and_as_solid. View itself is not kept, as all its values
+        are already written to elements."""
+        writeComparisonView(self, view)
+        self._saved_levels[view.name] = {
+            "kind": view.kind,
+            "core_size": view.core_size,
+            "yes": view.yes,
+            "no": view.no,
+            "and_as_solid": view.and_as_solid,
+            "short_name_len": view.short_name_len,
+        }
+        return view.name
+
     def get_short_name_len(self) -> int:
         for i in range(len(max(self.sources, key=len)) + 1):
             short = []
@@ -2080,7 +2110,11 @@ class SuperModel:  # TODO REAL 30.08.23 add transport reactions for periplasmic
                 "You do not need to run this comparison separately"
             )
         else:
-            coreN = getCore(self, number_of_model, operator.ge, and_as_solid)
+            coreN = self.__save_comparison(
+                ComparisonView(
+                    self, "core", core_size=number_of_model, and_as_solid=and_as_solid
+                )
+            )
             print(f"Results are saved in 'comparison' attribute as {coreN}")
 
     def exactly_in(self, number_of_model: int, and_as_solid=False):
@@ -2091,7 +2125,11 @@ class SuperModel:  # TODO REAL 30.08.23 add transport reactions for periplasmic
         ):
             raise ValueError("Number to check does not fit the number of models")
         else:
-            coreN = getCore(self, number_of_model, operator.eq, and_as_solid)
+            coreN = self.__save_comparison(
+                ComparisonView(
+                    self, "in", core_size=number_of_model, and_as_solid=and_as_solid
+                )
+            )
             print(f"Results are saved in 'comparison' attribute as {coreN}")
 
     def present(self, yes=None, no=None, short_name_len=None, and_as_solid=False):
@@ -2123,7 +2161,16 @@ class SuperModel:  # TODO REAL 30.08.23 add transport reactions for periplasmic
             else:
                 if short_name_len is None:
                     short_name_len = self.get_short_name_len()
-                name = getDifference(self, yes, no, and_as_solid, short_name_len)
+                name = self.__save_comparison(
+                    ComparisonView(
+                        self,
+                        "present",
+                        yes=yes,
+                        no=no,
+                        and_as_solid=and_as_solid,
+                        short_name_len=short_name_len,
+                    )
+                )
                 print(f"Results are saved in 'comparison' attribute as {name}")
 
     def get_venn_segments(self, short_name_len=None, and_as_solid=False):
@@ -2137,16 +2184,152 @@ class SuperModel:  # TODO REAL 30.08.23 add transport reactions for periplasmic
         for combo in combinations:
             yes = sorted(list(combo))
             no = sorted((list(set(self.sources) - set(combo))))
-            name = getDifference(self, yes, no, and_as_solid, short_name_len)
+            name = self.__save_comparison(
+                ComparisonView(
+                    self,
+                    "present",
+                    yes=yes,
+                    no=no,
+                    and_as_solid=and_as_solid,
+                    short_name_len=short_name_len,
+                )
+            )
             print(f"Results are saved in 'comparison' attribute as {name}")
 
     def get_intersection(self, and_as_solid=False):
-        coreN = getCore(self, len(self.sources), operator.ge, and_as_solid)
+        coreN = self.__save_comparison(
+            ComparisonView(
+                self, "core", core_size=len(self.sources), and_as_solid=and_as_solid
+            )
+        )
         print(f"Results are saved in 'comparison' attribute as {coreN}")
 
     def get_all_confidence_levels(self, and_as_solid=False):
+        # bounds of reactions are sorted once for all confidence levels
+        core_bounds = CoreBounds(self.reactions.assembly)
         for i in range(len(self.sources), 1, -1):
-            self.at_least_in(i, and_as_solid=and_as_solid)
+            coreN = self.__save_comparison(
+                ComparisonView(
+                    self,
+                    "core",
+                    core_size=i,
+                    and_as_solid=and_as_solid,
+                    core_bounds=core_bounds,
+                )
+            )
+            print(f"Results are saved in 'comparison' attribute as {coreN}")
+
+    def get_comparison_view(
+        self,
+        kind: str,
+        core_size=None,
+        yes=None,
+        no=None,
+        and_as_solid=False,
+        short_name_len=None,
+    ) -> ComparisonView:
+        """Getting comparison level as ComparisonView, which is calculated lazily and
+        doesn't change supermodel. Kind is "core" (like at_least_in), "in" (like
+        exactly_in) or "present" (like present with yes and no lists and
+        short_name_len for the name of the level). Views are cached by (kind,
+        core_size or yes/no and short_name_len, and_as_solid) and the least recently
+        used views are removed from the cache."""
+        if kind in ("core", "in"):
+            if type(core_size) != int or core_size < 1 or core_size > len(self.sources):
+                raise ValueError("Number to check does not fit the number of models")
+            key = (kind, core_size, and_as_solid)
+        elif kind == "present":
+            yes = list(yes) if yes else []
+            no = list(no) if no else []
+            if not yes and not no:
+                raise ValueError(
+                    "Both models present and models not present are not provided. "
+                    "Please provide at least one of the list"
+                )
+            wrong_models = (set(yes) | set(no)) - set(self.sources)
+            if wrong_models:
+                raise ValueError(
+                    f"Some of input models are not in supermodel: {wrong_models}. "
+                    f"Please check the input ids"
+                )
+            if short_name_len is None:
+                short_name_len = self.get_short_name_len()
+            key = (
+                kind,
+                (tuple(sorted(yes)), tuple(sorted(no)), short_name_len),
+                and_as_solid,
+            )
+        else:
+            raise ValueError(
+                f"Comparison kind {kind} is not supported. Has to be core, in or present"
+            )
+        view = self._comparison_views.get(key)
+        if view is None:
+            view = ComparisonView(
+                self,
+                kind,
+                core_size=core_size,
+                yes=yes,
+                no=no,
+                and_as_solid=and_as_solid,
+                short_name_len=short_name_len,
+            )
+            self._comparison_views[key] = view
+            if len(self._comparison_views) > COMPARISON_VIEWS_CACHE_SIZE:
+                self._comparison_views.popitem(last=False)
+        else:
+            self._comparison_views.move_to_end(key)
+        return view
+
+    def get_level_view(self, interest_level: str, and_as_solid=False) -> ComparisonView:
+        """Getting comparison view by the name of comparison level like core3, In2 or
+        Yes_ca_No_ag. Levels saved by comparison methods (at_least_in, present, ...)
+        are got with get_comparison_view with the same sources and and_as_solid as
+        they were calculated. Then levels saved only in "comparison" attributes are
+        read from there. Other names are parsed and calculated with and_as_solid,
+        names of present levels have to match exactly one yes/no combination of
+        sources."""
+        if interest_level in self._saved_levels:
+            return self.get_comparison_view(**self._saved_levels[interest_level])
+        if interest_level in self.reactions.comparison:
+            return StoredComparisonView(self, interest_level)
+        core_match = re.fullmatch(r"(core|In)(\d+)", interest_level)
+        if core_match:
+            return self.get_comparison_view(
+                core_match.group(1).lower(),
+                int(core_match.group(2)),
+                and_as_solid=and_as_solid,
+            )
+        variants = getDifferenceSources(interest_level, self.sources)
+        if not variants:
+            raise ValueError(
+                f"Interest level {interest_level} is not a source, assembly or name of "
+                f"comparison level like core2, In2 or Yes_..._No_..."
+            )
+        if len({(tuple(yes), tuple(sorted(no))) for yes, no, _ in variants}) > 1:
+            raise ValueError(
+                f"Interest level {interest_level} is ambiguous, it can be made from "
+                f"different sources: {[(yes, no) for yes, no, _ in variants]}. "
+                f"Please run present for it first"
+            )
+        yes, no, short_name_len = variants[0]
+        return self.get_comparison_view(
+            "present",
+            yes=yes,
+            no=no,
+            and_as_solid=and_as_solid,
+            short_name_len=short_name_len,
+        )
+
+    def get_gpr_confidence(self, reaction, and_as_solid=False) -> (int, [str]):
+        """Getting GPR confidence of reaction: the biggest core size with not empty
+        core GPR, and this core GPR. Core GPRs are read through comparison views."""
+        for i in range(reaction.in_models["models_amount"], 0, -1):
+            view = self.get_comparison_view("core", i, and_as_solid=and_as_solid)
+            gpr_core = view.get(reaction, "gene_reaction_rule")
+            if gpr_core:
+                return i, gpr_core
+        return 0, []
 
     # def write_supermodel_to_pkl(self, output_name: str, recursion_limit=None):
     #     if not output_name.endswith(".pkl"):
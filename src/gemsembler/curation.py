@@ -21,8 +21,13 @@ def remove_b_type_exchange(
     Returns
     -------
     cobra.core.model.Model
-        Model without metabolites/reactions in `b` compartments
+        Model without metabolites/reactions in `b` compartments. If there is
+        nothing in `b` compartment, input model itself is returned.
     """
+    if not any(met.id.endswith("_b") for met in model.metabolites) and not any(
+        r.id.endswith("_b") for r in model.reactions
+    ):
+        return model
     model = deepcopy(model)
 
     # Rename metabolites ending with "_b" and if new id of a given metabolite
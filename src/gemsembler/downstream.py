@@ -1,4 +1,3 @@
-import operator
 import re
 import warnings
 from collections import defaultdict
@@ -17,7 +16,6 @@ plt.rcParams["svg.fonttype"] = "none"
 
 import seaborn as sns
 
-from .comparison import getCoreConnections, getCoreGPR
 from .creation import SuperModel
 from .drawing import (
     MET_NOT_INT_GLOBAL,
@@ -305,21 +303,15 @@ def table_reactions_confidence(
                     output["GPR_core"].append("")
                     output["GPR_assembly"].append("")
                 else:
-                    for i in range(r.in_models["models_amount"], 0, -1):
-                        gpr_core = getCoreGPR(
-                            r.gene_reaction_rule,
-                            i,
-                            operator.ge,
-                            r.in_models["models_list"],
-                            and_as_solid,
+                    gpr_confidence, gpr_core = supermodel.get_gpr_confidence(
+                        r, and_as_solid
+                    )
+                    if gpr_core:
+                        output["GPR_confidence"].append(f"{gpr_confidence}")
+                        output["GPR_core"].append(gpr_core[0])
+                        output["GPR_assembly"].append(
+                            r.gene_reaction_rule["assembly"][0]
                         )
-                        if gpr_core:
-                            output["GPR_confidence"].append(f"{i}")
-                            output["GPR_core"].append(gpr_core[0])
-                            output["GPR_assembly"].append(
-                                r.gene_reaction_rule["assembly"][0]
-                            )
-                            break
             if add_original_models:
                 for source in supermodel.sources:
                     if source in r.in_models["models_list"]:
@@ -698,12 +690,8 @@ def biomass(
     )
     core_rea = []
     if only_difference:
-        core_rea = getCoreConnections(
-            biomass_r.reactants,
-            len(supermodel.sources),
-            operator.ge,
-            supermodel.sources,
-        )
+        core_view = supermodel.get_comparison_view("core", len(supermodel.sources))
+        core_rea = core_view.get(biomass_r, "reactants")
     for rea in biomass_r.reactants.get("assembly"):
         if rea not in core_rea:
             colname_rea = define_node_features(
@@ -759,12 +747,8 @@ def biomass(
                         output[source].append("-")
     core_pro = []
     if only_difference:
-        core_pro = getCoreConnections(
-            biomass_r.products,
-            len(supermodel.sources),
-            operator.ge,
-            supermodel.sources,
-        )
+        core_view = supermodel.get_comparison_view("core", len(supermodel.sources))
+        core_pro = core_view.get(biomass_r, "products")
     for pro in biomass_r.products.get("assembly"):
         if pro not in core_pro:
             colname_pro = define_node_features(
@@ -1190,30 +1174,16 @@ def _write_pfba_mq_results(
                         confidence_paths["Metabolite synthesis"].append(m)
                         confidence_paths["Confidence"].append(0)
                     else:
-                        for i in range(
-                            supermodel.reactions.assembly[vr].in_models[
-                                "models_amount"
-                            ],
-                            0,
-                            -1,
-                        ):
-                            gpr_core = getCoreGPR(
-                                supermodel.reactions.assembly[vr].gene_reaction_rule,
-                                i,
-                                operator.ge,
-                                supermodel.reactions.assembly[vr].in_models[
-                                    "models_list"
-                                ],
-                                False,
+                        gpr_confidence, gpr_core = supermodel.get_gpr_confidence(
+                            supermodel.reactions.assembly[vr]
+                        )
+                        if gpr_core:
+                            confidence_paths["ID"].append(gpr_core[0])
+                            confidence_paths["Reactions/GPRs"].append("GPRs")
+                            confidence_paths["Metabolite synthesis"].append(
+                                m.removesuffix("_path_pfba")
                             )
-                            if gpr_core:
-                                confidence_paths["ID"].append(gpr_core[0])
-                                confidence_paths["Reactions/GPRs"].append("GPRs")
-                                confidence_paths["Metabolite synthesis"].append(
-                                    m.removesuffix("_path_pfba")
-                                )
-                                confidence_paths["Confidence"].append(i)
-                                break
+                            confidence_paths["Confidence"].append(gpr_confidence)
     if draw_confidence:
         confidence_paths_tab = pd.DataFrame(confidence_paths)
         if confidence_table is not None:
@@ -1448,11 +1418,17 @@ def run_metquest_results_analysis(
                     )
                 ]
             else:
+                # levels, which are not known to supermodel, have no precursors
+                try:
+                    level_view = supermodel.get_level_view(model)
+                except ValueError:
+                    all_models_bp[model] = []
+                    continue
                 all_models_bp[model] = [
                     m.id
-                    for m in supermodel.reactions.assembly["Biomass"]
-                    .reactants["comparison"]
-                    .get(model, [])
+                    for m in level_view.get(
+                        supermodel.reactions.assembly["Biomass"], "reactants"
+                    )
                 ]
     metquest_all_res_paths = {}
     stat_out = {}
@@ -9,7 +9,7 @@ import pandas as pd
 import seaborn as sns
 from pyvis.network import Network
 
-from .comparison import getCoreConnections, getCoreGPR
+from .comparison import getCoreGPR
 from .creation import NewElement, SuperModel
 
 MET_NOT_INT_GLOBAL = {
@@ -116,6 +116,7 @@ def define_node_features(
     and_as_solid=False,
     node_id=None,
     label=None,
+    supermodel: SuperModel = None,
 ) -> [str]:
     if not gene:
         col = colordata.get(pallitra)[object.in_models["models_amount"] - 1]
@@ -134,23 +135,28 @@ def define_node_features(
             col = colordata.get("notFound")[object.in_models["models_amount"] - 1]
             title = "No genes found"
         else:
-            for i in range(object.in_models["models_amount"], 0, -1):
-                gpr = getCoreGPR(
-                    object.gene_reaction_rule,
-                    i,
-                    operator.ge,
-                    object.in_models["models_list"],
-                    and_as_solid,
-                )
-                if gpr:
-                    node_id = f"{object.id} GPR core {i}"
-                    label = f"GPR core {i}"
-                    col = colordata.get(pallitra)[i - 1]
-                    title = (
-                        f"GPR core {i}:\n{gpr[0]}\n"
-                        f"GPR assembly:\n{object.gene_reaction_rule['assembly'][0]}"
+            if supermodel is not None:
+                i, gpr = supermodel.get_gpr_confidence(object, and_as_solid)
+            else:
+                i, gpr = 0, []
+                for i in range(object.in_models["models_amount"], 0, -1):
+                    gpr = getCoreGPR(
+                        object.gene_reaction_rule,
+                        i,
+                        operator.ge,
+                        object.in_models["models_list"],
+                        and_as_solid,
                     )
-                    break
+                    if gpr:
+                        break
+            if gpr:
+                node_id = f"{object.id} GPR core {i}"
+                label = f"GPR core {i}"
+                col = colordata.get(pallitra)[i - 1]
+                title = (
+                    f"GPR core {i}:\n{gpr[0]}\n"
+                    f"GPR assembly:\n{object.gene_reaction_rule['assembly'][0]}"
+                )
     return [node_id, label, col, title]
 
 
@@ -512,6 +518,7 @@ def draw_one_known_pathway(
                     n_letter,
                     gene=True,
                     and_as_solid=and_as_solid,
+                    supermodel=supermodel,
                 )
                 g.add_node(
                     g_colname[0],
@@ -772,6 +779,7 @@ def draw_one_synt_path(
                 n_letter,
                 gene=True,
                 and_as_solid=and_as_solid,
+                supermodel=supermodel,
             )
             g.add_node(
                 g_colname[0],
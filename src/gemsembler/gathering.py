@@ -1,20 +1,24 @@
+import hashlib
 import json
 import logging
 import os
-import subprocess
+import pickle
+import shutil
 import sys
 import warnings
-from collections import defaultdict
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from copy import deepcopy
-from functools import lru_cache
 from importlib.resources import files
 from pathlib import Path
+from types import MappingProxyType
 
+import cobra
 import pandas as pd
 from cobra.io import load_json_model, load_matlab_model, read_sbml_model
 from platformdirs import user_data_path
 
-from . import data
+from . import __version__, data
 from .conversion import (
     ConvAgora,
     ConvBase,
@@ -31,13 +35,27 @@ from .creation import SuperModel
 from .curation import get_duplicated_reactions, remove_b_type_exchange
 from .dbs import download_db, get_bigg_network
 from .genes import (
+    BlastCache,
+    blast_cache,
+    get_file_hash,
     get_final_fasta_with_ncbi_assemble,
     get_genes_gapseq,
     get_genes_not_gapseq,
+    get_sequence_index,
+    match_exact_sequences,
+    run_command,
+    run_commands,
+    split_threads,
+    write_blast_results,
 )
 from .periplasmic import getSuggestionPeriplasmic
 from .selection import run_selection
-from .structural import runStructuralConversion, runSuggestionsMet
+from .structural import (
+    StructuralCache,
+    getReactionMetabolites,
+    runStructuralConversion,
+    runSuggestionsMet,
+)
 
 
 def add_charge_mass_info(df_mbs):
@@ -88,8 +106,122 @@ class LoggerContext:
             self.__logger__.setLevel(logging.NOTSET)
 
 
-@lru_cache
-def load_sbml_model(path_to_model, show_logs: bool = False):
+class ModelCache(object):
+    """
+    Cache of parsed models keyed by hash of model file content, cobra and
+    gemsembler versions. Models are stored pickled in a bounded in-memory LRU
+    (maxsize models) and on disk (by default in ~/.local/share/gemsembler), so
+    that the same reconstruction is parsed only once, also across runs and
+    processes. At most disk_maxsize models are kept on disk, least recently
+    used models are removed first. Each get returns a new copy of the model,
+    so callers can modify it. Hits and misses are counted in the
+    corresponding attributes and reported by cache_info.
+    """
+
+    def __init__(self, maxsize=8, path_to_cache=None, use_disk=True, disk_maxsize=32):
+        self.maxsize = maxsize
+        self.path_to_cache = path_to_cache
+        self.use_disk = use_disk
+        self.disk_maxsize = disk_maxsize
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.__models = OrderedDict()
+
+    def __disk_path(self, content_hash):
+        path_to_cache = self.path_to_cache
+        if path_to_cache is None:
+            path_to_cache = user_data_path("gemsembler", ensure_exists=True)
+        Path(path_to_cache).mkdir(parents=True, exist_ok=True)
+        return Path(path_to_cache) / f"model_{content_hash}.pkl"
+
+    def __trim_disk(self, disk_path):
+        # files are ordered by time of the last use (see get)
+        cached = sorted(
+            disk_path.parent.glob("model_*.pkl"), key=lambda p: p.stat().st_mtime
+        )
+        for path in cached[: max(0, len(cached) - self.disk_maxsize)]:
+            path.unlink(missing_ok=True)
+
+    def __remember(self, content_hash, data):
+        self.__models[content_hash] = data
+        self.__models.move_to_end(content_hash)
+        while len(self.__models) > self.maxsize:
+            self.__models.popitem(last=False)
+
+    @staticmethod
+    def get_hash(path_to_model):
+        # pickled models depend on cobra and gemsembler versions, so they are
+        # part of the key
+        content_hash = hashlib.sha256(f"{cobra.__version__} {__version__}".encode())
+        with open(path_to_model, "rb") as fh:
+            for chunk in iter(lambda: fh.read(1 << 20), b""):
+                content_hash.update(chunk)
+        return content_hash.hexdigest()
+
+    def get(self, content_hash):
+        data = self.__models.get(content_hash)
+        if data is not None:
+            self.memory_hits += 1
+            self.__models.move_to_end(content_hash)
+            return pickle.loads(data)
+        if self.use_disk:
+            disk_path = self.__disk_path(content_hash)
+            if disk_path.exists():
+                data = disk_path.read_bytes()
+                try:
+                    model = pickle.loads(data)
+                except (pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+                    # broken cache file is parsed and written again
+                    model = None
+                if model is not None:
+                    self.disk_hits += 1
+                    disk_path.touch()
+                    self.__remember(content_hash, data)
+                    return model
+        self.misses += 1
+        return None
+
+    def set(self, content_hash, model):
+        data = pickle.dumps(model, protocol=pickle.HIGHEST_PROTOCOL)
+        self.__remember(content_hash, data)
+        if self.use_disk:
+            # writing to temporary file first, so other processes never read
+            # partially written model
+            disk_path = self.__disk_path(content_hash)
+            tmp_path = disk_path.with_suffix(f".{os.getpid()}.tmp")
+            tmp_path.write_bytes(data)
+            os.replace(tmp_path, disk_path)
+            self.__trim_disk(disk_path)
+
+    def clear(self):
+        self.__models.clear()
+
+    def cache_info(self):
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "memory_size": len(self.__models),
+            "maxsize": self.maxsize,
+        }
+
+
+model_cache = ModelCache()
+
+
+def load_sbml_model(path_to_model, show_logs: bool = False, use_cache: bool = False):
+    """
+    Reading cobra model from SBML, json or mat file. With use_cache models are
+    taken from model_cache (see ModelCache), so every call returns a new copy
+    of the model. Caching is off by default, location and size of the disk
+    cache can be changed with attributes of model_cache.
+    """
+    if use_cache:
+        content_hash = model_cache.get_hash(path_to_model)
+        model = model_cache.get(content_hash)
+        if model is not None:
+            return model
 
     # Read the cobra model
     with LoggerContext("cobra", show_logs):
@@ -100,9 +232,50 @@ def load_sbml_model(path_to_model, show_logs: bool = False):
         else:
             model = read_sbml_model(path_to_model)
 
+    if use_cache:
+        model_cache.set(content_hash, model)
     return model
 
 
+def get_model_index(model, duplicated_reactions):
+    """
+    Index of preprocessed model shared by all stages of GatheredModels instead
+    of querying cobra objects and table of duplicated reactions for every
+    reaction: set of ids of duplicated reactions, ids of reactants and
+    products for every reaction and number of reactions for every metabolite.
+    """
+    return {
+        "duplicated_reactions": frozenset(duplicated_reactions["ID"]),
+        "reaction_metabolites": getReactionMetabolites(model),
+        "metabolite_reactions": {
+            met.id: len(met.reactions) for met in model.metabolites
+        },
+    }
+
+
+def prepare_model(
+    path_to_model, remove_b: bool, show_logs: bool = False, use_cache: bool = False
+):
+    """
+    Loading model and preprocessing it for GatheredModels.add_model. Returns
+    original model, preprocessed model, table with duplicated reactions and
+    index of preprocessed model. Used in separate processes by
+    GatheredModels.add_models_and_run.
+    """
+    model = load_sbml_model(path_to_model, show_logs, use_cache)
+    # load_sbml_model returns new copy of the model, so it is not copied again.
+    # Original model is the same object as preprocessed one, unless
+    # preprocessing changes the model
+    original_model = model
+
+    # If model_type requires it, remove `_b` extensions
+    if remove_b:
+        model = remove_b_type_exchange(model)
+
+    dupl_r = get_duplicated_reactions(model)
+    return original_model, model, dupl_r, get_model_index(model, dupl_r)
+
+
 class GatheredModels:
     """
     Class that gathers information and necessary conversion results for all
@@ -126,6 +299,13 @@ class GatheredModels:
     path_final_genome_nt : None, optional
     path_final_genome_aa : None, optional
     custom_model_type : None, optional
+    structural_cache : bool, optional
+        If True, results of structural conversion are cached on disk (in
+        ~/.local/share/gemsembler) and reused in later runs with the same BiGG
+        network, also by other processes.
+    model_cache : bool, optional
+        If True, parsed models are cached in memory and on disk (see
+        ModelCache) and reused in later runs with the same model files.
 
     Notes
     -----
@@ -137,6 +317,8 @@ class GatheredModels:
         self,
         custom_model_type=None,
         clear_db_cache=False,
+        structural_cache=False,
+        model_cache=False,
     ):
         # If specified, clear the cached conversion tables and dictionaries
         if clear_db_cache:
@@ -201,6 +383,8 @@ class GatheredModels:
         }
 
         self.__models = {}
+        self.__structural_cache = structural_cache
+        self.__model_cache = model_cache
         self.first_stage_selected_metabolites = None
         self.first_stage_selected_reactions = None
         self.structural_first_run_reactions = defaultdict(dict)
@@ -219,19 +403,41 @@ class GatheredModels:
     def __len__(self):
         return len(self.__models)
 
-    def get_conf(self, model_type=None):
+    def get_conf(self, model_type=None, copy=False):
+        """
+        Configuration of all model types or of model_type. By default
+        read-only views of internal dictionaries are returned, converters in
+        them are shared with GatheredModels. With copy=True deep copy is
+        returned.
+        """
+        conf = self.__conf if model_type is None else self.__conf.get(model_type)
+        if copy:
+            return deepcopy(conf)
         if model_type is None:
-            return deepcopy(self.__conf)
-        else:
-            return deepcopy(self.__conf.get(model_type))
+            return MappingProxyType({k: MappingProxyType(v) for k, v in conf.items()})
+        return MappingProxyType(conf)
 
-    def get_model_attrs(self, model_id=None, attr=None):
+    def get_model_attrs(self, model_id=None, attr=None, copy=False):
+        """
+        Attributes (loaded models, paths, model type, ...) of all models, of
+        model_id or one attribute of model_id. By default read-only views of
+        internal dictionaries and stored objects themselves are returned, so
+        cobra models must not be modified (use copy=True or model.copy()).
+        With copy=True deep copy is returned.
+        """
         if model_id is not None and attr is not None:
-            return deepcopy(self.__models.get(model_id).get(attr))
+            attrs = self.__models.get(model_id).get(attr)
         elif model_id is not None and attr is None:
-            return deepcopy(self.__models.get(model_id))
+            attrs = self.__models.get(model_id)
         else:
-            return deepcopy(self.__models)
+            attrs = self.__models
+        if copy:
+            return deepcopy(attrs)
+        if model_id is None:
+            return MappingProxyType({k: MappingProxyType(v) for k, v in attrs.items()})
+        if attr is None and attrs is not None:
+            return MappingProxyType(attrs)
+        return attrs
 
     @property
     def same_db_models(self):
@@ -275,6 +481,7 @@ class GatheredModels:
         # run first structural conversion
         print("Running 1st structural convertion")
         bigg_network = get_bigg_network()
+        cache = StructuralCache(bigg_network) if self.__structural_cache else None
         for model_id, first_sel in self.first_stage_selected_reactions.items():
             model_type = self.__models[model_id]["model_type"]
             db_name = self.__conf.get(model_type).get("db_name")
@@ -285,6 +492,8 @@ class GatheredModels:
                 self.__models[model_id]["preprocess_model"],
                 bigg_network,
                 False,
+                cache,
+                self.__models[model_id]["model_index"]["reaction_metabolites"],
             )
         # run second stage selection for first structural reactions
         self.second_stage_selected_reactions = run_selection(
@@ -325,6 +534,8 @@ class GatheredModels:
                 self.__models[model_id]["preprocess_model"],
                 bigg_network,
                 self.__conf.get(model_type).get("wo_periplasmic"),
+                cache,
+                self.__models[model_id]["model_index"]["reaction_metabolites"],
             )
         # run third stage selection for first structural reactions
         self.third_stage_selected_reactions = run_selection(
@@ -349,6 +560,7 @@ class GatheredModels:
                     self.second_stage_selected_metabolites[model_id],
                     self.__models[model_id]["preprocess_model"],
                     bigg_network,
+                    self.__models[model_id]["model_index"]["metabolite_reactions"],
                 )
             else:
                 (
@@ -364,6 +576,7 @@ class GatheredModels:
         periplasmic_m = defaultdict(dict)
         periplasmic_r = defaultdict(dict)
         for model_id in self.__models.keys():
+            model_index = self.__models[model_id]["model_index"]
             final_r_sel[model_id] = {}
             final_r_not_sel[model_id] = {}
             final_m_sel[model_id] = {}
@@ -375,12 +588,7 @@ class GatheredModels:
                     sel_r.to_one_id == True
                     and sel_r.from_one_id == False
                     and (
-                        (
-                            orig_r_id
-                            in self.__models[model_id]["duplicated_reactions"][
-                                "ID"
-                            ].tolist()
-                        )
+                        (orig_r_id in model_index["duplicated_reactions"])
                         or (sel_r.highest_consistent == ["Biomass"])
                     )
                 ):
@@ -394,14 +602,7 @@ class GatheredModels:
                     final_r_not_sel[model_id].update(
                         {orig_r_id: [sel_r.compartments, [orig_r_id_alt]]}
                     )
-                if (
-                    len(
-                        self.__models[model_id]["preprocess_model"]
-                        .reactions.get_by_id(orig_r_id)
-                        .reactants
-                    )
-                    > 24
-                ):
+                if len(model_index["reaction_metabolites"][orig_r_id][0]) > 24:
                     final_r_not_sel[model_id].update(
                         {orig_r_id: [sel_r.compartments, sel_r.highest_consistent]}
                     )
@@ -474,7 +675,24 @@ class GatheredModels:
         do_mix_conv_notconv=False,
         and_as_solid=False,
         do_old_locus_tag=True,
+        n_threads=-1,
+        use_blast_cache=False,
+        use_exact_matches=True,
     ):
+        """
+        Converting genes with BLAST (if final genome is given) and assembling
+        supermodel. BLAST databases are built at the same time and searches
+        for different models run in parallel using at most n_threads CPUs
+        (all CPUs if n_threads is -1). Output of BLAST jobs is written to
+        tmp_gene_conversion/blast_logs in output_folder. With use_blast_cache
+        BLAST results are taken from blast_cache (see BlastCache), if the
+        same genes were already searched in the same final genome, and
+        databases are built only for searches, that are not cached (location
+        of the cache can be changed with blast_cache.path_to_cache). With
+        use_exact_matches genes with sequences identical to final genome
+        (for blastp and blastn) are matched by sequence hashes and only the
+        rest of genes is searched with BLAST.
+        """
         # Check if assembly and final genome are present.
         # If not, throw a warning.
         if do_old_genes is None:
@@ -498,14 +716,9 @@ class GatheredModels:
             if do_old_genes is None:
                 do_old_genes = {model_id: True for model_id in self.__models.keys()}
         else:
+            env = get_env()
             # GGE: Check that BLAST is installed
-            proc = subprocess.run(
-                f"makeblastdb -h",
-                shell=True,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-            )
-            if proc.returncode != 0:
+            if shutil.which("makeblastdb", path=env["PATH"]) is None:
                 raise OSError(
                     "Check that makeblastdb (and BLAST in general) is properly installed!"
                     "\n(a remainder, that you NEED to install blast to use this package)"
@@ -515,6 +728,8 @@ class GatheredModels:
             gene_path.mkdir(exist_ok=True, parents=True)
             db_path = gene_path / "blast_db"
             db_path.mkdir(exist_ok=True, parents=True)
+            log_path = gene_path / "blast_logs"
+            log_path.mkdir(exist_ok=True, parents=True)
             print("Downloading assembly from NCBI")
             if assembly_id:
                 (
@@ -523,83 +738,178 @@ class GatheredModels:
                 ) = get_final_fasta_with_ncbi_assemble(
                     output_folder, assembly_id, do_old_locus_tag=do_old_locus_tag
                 )
+            db_commands = {}
+            db_targets = {}
             if path_final_genome_nt is not None:
-                print("Building BLAST database")
-                run = subprocess.run(
-                    f"makeblastdb -in {path_final_genome_nt} -out "
-                    f"{Path(db_path, 'nt_db')} -dbtype nucl "
-                    "-title nt_db -parse_seqids",  # WindowsFix ('' removed)  [seems to work on Linux as well]
-                    shell=True,
-                    check=True,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    env=get_env(),
-                )
-                if run.returncode != 0:
-                    raise OSError(f"Failed to run makeblastdb: {run.stderr.decode()}")
+                db_targets["nt_db"] = path_final_genome_nt
+                db_commands["nt_db"] = [
+                    "makeblastdb",
+                    "-in",
+                    path_final_genome_nt,
+                    "-out",
+                    db_path / "nt_db",
+                    "-dbtype",
+                    "nucl",
+                    "-title",
+                    "nt_db",
+                    "-parse_seqids",
+                ]
             if path_final_genome_aa is not None:
-                print("Building BLAST database")
-                run = subprocess.run(
-                    f"makeblastdb -in {path_final_genome_aa} -out "
-                    f"{Path(db_path, 'aa_db')} -dbtype prot "
-                    "-title aa_db -parse_seqids",  # WindowsFix ('' removed) [seems to work on Linux as well]
-                    shell=True,
-                    check=True,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    env=get_env(),
-                )
-                if run.returncode != 0:
-                    raise OSError(f"Failed to run makeblastdb: {run.stderr.decode()}")
-            for model_id, model_data in self.__models.items():
-                path_to_genome = model_data["path_to_genome"]
-                if path_to_genome is None or path_to_genome == "":
-                    continue
-                print(f"Running gene conversion with BLAST for {model_id}")
-                out_blast_file = gene_path / (model_id + "_blast.tsv")
-                model_gene_file, aa_status = self.__conf[model_data["model_type"]][
-                    "genome_model_strategy"
-                ](
-                    gene_path,
-                    model_data["path_to_genome"],
-                    model_data["preprocess_model"],
-                    model_data["model_type"],
-                    model_id,
-                )
-                blast_command = ""
-                db_name = ""
-                if aa_status and path_final_genome_aa is not None:
-                    blast_command = "blastp"
-                    db_name = "aa_db"  # WindowsFix ('' removed) [seems to work on Linux as well]
-                elif aa_status and path_final_genome_nt is not None:
-                    blast_command = "tblastn"
-                    db_name = "nt_db"  # WindowsFix ('' removed) [seems to work on Linux as well]
-                elif not aa_status and path_final_genome_nt is not None:
-                    blast_command = "blastn"
-                    db_name = "nt_db"  # WindowsFix ('' removed) [seems to work on Linux as well]
-                elif not aa_status and path_final_genome_aa is not None:
-                    blast_command = "blastx"
-                    db_name = "aa_db"  # WindowsFix ('' removed) [seems to work on Linux as well]
-                if blast_command == "" or db_name == "":
-                    warnings.warn("\nWarning! Something wrong with aa/nt in files/DB")
-                elif not model_gene_file:
-                    warnings.warn("\nWarning! Something wrong with gene file")
-                else:
-                    run = subprocess.run(
-                        f"{blast_command} -query {model_gene_file} "
-                        f"-db {Path(db_path, db_name)} "
-                        f"-max_target_seqs 1 -evalue {evalue_threshold} "
-                        f"-outfmt 6 -out {out_blast_file}",  # WindowsFix ('' removed) [seems to work on Linux as well]
-                        shell=True,
-                        check=True,
-                        stdout=subprocess.PIPE,
-                        stderr=subprocess.PIPE,
-                        env=get_env(),
+                db_targets["aa_db"] = path_final_genome_aa
+                db_commands["aa_db"] = [
+                    "makeblastdb",
+                    "-in",
+                    path_final_genome_aa,
+                    "-out",
+                    db_path / "aa_db",
+                    "-dbtype",
+                    "prot",
+                    "-title",
+                    "aa_db",
+                    "-parse_seqids",
+                ]
+            if use_blast_cache:
+                target_hashes = {
+                    db_name: get_file_hash(path_target)
+                    for db_name, path_target in db_targets.items()
+                }
+            search_options = [
+                "-max_target_seqs",
+                "1",
+                "-evalue",
+                evalue_threshold,
+                "-outfmt",
+                "6",
+            ]
+            # Databases are built in background as soon as they are needed
+            # for the first not cached search, while genes of other models are
+            # prepared for BLAST
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                db_builds = {}
+                blast_commands = {}
+                cache_keys = {}
+                sequence_indexes = {}
+                exact_matches = {}
+                for model_id, model_data in self.__models.items():
+                    path_to_genome = model_data["path_to_genome"]
+                    if path_to_genome is None or path_to_genome == "":
+                        continue
+                    print(f"Preparing gene conversion with BLAST for {model_id}")
+                    out_blast_file = gene_path / (model_id + "_blast.tsv")
+                    model_gene_file, aa_status = self.__conf[model_data["model_type"]][
+                        "genome_model_strategy"
+                    ](
+                        gene_path,
+                        model_data["path_to_genome"],
+                        model_data["preprocess_model"],
+                        model_data["model_type"],
+                        model_id,
                     )
-                    if run.returncode != 0:
-                        raise OSError(
-                            f"Failed to run {blast_command}: {run.stderr.decode()}"
+                    blast_command = ""
+                    db_name = ""
+                    if aa_status and path_final_genome_aa is not None:
+                        blast_command = "blastp"
+                        db_name = "aa_db"
+                    elif aa_status and path_final_genome_nt is not None:
+                        blast_command = "tblastn"
+                        db_name = "nt_db"
+                    elif not aa_status and path_final_genome_nt is not None:
+                        blast_command = "blastn"
+                        db_name = "nt_db"
+                    elif not aa_status and path_final_genome_aa is not None:
+                        blast_command = "blastx"
+                        db_name = "aa_db"
+                    if blast_command == "" or db_name == "":
+                        warnings.warn(
+                            "\nWarning! Something wrong with aa/nt in files/DB"
+                        )
+                        continue
+                    elif not model_gene_file:
+                        warnings.warn("\nWarning! Something wrong with gene file")
+                        continue
+                    job_name = f"{blast_command}_{model_id}"
+                    if use_blast_cache:
+                        cache_key = BlastCache.get_key(
+                            get_file_hash(model_gene_file),
+                            target_hashes[db_name],
+                            blast_command,
+                            *search_options,
+                            f"exact_matches={use_exact_matches}",
+                        )
+                        if blast_cache.get(cache_key, out_blast_file):
+                            print(f"Using cached BLAST results for {model_id}")
+                            continue
+                        cache_keys[job_name] = (cache_key, out_blast_file)
+                    query_file = model_gene_file
+                    if use_exact_matches and blast_command in ["blastp", "blastn"]:
+                        # Genes with sequences identical to final genome are
+                        # matched by hashes, only the rest is sent to BLAST
+                        if db_name not in sequence_indexes:
+                            sequence_indexes[db_name] = get_sequence_index(
+                                db_targets[db_name]
+                            )
+                        query_file = gene_path / (model_id + "_genes_for_blast.fasta")
+                        exact_rows, n_remainder = match_exact_sequences(
+                            model_gene_file, sequence_indexes[db_name], query_file
                         )
+                        print(
+                            f"{len(exact_rows)} genes of {model_id} have exact "
+                            f"matches, {n_remainder} genes are left for BLAST"
+                        )
+                        if n_remainder == 0:
+                            write_blast_results(exact_rows, out_blast_file)
+                            continue
+                        exact_matches[job_name] = (
+                            exact_rows,
+                            out_blast_file,
+                            gene_path / (model_id + "_blast_remainder.tsv"),
+                        )
+                        out_blast_file = exact_matches[job_name][2]
+                    if db_name not in db_builds:
+                        print(f"Building BLAST database {db_name}")
+                        db_builds[db_name] = executor.submit(
+                            run_command,
+                            f"makeblastdb_{db_name}",
+                            db_commands[db_name],
+                            log_path,
+                            env,
+                        )
+                    blast_commands[job_name] = [
+                        blast_command,
+                        "-query",
+                        query_file,
+                        "-db",
+                        db_path / db_name,
+                        *search_options,
+                        "-out",
+                        out_blast_file,
+                    ]
+                for db_build in db_builds.values():
+                    db_build.result()
+            if blast_commands:
+                # Searches for all models run in parallel, sharing n_threads CPUs
+                n_workers, n_threads_job = split_threads(len(blast_commands), n_threads)
+                print(
+                    f"Running gene conversion with BLAST for {len(blast_commands)} "
+                    f"models ({n_workers} at once, {n_threads_job} threads each)"
+                )
+                run_commands(
+                    {
+                        name: args + ["-num_threads", n_threads_job]
+                        for name, args in blast_commands.items()
+                    },
+                    log_path,
+                    n_workers,
+                    env,
+                )
+            for (
+                exact_rows,
+                out_blast_file,
+                path_blast_results,
+            ) in exact_matches.values():
+                write_blast_results(exact_rows, out_blast_file, path_blast_results)
+            for cache_key, out_blast_file in cache_keys.values():
+                blast_cache.set(cache_key, out_blast_file)
         print("Assembling Supermodel")
         # Get final tables to create new objects
         (
@@ -675,30 +985,86 @@ class GatheredModels:
         path_to_genome: str = None,
         show_logs: bool = False,
     ):
+        self.__check_model(model_id, model_type)
+        self.__set_model(
+            model_id,
+            path_to_model,
+            model_type,
+            path_to_genome,
+            *prepare_model(
+                path_to_model,
+                self.__conf.get(model_type).get("remove_b"),
+                show_logs,
+                self.__model_cache,
+            ),
+        )
+
+    def __check_model(self, model_id, model_type):
         # Run checks on model_id and model_type
         # TODO: check with conversion dictionaries
         assert model_id not in self.__models, f"model_id {model_id} already used"
         assert model_type in self.__conf, f"Missing configuration for {model_type}"
 
-        model = load_sbml_model(path_to_model, show_logs)
-
+    def __set_model(
+        self,
+        model_id,
+        path_to_model,
+        model_type,
+        path_to_genome,
+        original_model,
+        model,
+        dupl_r,
+        model_index,
+    ):
         # Populate the internal data
         self.__models[model_id] = {
-            "original_model": deepcopy(model),
+            "original_model": original_model,
             "path_to_model": path_to_model,
             "model_type": model_type,
             "path_to_genome": path_to_genome,
+            "preprocess_model": model,
+            "duplicated_reactions": dupl_r,
+            "model_index": model_index,
         }
 
-        # If model_type requires it, remove `_b` extensions
-        if self.__conf.get(model_type).get("remove_b"):
-            model = remove_b_type_exchange(model)
-        self.__models[model_id]["preprocess_model"] = model
-
-        dupl_r = get_duplicated_reactions(model)
-        self.__models[model_id]["duplicated_reactions"] = dupl_r
+    def add_models_and_run(self, models_list, n_jobs: int = 1):
+        """
+        Adding all models from the list and running conversion. With n_jobs
+        other than 1 models are loaded and preprocessed in a pool of n_jobs
+        processes (all CPUs if n_jobs is -1) and added in the order of the
+        list.
+        """
+        if n_jobs == 1 or len(models_list) < 2:
+            for model in models_list:
+                self.add_model(**model)
+        else:
+            # checks for all models before loading, including repeated ids
+            model_ids = [model["model_id"] for model in models_list]
+            for model in models_list:
+                self.__check_model(model["model_id"], model["model_type"])
+                assert (
+                    model_ids.count(model["model_id"]) == 1
+                ), f"model_id {model['model_id']} already used"
 
-    def add_models_and_run(self, models_list):
-        for model in models_list:
-            self.add_model(**model)
+            with ProcessPoolExecutor(
+                max_workers=os.cpu_count() if n_jobs == -1 else n_jobs
+            ) as executor:
+                prepared = executor.map(
+                    prepare_model,
+                    [model["path_to_model"] for model in models_list],
+                    [
+                        self.__conf.get(model["model_type"]).get("remove_b")
+                        for model in models_list
+                    ],
+                    [model.get("show_logs", False) for model in models_list],
+                    [self.__model_cache] * len(models_list),
+                )
+                for model, prepared_model in zip(models_list, prepared):
+                    self.__set_model(
+                        model["model_id"],
+                        model["path_to_model"],
+                        model["model_type"],
+                        model.get("path_to_genome"),
+                        *prepared_model,
+                    )
         self.run()
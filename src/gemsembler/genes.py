@@ -1,23 +1,172 @@
 import gzip
+import hashlib
 import os
 import re
+import shutil
+import subprocess
 import time
 import warnings
-from functools import partial
+from concurrent.futures import ThreadPoolExecutor
 from mimetypes import guess_type
-from pathlib import PosixPath
+from pathlib import Path, PosixPath
 
 import ncbi_genome_download as ngd
 import pandas as pd
 from cobra import Model
+from platformdirs import user_data_path
 from sympy import expand, symbols, sympify
 
+from . import __version__
 from .general import is_float
 
 
-def check_nt_or_aa(path_fasta: PosixPath):
+def open_fasta(path_fasta: PosixPath):
+    """Opening fasta file for reading text, gzipped or not."""
+    encoding = guess_type(str(path_fasta))[1]  # uses file extension
+    if encoding == "gzip":
+        return gzip.open(path_fasta, "rt")
+    return open(path_fasta)
+
+
+def read_fasta_records(path_fasta: PosixPath):
+    """
+    Streaming records of fasta file (gzipped or not) as tuples of header
+    (without >) and sequence. Only one record is kept in memory and sequence
+    is joined from its lines once.
+    """
+    with open_fasta(path_fasta) as fasta_file:
+        header = None
+        seq_lines = []
+        for line in fasta_file:
+            if line.startswith(">"):
+                if header is not None:
+                    yield header, "".join(seq_lines)
+                header = line.strip()[1:]
+                seq_lines = []
+            else:
+                seq_lines.append(line.strip())
+        if header is not None:
+            yield header, "".join(seq_lines)
+
+
+def read_fasta(path_fasta: PosixPath):
+    """
+    Streaming records of fasta file (gzipped or not) as tuples of id (first
+    word of header) and sequence.
+    """
+    for header, sequence in read_fasta_records(path_fasta):
+        yield (header.split() or [""])[0], sequence
+
+
+class FastaIndex(object):
+    """
+    Random access to sequences of not compressed fasta file like with samtools
+    faidx. File is scanned once to find offset, length and line width of every
+    sequence, then slices of sequences are read from the file, so the whole
+    genome is never loaded into memory. Use as context manager or close it.
+    get returns IndexedSequence, which can be sliced like string. ValueError
+    is raised if file can't be indexed (compressed file or lines of different
+    width inside one sequence), then get_genome can be used instead.
+    """
+
+    def __init__(self, path_fasta: PosixPath):
+        if guess_type(str(path_fasta))[1] is not None:
+            raise ValueError(f"Compressed fasta {path_fasta} can't be indexed")
+        # id: [offset of sequence, length, bases in line, bytes in line]
+        self.__index = {}
+        self.__fasta_file = open(path_fasta, "rb")
+        try:
+            self.__make_index()
+        except ValueError:
+            self.close()
+            raise
+
+    def __make_index(self):
+        seq_id = None
+        offset = 0
+        for line in self.__fasta_file:
+            if line.startswith(b">"):
+                seq_id = line.split()[0][1:].decode()
+                # last sequence with the same id is used like in get_genome
+                record = self.__index[seq_id] = [offset + len(line), 0, 0, 0]
+                last_line = False
+            elif seq_id is not None:
+                bases = line.rstrip(b"\r\n")
+                if len(bases) != len(line.strip()) or last_line or not bases:
+                    raise ValueError(
+                        f"Sequence {seq_id} has lines of different width or "
+                        "whitespaces and can't be indexed"
+                    )
+                if record[2] == 0:
+                    record[2] = len(bases)
+                    record[3] = len(line)
+                elif len(bases) > record[2] or len(line) - len(bases) != (
+                    record[3] - record[2]
+                ):
+                    raise ValueError(
+                        f"Sequence {seq_id} has lines of different width and "
+                        "can't be indexed"
+                    )
+                # only the last line of the sequence can be shorter
+                last_line = len(bases) < record[2]
+                record[1] += len(bases)
+            offset += len(line)
+
+    def __contains__(self, seq_id):
+        return seq_id in self.__index
+
+    def keys(self):
+        return self.__index.keys()
+
+    def get(self, seq_id):
+        if seq_id not in self.__index:
+            return None
+        return IndexedSequence(self, seq_id, self.__index[seq_id][1])
+
+    def fetch(self, seq_id: str, start: int, end: int):
+        """Reading sequence[start:end] from the file."""
+        offset, length, line_bases, line_bytes = self.__index[seq_id]
+        start, end, _ = slice(start, end).indices(length)
+        if start >= end:
+            return ""
+        first_byte = offset + start // line_bases * line_bytes + start % line_bases
+        last_byte = offset + end // line_bases * line_bytes + end % line_bases
+        self.__fasta_file.seek(first_byte)
+        data = self.__fasta_file.read(last_byte - first_byte)
+        return data.decode().replace("\r", "").replace("\n", "")
+
+    def close(self):
+        self.__fasta_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class IndexedSequence(object):
+    """Sequence from FastaIndex, which is read from the file when sliced."""
+
+    def __init__(self, fasta_index: FastaIndex, seq_id: str, length: int):
+        self.fasta_index = fasta_index
+        self.seq_id = seq_id
+        self.length = length
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice) or key.step not in (None, 1):
+            raise TypeError("IndexedSequence supports only slices without step")
+        return self.fasta_index.fetch(self.seq_id, key.start, key.stop)
+
+
+def check_nt_or_aa(path_fasta: PosixPath, sample_size: int = 100000):
     """Check whether fasta file is nt or aa.
-    Codes are taken from  https://web.cas.org/help/BLAST/topics/codes.htm"""
+    Codes are taken from  https://web.cas.org/help/BLAST/topics/codes.htm
+    File is read line by line until amino acid specific letter is found or
+    sample_size sequence letters are checked (whole file if None)."""
     nt_letters = [
         "A",
         "C",
@@ -67,37 +216,24 @@ def check_nt_or_aa(path_fasta: PosixPath):
         "*",
         "-",
     ]
-    aa_specific = list(set(aa_letters) - set(nt_letters))
-    with open(path_fasta) as fasta_file:
-        file_lines = fasta_file.readlines()
-    sequence = ""
-    for line in file_lines:
-        if not line.startswith(">"):
-            sequence = sequence + line.strip()
-    aa_status = False
-    for aa in aa_specific:
-        if aa in sequence:
-            aa_status = True
-    return aa_status
+    aa_specific = set(aa_letters) - set(nt_letters)
+    checked = 0
+    with open_fasta(path_fasta) as fasta_file:
+        for line in fasta_file:
+            if line.startswith(">"):
+                continue
+            if not aa_specific.isdisjoint(line):
+                return True
+            checked += len(line.strip())
+            if sample_size is not None and checked >= sample_size:
+                break
+    return False
 
 
 def get_genome(ncbi_genome_name: str):
-    encoding = guess_type(ncbi_genome_name)[1]  # uses file extension
-    _open = partial(gzip.open, mode="rt") if encoding == "gzip" else open
-
-    with _open(ncbi_genome_name) as input_fasta:
-        genome_lines = input_fasta.readlines()
     genomes = {}
-    genomeid = ""
-    for line in genome_lines:
-        if line.startswith(">"):
-            if genomeid != "":
-                genomes[genomeid] = genome
-            genomeid = line.split()[0][1:]
-            genome = ""
-        else:
-            genome = genome + line.strip()
-    genomes[genomeid] = genome
+    for header, genome in read_fasta_records(ncbi_genome_name):
+        genomes[(header.split() or [""])[0]] = genome
     return genomes
 
 
@@ -107,30 +243,49 @@ def get_genes_gapseq(
     gapseq_model: Model,
     model_type: str,
     model_id: str,
+    indexed: bool = True,
 ):
-    genomes = get_genome(input_gapseq_genome_name)
+    """
+    Writing sequences of gapseq model genes (genome id and coordinates are
+    parts of gene id) to fasta file. With indexed, genome is not loaded into
+    memory, but sequences are read from the file with FastaIndex, if it can
+    be indexed.
+    """
+    genomes = None
+    if indexed:
+        try:
+            genomes = FastaIndex(input_gapseq_genome_name)
+        except ValueError:
+            genomes = None
+    if genomes is None:
+        genomes = get_genome(input_gapseq_genome_name)
     head, tail = os.path.split(input_gapseq_genome_name)
     output_genes_name_gapseq = (
         output_gene_folder
         / f"{os.path.splitext(tail)[0]}_{model_type}_{model_id}_genes.faa"
     )
-    gene_gapseq_fasta = open(output_genes_name_gapseq, "w")
-    for gene in gapseq_model.genes:
-        gene_gapseq_fasta.write(">" + gene.id + "\n")
-        start = gene.id.split("_")[-2]
-        end = gene.id.split("_")[-1]
-        genomeid = gene.id.removeprefix("gp_").removesuffix("_" + start + "_" + end)
-        if genomeid not in genomes.keys():
-            genomeid = ".".join(genomeid.rsplit("_", 1))
-        if genomeid not in genomes.keys():
-            return False, False
-        start = int(start)
-        end = int(end)
-        if start < end:
-            gene_gapseq_fasta.write(genomes.get(genomeid)[start:end] + "\n")
-        else:
-            gene_gapseq_fasta.write(genomes.get(genomeid)[end:start] + "\n")
-    gene_gapseq_fasta.close()
+    try:
+        with open(output_genes_name_gapseq, "w") as gene_gapseq_fasta:
+            for gene in gapseq_model.genes:
+                gene_gapseq_fasta.write(">" + gene.id + "\n")
+                start = gene.id.split("_")[-2]
+                end = gene.id.split("_")[-1]
+                genomeid = gene.id.removeprefix("gp_").removesuffix(
+                    "_" + start + "_" + end
+                )
+                if genomeid not in genomes.keys():
+                    genomeid = ".".join(genomeid.rsplit("_", 1))
+                if genomeid not in genomes.keys():
+                    return False, False
+                start = int(start)
+                end = int(end)
+                if start < end:
+                    gene_gapseq_fasta.write(genomes.get(genomeid)[start:end] + "\n")
+                else:
+                    gene_gapseq_fasta.write(genomes.get(genomeid)[end:start] + "\n")
+    finally:
+        if isinstance(genomes, FastaIndex):
+            genomes.close()
     aa_status = check_nt_or_aa(output_genes_name_gapseq)
     return output_genes_name_gapseq, aa_status
 
@@ -142,26 +297,15 @@ def get_genes_not_gapseq(
     model_type: str,
     model_id: str,
 ):
-    encoding = guess_type(input_genes_name)[1]  # uses file extension
-    _open = partial(gzip.open, mode="rt") if encoding == "gzip" else open
-
-    with _open(input_genes_name) as input_fasta:
-        lines = input_fasta.readlines()
     head, tail = os.path.split(input_genes_name)
     output_genes_name = (
         output_gene_folder
         / f"{os.path.splitext(tail)[0]}_{model_type}_{model_id}_genes.faa"
     )
 
-    genes_fasta = open(output_genes_name, "w")
-    new_id = ""
-    for line in lines:
-        if line.startswith(">"):
-            if new_id != "":
-                if new_id in model.genes:
-                    genes_fasta.write(">" + new_id + "\n")
-                    genes_fasta.write(gene)
-            old_id = line.strip().split(" ")[0][1:]
+    with open(output_genes_name, "w") as genes_fasta:
+        for header, gene in read_fasta_records(input_genes_name):
+            old_id = header.split(" ")[0]
             if model_type == "carveme":
                 new_id = "_".join(old_id.rsplit(".", 1))
                 new_id = new_id.replace(":", "_")
@@ -171,13 +315,9 @@ def get_genes_not_gapseq(
                 new_id = old_id
             else:
                 new_id = old_id
-            gene = ""
-        else:
-            gene = gene + line
-    if new_id in model.genes:
-        genes_fasta.write(">" + new_id + "\n")
-        genes_fasta.write(gene)
-    genes_fasta.close()
+            if new_id in model.genes:
+                genes_fasta.write(">" + new_id + "\n")
+                genes_fasta.write(gene + "\n")
     aa_status = check_nt_or_aa(output_genes_name)
     return output_genes_name, aa_status
 
@@ -190,77 +330,49 @@ def get_locus_tag_genes(
     out_aa_fasta: str,
     do_old_locus_tag: bool,
 ):
+    """
+    Writing nt and aa fasta files with locus tags (old locus tags if
+    do_old_locus_tag and they are present) as ids. Feature table is parsed
+    once into dictionaries locus_tag - old locus tag and product accession -
+    locus tag (first row is used for repeated keys), then fasta files are
+    streamed against them.
+    """
     feature_table = pd.read_csv(feature_table_name, sep="\t", compression="gzip")
-    out_nt = open(out_nt_fasta, "w")
-    with gzip.open(ncbi_cds_name, "rt") as cds:
-        locus_tags = []
-        for cdsl in cds:
-            if cdsl.startswith(">"):
-                if locus_tags != []:
-                    for lt in locus_tags:
-                        out_nt.write(">" + lt + "\n")
-                        out_nt.write(one_seq)
-                new_locus_tag = cdsl.split("[locus_tag=")[1].split("]")[0]
-                if do_old_locus_tag:
-                    attr = feature_table[
-                        (feature_table["locus_tag"] == new_locus_tag)
-                        & (feature_table["# feature"] == "gene")
-                    ]["attributes"]
-                    if attr.empty:
-                        old_locus_tag = new_locus_tag
-                    elif type(attr.values[0]) != str:
-                        old_locus_tag = new_locus_tag
-                    elif "old_locus_tag" not in attr.values[0]:
-                        old_locus_tag = new_locus_tag
-                    else:
-                        old_locus_tag = attr.values[0].split("old_locus_tag=")[1]
-                    locus_tags = old_locus_tag.split(",")
-                else:
-                    locus_tags = [new_locus_tag]
-                one_seq = ""
+    old_locus_tags = {}
+    if do_old_locus_tag:
+        genes = feature_table[feature_table["# feature"] == "gene"].drop_duplicates(
+            "locus_tag"
+        )
+        for locus_tag, attributes in zip(genes["locus_tag"], genes["attributes"]):
+            if type(attributes) == str and "old_locus_tag" in attributes:
+                old_locus_tags[locus_tag] = attributes.split("old_locus_tag=")[1]
+    cds = feature_table[feature_table["# feature"] == "CDS"].drop_duplicates(
+        "product_accession"
+    )
+    cds_locus_tags = dict(zip(cds["product_accession"], cds["locus_tag"]))
+
+    with open(out_nt_fasta, "w") as out_nt:
+        for header, one_seq in read_fasta_records(ncbi_cds_name):
+            new_locus_tag = header.split("[locus_tag=")[1].split("]")[0]
+            if do_old_locus_tag:
+                locus_tags = old_locus_tags.get(new_locus_tag, new_locus_tag).split(",")
             else:
-                one_seq = one_seq + cdsl
-    for lt in locus_tags:
-        out_nt.write(">" + lt + "\n")
-        out_nt.write(one_seq)
-    out_nt.close()
-    out_aa = open(out_aa_fasta, "w")
-    with gzip.open(ncbi_protein_name, "rt") as proteins:
-        locus_tags = []
-        for protl in proteins:
-            if protl.startswith(">"):
-                if locus_tags != []:
-                    for lt in locus_tags:
-                        out_aa.write(">" + lt + "\n")
-                        out_aa.write(one_seq)
-                pp_id = protl.split(" ")[0][1:]
-                pnew_locus_tag = feature_table[
-                    (feature_table["product_accession"] == pp_id)
-                    & (feature_table["# feature"] == "CDS")
-                ]["locus_tag"].values[0]
-                if do_old_locus_tag:
-                    attr = feature_table[
-                        (feature_table["locus_tag"] == pnew_locus_tag)
-                        & (feature_table["# feature"] == "gene")
-                    ]["attributes"]
-                    if attr.empty:
-                        pold_locus_tag = pnew_locus_tag
-                    elif type(attr.values[0]) != str:
-                        pold_locus_tag = pnew_locus_tag
-                    elif "old_locus_tag" not in attr.values[0]:
-                        pold_locus_tag = pnew_locus_tag
-                    else:
-                        pold_locus_tag = attr.values[0].split("old_locus_tag=")[1]
-                    locus_tags = pold_locus_tag.split(",")
-                else:
-                    locus_tags = pnew_locus_tag.split(",")
-                one_seq = ""
+                locus_tags = [new_locus_tag]
+            for lt in locus_tags:
+                out_nt.write(">" + lt + "\n")
+                out_nt.write(one_seq + "\n")
+    with open(out_aa_fasta, "w") as out_aa:
+        for header, one_seq in read_fasta_records(ncbi_protein_name):
+            pp_id = header.split(" ")[0]
+            pnew_locus_tag = cds_locus_tags[pp_id]
+            if do_old_locus_tag:
+                pold_locus_tag = old_locus_tags.get(pnew_locus_tag, pnew_locus_tag)
+                locus_tags = pold_locus_tag.split(",")
             else:
-                one_seq = one_seq + protl
-        for lt in locus_tags:
-            out_aa.write(">" + lt + "\n")
-            out_aa.write(one_seq)
-    out_aa.close()
+                locus_tags = pnew_locus_tag.split(",")
+            for lt in locus_tags:
+                out_aa.write(">" + lt + "\n")
+                out_aa.write(one_seq + "\n")
 
 
 def get_final_fasta_with_ncbi_assemble(
@@ -322,6 +434,187 @@ def get_final_fasta_with_ncbi_assemble(
     return final_nt_faa, final_aa_faa
 
 
+def split_threads(n_jobs: int, n_threads: int = -1):
+    """
+    Splitting budget of n_threads CPUs (all CPUs if n_threads is -1) between
+    n_jobs jobs. Returns number of jobs running at the same time and number of
+    threads for every job, so that together they don't exceed the budget.
+    """
+    if n_threads == -1:
+        n_threads = os.cpu_count() or 1
+    n_workers = max(1, min(n_jobs, n_threads))
+    return n_workers, max(1, n_threads // n_workers)
+
+
+def get_file_hash(path_to_file: PosixPath):
+    """Sha256 hash of file content."""
+    content_hash = hashlib.sha256()
+    with open(path_to_file, "rb") as fh:
+        for chunk in iter(lambda: fh.read(1 << 20), b""):
+            content_hash.update(chunk)
+    return content_hash.hexdigest()
+
+
+class BlastCache(object):
+    """
+    Cache of BLAST results (<model_id>_blast.tsv files) keyed by hashes of
+    query fasta and target fasta, BLAST program, its options and gemsembler
+    version. Results are stored on disk (by default in
+    ~/.local/share/gemsembler/blast_cache), so the same search is run only
+    once, also across assemblies and processes. Used only if requested (see
+    GatheredModels.assemble_supermodel). Hits and misses are counted in the
+    corresponding attributes.
+    """
+
+    def __init__(self, path_to_cache=None):
+        self.path_to_cache = path_to_cache
+        self.hits = 0
+        self.misses = 0
+
+    def __disk_path(self, cache_key):
+        path_to_cache = self.path_to_cache
+        if path_to_cache is None:
+            path_to_cache = user_data_path("gemsembler", ensure_exists=True)
+            path_to_cache = path_to_cache / "blast_cache"
+        Path(path_to_cache).mkdir(parents=True, exist_ok=True)
+        return Path(path_to_cache) / f"blast_{cache_key}.tsv"
+
+    @staticmethod
+    def get_key(query_hash: str, target_hash: str, program: str, *options):
+        key = " ".join(
+            [__version__, query_hash, target_hash, program, *[str(x) for x in options]]
+        )
+        return hashlib.sha256(key.encode()).hexdigest()
+
+    def get(self, cache_key: str, out_blast_file: PosixPath):
+        """Copying cached results to out_blast_file. Returns True if found."""
+        disk_path = self.__disk_path(cache_key)
+        if not disk_path.exists():
+            self.misses += 1
+            return False
+        shutil.copyfile(disk_path, out_blast_file)
+        self.hits += 1
+        return True
+
+    def set(self, cache_key: str, out_blast_file: PosixPath):
+        # writing to temporary file first, so other processes never read
+        # partially written results
+        disk_path = self.__disk_path(cache_key)
+        tmp_path = disk_path.with_suffix(f".{os.getpid()}.tmp")
+        shutil.copyfile(out_blast_file, tmp_path)
+        os.replace(tmp_path, disk_path)
+
+
+blast_cache = BlastCache()
+
+
+def run_command(name: str, args: list, log_folder: PosixPath, env: dict = None):
+    """
+    Running one job (program with list of its arguments) without shell.
+    Stdout and stderr of the job are streamed to <name>.log in log_folder.
+    Raises OSError with the end of the log if the job fails. Returns path to
+    the log.
+    """
+    if env is None:
+        env = os.environ.copy()
+    program = shutil.which(args[0], path=env.get("PATH"))
+    if program is None:
+        raise OSError(f"Failed to run {name}: {args[0]} is not found")
+    log_file = Path(log_folder) / f"{name}.log"
+    with open(log_file, "w") as log:
+        run = subprocess.run(
+            [program, *[str(arg) for arg in args[1:]]],
+            stdout=log,
+            stderr=subprocess.STDOUT,
+            env=env,
+        )
+    if run.returncode != 0:
+        with open(log_file) as log:
+            log_end = "".join(log.readlines()[-20:])
+        raise OSError(f"Failed to run {name} (log in {log_file}):\n{log_end}")
+    return log_file
+
+
+def run_commands(
+    commands: dict, log_folder: PosixPath, max_workers: int = 1, env: dict = None
+):
+    """
+    Running jobs from commands (dict of job name - program with list of its
+    arguments) with run_command, at most max_workers jobs at the same time.
+    Returns dict of job name - path to its log, when all jobs are finished.
+    """
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        futures = {
+            name: executor.submit(run_command, name, args, log_folder, env)
+            for name, args in commands.items()
+        }
+        return {name: future.result() for name, future in futures.items()}
+
+
+def get_sequence_hash(sequence: str):
+    """
+    Hash of normalized sequence: upper case without gaps in the sequence and
+    stop codon symbol at the end.
+    """
+    sequence = "".join(sequence.split()).upper().rstrip("*")
+    return hashlib.sha1(sequence.encode()).digest()
+
+
+def get_sequence_index(path_fasta: PosixPath):
+    """
+    Index of sequences of fasta file as dictionary of sequence hash - id of
+    the first sequence with this hash.
+    """
+    sequence_index = {}
+    for seq_id, sequence in read_fasta(path_fasta):
+        sequence_index.setdefault(get_sequence_hash(sequence), seq_id)
+    return sequence_index
+
+
+def match_exact_sequences(
+    path_query: PosixPath, sequence_index: dict, path_remainder: PosixPath
+):
+    """
+    Finding query sequences identical to sequences from sequence_index (see
+    get_sequence_index). Returns rows for exact matches in BLAST tabular
+    format (outfmt 6, bit score is approximated as twice the alignment length,
+    close to bit score of identical sequences in BLAST) and number of
+    sequences without exact match, which are written to path_remainder fasta
+    for BLAST.
+    """
+    exact_rows = []
+    n_remainder = 0
+    with open(path_remainder, "w") as remainder:
+        for seq_id, sequence in read_fasta(path_query):
+            target_id = sequence_index.get(get_sequence_hash(sequence))
+            if target_id is None:
+                remainder.write(f">{seq_id}\n{sequence}\n")
+                n_remainder += 1
+            else:
+                length = len("".join(sequence.split()).rstrip("*"))
+                exact_rows.append(
+                    [seq_id, target_id, "100.000", length, 0, 0]
+                    + [1, length, 1, length, "0.0", 2 * length]
+                )
+    return exact_rows, n_remainder
+
+
+def write_blast_results(
+    exact_rows: list, out_blast_file: PosixPath, path_blast_results=None
+):
+    """
+    Writing rows of exact matches (see match_exact_sequences) and results of
+    BLAST for the rest of sequences (if path_blast_results is given) to one
+    table in BLAST tabular format.
+    """
+    with open(out_blast_file, "w") as out_blast:
+        for row in exact_rows:
+            out_blast.write("\t".join(str(x) for x in row) + "\n")
+        if path_blast_results is not None:
+            with open(path_blast_results) as blast_results:
+                shutil.copyfileobj(blast_results, out_blast)
+
+
 def makeNewGPR(gpr: str, g_id_convert: dict):
     new_gpr = gpr
     mix_gpr = gpr
@@ -45,11 +45,13 @@ def getSuggestionPeriplasmic(
     met_sel: dict,
     model: cobra.core.model.Model,
     bigg_network: dict,
+    metabolite_reactions: dict = None,
 ):
     """ Getting dictionary of metabolites that gave reaction equation if their compartment is changed to periplasmic and
      dictionary with corresponding reactions. Also, getting ids for transport reactions for metabolite from original
      compartment to periplasmic. Checking which metabolites are changed to periplasmic in all their reactions (replace)
-     and wich in part of their reactions (not_replace - split). """
+     and wich in part of their reactions (not_replace - split). Number of reactions for every metabolite can be given
+     in metabolite_reactions, otherwise it is taken from the model. """
     met_periplasmic = {}
     react_periplasmic = {}
     bigg_met_comp_sel = [
@@ -104,5 +106,9 @@ def getSuggestionPeriplasmic(
                         struct.suggestions["orig_m"][i]
                     ).add_periplasmic_r()
     for orig_m, periplasmic_m in met_periplasmic.items():
-        periplasmic_m.replace_status(len(model.metabolites.get_by_id(orig_m).reactions))
+        if metabolite_reactions is None:
+            all_r_for_met = len(model.metabolites.get_by_id(orig_m).reactions)
+        else:
+            all_r_for_met = metabolite_reactions[orig_m]
+        periplasmic_m.replace_status(all_r_for_met)
     return met_periplasmic, react_periplasmic
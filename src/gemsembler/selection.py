@@ -1,5 +1,16 @@
 from collections import defaultdict
 
+import pandas as pd
+
+
+# Status codes of consistency check stored in Selected objects
+STATUS_YES = 0
+STATUS_NOT_CONVERTED = 1
+STATUS_NOT_CONSISTENT = 2
+STATUS_CAN_BE_NOT_CONSISTENT = 3
+STATUS_CHANGED = 4
+STATUS_COULD_BE_CHANGED = 5
+
 
 class Selected(object):
     """
@@ -8,14 +19,28 @@ class Selected(object):
     (highest_consistent), have to be consistent. After structural stage
     replace_with_consistent = False and results, going further
     (highest_consistent), don't change (highest). How results of consistency
-    check differ from original is written in consistency attr. Compartments are
-    just passed through for later. To_one_id shows amount of result ids
+    check differ from original is stored as status code and rendered as text in
+    consistent attr only when it is accessed. Compartments are just passed
+    through for later. To_one_id shows amount of result ids
     (highest_consistent): True if 1, False if more than 1 and None if there is
     highest_consistent is empty. From_one_id is set as None and will become
     True or False in checkFromOneFromMany function. From_many_other_ids is set
     as empty list and will be populated later in checkFromOneFromMany function.
     """
 
+    __slots__ = (
+        "to_one_id",
+        "from_one_id",
+        "_from_many",
+        "compartments",
+        "in_other_models",
+        "highest_consistent",
+        "status",
+        "_highest",
+        "_consistent",
+        "_other_highest",
+    )
+
     def __init__(
         self,
         compartments: list,
@@ -30,9 +55,10 @@ class Selected(object):
         if consistent is None:
             consistent = highest
 
-        self.to_one_id = None
         self.from_one_id = None
-        self.from_many_other_ids = []
+        # group of original ids with the same results and position of this
+        # object in the group, shared between objects of the group
+        self._from_many = ((), None)
         self.compartments = compartments
         if other_present is None:
             self.in_other_models = {}
@@ -44,42 +70,69 @@ class Selected(object):
             self.highest_consistent = highest
         if not consistent:
             if not highest:
-                self.consistent = f"Not converted"
+                self.status = STATUS_NOT_CONVERTED
             elif replace_with_consistent:
-                self.consistent = (
-                    f"Not consistent. Originally bigg ids were {' '.join(highest)}. But in other models "
-                    f"bigg ids were {other_highest}"
-                )
+                self.status = STATUS_NOT_CONSISTENT
             else:
-                self.consistent = (
-                    f"Can be considered as not consistent. Originally bigg ids were {' '.join(highest)}. "
-                    f"But in other models bigg ids were {other_highest}"
-                )
-        elif set(consistent) == set(highest):
-            self.consistent = "Yes"
+                self.status = STATUS_CAN_BE_NOT_CONSISTENT
+        elif consistent is highest or set(consistent) == set(highest):
+            self.status = STATUS_YES
         elif replace_with_consistent:
-            self.consistent = (
+            self.status = STATUS_CHANGED
+        else:
+            self.status = STATUS_COULD_BE_CHANGED
+        # references for rendering consistent message, not needed for the
+        # most common statuses
+        if self.status in (STATUS_YES, STATUS_NOT_CONVERTED):
+            self._highest = self._consistent = self._other_highest = None
+        else:
+            self._highest = highest
+            self._consistent = consistent
+            self._other_highest = other_highest
+        if not self.highest_consistent:
+            self.to_one_id = None
+        else:
+            self.to_one_id = len(self.highest_consistent) == 1
+
+    @property
+    def from_many_other_ids(self):
+        group, position = self._from_many
+        if position is None:
+            return list(group)
+        return list(group[:position] + group[position + 1 :])
+
+    @from_many_other_ids.setter
+    def from_many_other_ids(self, other_ids):
+        self._from_many = (tuple(other_ids), None)
+
+    @property
+    def consistent(self):
+        if self.status == STATUS_YES:
+            return "Yes"
+        if self.status == STATUS_NOT_CONVERTED:
+            return "Not converted"
+        highest = self._highest
+        consistent = self._consistent
+        other_highest = self._other_highest
+        if self.status == STATUS_NOT_CONSISTENT:
+            return (
+                f"Not consistent. Originally bigg ids were {' '.join(highest)}. But in other models "
+                f"bigg ids were {other_highest}"
+            )
+        if self.status == STATUS_CAN_BE_NOT_CONSISTENT:
+            return (
+                f"Can be considered as not consistent. Originally bigg ids were {' '.join(highest)}. "
+                f"But in other models bigg ids were {other_highest}"
+            )
+        if self.status == STATUS_CHANGED:
+            return (
                 f"Changed: from {', '.join(highest)} to {', '.join(consistent)}. In other models bigg "
                 f"ids were {other_highest}"
             )
-        else:
-            self.consistent = (
-                f"Could be Changed: from {', '.join(highest)} to {', '.join(consistent)}. In other "
-                f"models bigg ids were {other_highest}"
-            )
-        if len(self.highest_consistent) == 1:
-            self.to_one_id = True
-        if len(self.highest_consistent) > 1:
-            self.to_one_id = False
-
-    # adding results of mapping for selected objects with the same original id,
-    # but from other models
-    def check_others(self, original_id, selected: dict):
-        for other_model in self.in_other_models.keys():
-            self.in_other_models[other_model] = [
-                selected[other_model][original_id].to_one_id,
-                selected[other_model][original_id].from_one_id,
-            ]
+        return (
+            f"Could be Changed: from {', '.join(highest)} to {', '.join(consistent)}. In other "
+            f"models bigg ids were {other_highest}"
+        )
 
 
 def checkDBConsistency(
@@ -107,78 +160,68 @@ def checkDBConsistency(
                     idd: Selected(
                         species.compartments,
                         replace_with_consistent,
-                        getattr(species, attr_to_check),
+                        list(getattr(species, attr_to_check)),
                     )
                     for idd, species in converted_models.get(model_id).items()
                 }
         # consistency check
         else:
-            # Get a unique set of ids for metabolites or reactions from all
-            # models associated with the same database
-            all_species_ids = set.union(
-                *[
-                    set(species.keys())  # mb or rcts ids
-                    for model_id, species in converted_models.items()
-                    if model_id in models.keys()
-                ]
+            # Table with one row per original id per model, keeping model order
+            # and order of ids inside models
+            species_table = pd.DataFrame(
+                [
+                    (model_id, iid, list(getattr(species, attr_to_check)))
+                    for model_id in models.keys()
+                    for iid, species in converted_models.get(model_id).items()
+                ],
+                columns=["model_id", "orig_id", "bigg_ids"],
+            )
+            # models in which every original id is present
+            models_present = (
+                species_table.groupby("orig_id", sort=False)["model_id"]
+                .agg(set)
+                .to_dict()
+            )
+            # exploding not empty lists into (model_id, orig_id, bigg_id) rows,
+            # because intersecting #[[b1, b2], []] isn't reasonable
+            converted_table = (
+                species_table.explode("bigg_ids")
+                .dropna(subset="bigg_ids")
+                .drop_duplicates()
+            )
+            # bigg id is in intersection if it is found in all models, in
+            # which original id was converted
+            num_converted = converted_table.groupby("orig_id", sort=False)[
+                "model_id"
+            ].transform("nunique")
+            num_found = converted_table.groupby(["orig_id", "bigg_ids"], sort=False)[
+                "model_id"
+            ].transform("size")
+            common_ids = (
+                converted_table[num_found == num_converted]
+                .drop_duplicates(["orig_id", "bigg_ids"])
+                .groupby("orig_id", sort=False)["bigg_ids"]
+                .agg(list)
+                .to_dict()
             )
+            # dict connecting ids and models for making .in_other_models attr
+            bigg_ids_dict = defaultdict(dict)
+            for model_id, iid, species_attr in species_table.itertuples(index=False):
+                if species_attr:
+                    bigg_ids_dict[iid][model_id] = species_attr
 
-            # looping through all id through all models with the same db type
-            for iid in all_species_ids:
-                # list for intersecting present ids from models with different
-                # db #[[b1, b2], [b1]]
-                bigg_ids = []
-                # dict connecting ids and models for making .in_other_models attr
-                bigg_ids_dict = {}
-                models_present = []
-                for model_id in models.keys():
-                    species = converted_models.get(model_id).get(iid)
-                    if species is not None:
-                        species_attr = getattr(species, attr_to_check)
-
-                        # collecting in models ids is present
-                        models_present.append(model_id)
-
-                        # adding only not empty lists because intersecting
-                        # #[[b1, b2], []] isn't reasonable
-                        if species_attr:
-                            bigg_ids.append(species_attr)
-                            bigg_ids_dict[model_id] = species_attr
-
-                # if list for intersection is totally empty no intersection is needed
-                if not bigg_ids:
-                    for pres in models_present:
-                        consistent[pres].update(
-                            {
-                                iid: Selected(
-                                    converted_models.get(pres).get(iid).compartments,
-                                    replace_with_consistent,
-                                    other_present=set(models_present) - {pres},
-                                )
-                            }
-                        )
-                # intersecting result ids for the same original id from models with different db
-                else:
-                    common_ids = list(set.intersection(*map(set, bigg_ids)))
-                    for present in models_present:
-                        other_ids = {
-                            k: v for k, v in bigg_ids_dict.items() if k != present
-                        }
-                        consistent[present].update(
-                            {
-                                iid: Selected(
-                                    converted_models.get(present).get(iid).compartments,
-                                    replace_with_consistent,
-                                    getattr(
-                                        converted_models.get(present).get(iid),
-                                        attr_to_check,
-                                    ),
-                                    common_ids,
-                                    set(models_present) - {present},
-                                    other_ids,
-                                )
-                            }
-                        )
+            for model_id, iid, species_attr in species_table.itertuples(index=False):
+                other_ids = {
+                    k: v for k, v in bigg_ids_dict[iid].items() if k != model_id
+                }
+                consistent[model_id][iid] = Selected(
+                    converted_models.get(model_id).get(iid).compartments,
+                    replace_with_consistent,
+                    species_attr,
+                    common_ids.get(iid, []),
+                    models_present[iid] - {model_id},
+                    other_ids,
+                )
     return consistent
 
 
@@ -189,24 +232,40 @@ def checkFromOneFromMany(selected: dict):
     the same results (from_one_id = False).  Writing down original ids with the
     same results in from_many_other_ids.
     """
-    # making dict with original ids and bigg results ids as str instead of list
-    to_smth_str = {
-        orig_id: " ".join(sorted(bigg_ids.highest_consistent))
-        for orig_id, bigg_ids in selected.items()
-    }
-    # creating empty dict with bigg results as keys
-    reversed_to_smth = {bigg_id: [] for bigg_id in to_smth_str.values()}
-    # populating bigg keys in the empty dict with original ids, for which these bigg ids are results
-    for k, v in to_smth_str.items():
-        reversed_to_smth[v].append(k)
+    # index of bigg results as sorted tuples with original ids, for which these
+    # bigg ids are results
+    results_index = defaultdict(list)
+    for orig_id, sel in selected.items():
+        results_index[tuple(sorted(sel.highest_consistent))].append(orig_id)
     # writing check results depending on amount of original ids for bigg results
-    for value in reversed_to_smth.values():
-        if len(value) == 1:
-            selected[value[0]].from_one_id = True
+    for orig_ids in results_index.values():
+        if len(orig_ids) == 1:
+            selected[orig_ids[0]].from_one_id = True
         else:
-            for val in value:
-                selected[val].from_one_id = False
-                selected[val].from_many_other_ids = list(set(value) - {val})
+            group = tuple(orig_ids)
+            for position, orig_id in enumerate(group):
+                selected[orig_id].from_one_id = False
+                selected[orig_id]._from_many = (group, position)
+
+
+def checkInOtherModels(selected_models: dict):
+    """
+    Adding results of mapping for selected objects with the same original id,
+    but from other models. Index of original ids with [to_one_id, from_one_id]
+    per model is made once and then used for all selected objects.
+    """
+    status_index = defaultdict(dict)
+    for model_id, selected in selected_models.items():
+        for orig_id, sel in selected.items():
+            status_index[orig_id][model_id] = [sel.to_one_id, sel.from_one_id]
+    for selected in selected_models.values():
+        for orig_id, sel in selected.items():
+            if sel.in_other_models:
+                statuses = status_index[orig_id]
+                sel.in_other_models = {
+                    other_model: statuses[other_model]
+                    for other_model in sel.in_other_models.keys()
+                }
 
 
 def run_selection(
@@ -229,7 +288,5 @@ def run_selection(
     )
     for s in first_stage_selected.values():
         checkFromOneFromMany(s)
-    for ss in first_stage_selected.values():
-        for or_id, sel in ss.items():
-            sel.check_others(or_id, first_stage_selected)
+    checkInOtherModels(first_stage_selected)
     return first_stage_selected
@@ -1,12 +1,21 @@
+import hashlib
 import itertools
+import json
+import sqlite3
 from collections import defaultdict
+from contextlib import closing
 from copy import deepcopy
 from itertools import combinations
 
 import cobra
+from platformdirs import user_data_path
 
 from .selection import Selected
 
+# Bump whenever the structural conversion logic changes, so that results cached
+# by older versions are not reused
+STRUCTURAL_CACHE_VERSION = 1
+
 
 class StructuralR(object):
     def __init__(self, bigg_structural: dict, selected: Selected):
@@ -122,6 +131,100 @@ class StructuralM(object):
         self.comment = comment
 
 
+def getNetworkHash(bigg_network_r: dict) -> str:
+    """ Getting hash of BiGG network, so that cached results are only reused for the same network """
+    network_hash = hashlib.sha256(str(STRUCTURAL_CACHE_VERSION).encode())
+    for equation, reaction in sorted(bigg_network_r.items()):
+        network_hash.update(f"{equation}\t{reaction}\n".encode())
+    return network_hash.hexdigest()
+
+
+def getReactionSignature(
+    orig_met1: list, orig_met2: list, selected_met: dict, do_priplasmic: bool
+) -> str:
+    """ Getting canonical signature of reaction for structural conversion: everything
+    convertReactionViaNetworkStructure depends on for both sides of the reaction """
+
+    def side_signature(orig_met):
+        return [
+            [
+                met,
+                selected_met[met].compartments,
+                selected_met[met].to_one_id,
+                selected_met[met].from_one_id,
+                selected_met[met].highest_consistent,
+            ]
+            for met in orig_met
+        ]
+
+    signature = json.dumps(
+        [side_signature(orig_met1), side_signature(orig_met2), do_priplasmic]
+    )
+    return hashlib.sha256(signature.encode()).hexdigest()
+
+
+class StructuralCache(object):
+    """
+    On-disk cache of structural conversion results shared between runs and
+    processes. Results are stored in SQLite database (by default in
+    ~/.local/share/gemsembler) keyed by hash of BiGG network and canonical
+    reaction signature. Database is opened in WAL mode, so several processes
+    can read and write the cache at the same time.
+    """
+
+    def __init__(self, bigg_network: dict, path_to_cache=None):
+        if path_to_cache is None:
+            path_to_cache = (
+                user_data_path("gemsembler", ensure_exists=True)
+                / "structural_cache.sqlite"
+            )
+        self.path_to_cache = path_to_cache
+        self.network_hash = getNetworkHash(bigg_network)
+        self.hits = 0
+        self.misses = 0
+        with closing(self.__connect()) as con, con:
+            con.execute(
+                "CREATE TABLE IF NOT EXISTS structural ("
+                "network_hash TEXT NOT NULL, "
+                "signature TEXT NOT NULL, "
+                "result TEXT NOT NULL, "
+                "PRIMARY KEY (network_hash, signature))"
+            )
+
+    def __connect(self):
+        con = sqlite3.connect(self.path_to_cache, timeout=60)
+        con.execute("PRAGMA journal_mode=WAL")
+        return con
+
+    def get_many(self, signatures: list, chunk_size=500) -> dict:
+        signatures = list(set(signatures))
+        found = {}
+        with closing(self.__connect()) as con:
+            for i in range(0, len(signatures), chunk_size):
+                chunk = signatures[i : i + chunk_size]
+                rows = con.execute(
+                    "SELECT signature, result FROM structural WHERE network_hash = ? "
+                    f"AND signature IN ({', '.join('?' * len(chunk))})",
+                    [self.network_hash, *chunk],
+                )
+                found.update({sig: json.loads(result) for sig, result in rows})
+        self.hits += len(found)
+        self.misses += len(signatures) - len(found)
+        return found
+
+    def set_many(self, results: dict):
+        if not results:
+            return
+        with closing(self.__connect()) as con, con:
+            con.executemany(
+                "INSERT OR IGNORE INTO structural VALUES (?, ?, ?)",
+                [
+                    (self.network_hash, sig, json.dumps(result))
+                    for sig, result in results.items()
+                ],
+            )
+
+
 def getReaction(bigg_met1, bigg_met2, bigg_network_r, comment):
     """ Find reaction id from reaction's metabolites """
 
@@ -473,18 +576,30 @@ def convertReactionViaNetworkStructure(
     return bigg_r
 
 
+def getReactionMetabolites(model: cobra.core.model.Model):
+    """ Getting dictionary of reaction ids with lists of ids of reactants and products for all reactions of the model
+    at once instead of querying cobra reactions one by one in every stage. """
+    return {
+        r.id: ([met1.id for met1 in r.reactants], [met2.id for met2 in r.products])
+        for r in model.reactions
+    }
+
+
 def runStructuralCheck(
     react_checked: dict,
     met_checked: dict,
     model: cobra.core.model.Model,
     bigg_network: dict,
+    reaction_metabolites: dict = None,
 ):
     """ Checking reactions equations for models with no conversion need (with BiGG ids originally). Should be in BiGG
-    database if not exchange or biomass reaction. """
+    database if not exchange or biomass reaction. Reactants and products are taken from reaction_metabolites if it is
+    given (see getReactionMetabolites). """
+    if reaction_metabolites is None:
+        reaction_metabolites = getReactionMetabolites(model)
     react_struct_checked = {}
     for id_r, sel in react_checked.items():
-        bigg_met1 = [met1.id for met1 in model.reactions.get_by_id(id_r).reactants]
-        bigg_met2 = [met2.id for met2 in model.reactions.get_by_id(id_r).products]
+        bigg_met1, bigg_met2 = reaction_metabolites[id_r]
         bigg_met1_checked = []
         bigg_met2_checked = []
         for m1 in bigg_met1:
@@ -546,23 +661,48 @@ def runStructuralConversion(
     model: cobra.core.model.Model,
     bigg_network: dict,
     models_periplasmic: bool,
+    cache: StructuralCache = None,
+    reaction_metabolites: dict = None,
 ):
-    """ Running structural conversion for all reactions. Selection reactions that have only 1 id as result """
+    """ Running structural conversion for all reactions. Selection reactions that have only 1 id as result.
+    If cache is given, results found in cache are reused and new results are added to the cache. Reactants and
+    products are taken from reaction_metabolites if it is given (see getReactionMetabolites) """
+    if reaction_metabolites is None:
+        reaction_metabolites = getReactionMetabolites(model)
     if model_db == "bigg":
         structural_conversion_r = runStructuralCheck(
-            first_stage_selected_r, first_stage_selected_m, model, bigg_network
+            first_stage_selected_r,
+            first_stage_selected_m,
+            model,
+            bigg_network,
+            reaction_metabolites,
         )
     else:
+        reactions_mets = {
+            orig_id: reaction_metabolites[orig_id]
+            for orig_id in first_stage_selected_r.keys()
+        }
+        signatures = {}
+        cached = {}
+        if cache is not None:
+            signatures = {
+                orig_id: getReactionSignature(
+                    orig_met1, orig_met2, first_stage_selected_m, models_periplasmic
+                )
+                for orig_id, (orig_met1, orig_met2) in reactions_mets.items()
+                if (len(orig_met1) <= 20) & (len(orig_met2) <= 20)
+            }
+            cached = cache.get_many(list(signatures.values()))
+        to_cache = {}
         structural_conversion_r = {}
         for orig_id, selected in first_stage_selected_r.items():
-            orig_met1 = [
-                react.id for react in model.reactions.get_by_id(orig_id).reactants
-            ]
-            orig_met2 = [pro.id for pro in model.reactions.get_by_id(orig_id).products]
+            orig_met1, orig_met2 = reactions_mets[orig_id]
             if (len(orig_met1) > 20) | (len(orig_met2) > 20):
                 structural_bigg_id = {
                     "Biomass": "No structural conversion since growth_reaction"
                 }
+            elif signatures.get(orig_id) in cached:
+                structural_bigg_id = cached[signatures[orig_id]]
             else:
                 structural_bigg_id = convertReactionViaNetworkStructure(
                     orig_met1,
@@ -571,9 +711,13 @@ def runStructuralConversion(
                     bigg_network,
                     models_periplasmic,
                 )
+                if cache is not None:
+                    to_cache[signatures[orig_id]] = structural_bigg_id
             structural_conversion_r.update(
                 {orig_id: StructuralR(structural_bigg_id, selected)}
             )
+        if cache is not None:
+            cache.set_many(to_cache)
     return structural_conversion_r
 
 
@@ -0,0 +1,609 @@
+import gc
+import json
+
+import numpy
+import pytest
+from cobra import Metabolite, Model, Reaction
+from cobra.util import create_stoichiometric_matrix
+
+from gemsembler.anticreation import (
+    MassBalance,
+    gapfill_transport_r,
+    get_interest_level,
+    get_level_attribute,
+    get_levels_matrices,
+    get_model_of_interest,
+    get_models_with_all_confidence_levels,
+    read_levels_matrices,
+    write_levels_matrices,
+)
+from gemsembler.comparison import ComparisonView, StoredComparisonView
+from gemsembler.creation import SuperModel
+
+SOURCES = ["A", "B", "C"]
+
+# id: (formula, charge)
+METABOLITES = {
+    "glc__D_e": ("C6H12O6", 0),
+    "glc__D_c": ("C6H12O6", 0),
+    "nh4_e": ("H4N", 1),
+    "nh4_c": ("H4N", 1),
+    "atp_c": ("C10H12N5O13P3", -4),
+    "adp_c": ("C10H12N5O10P2", -3),
+    "g6p_c": ("C6H11O9P", -2),
+    "h_c": ("H", 1),
+    "h2o_c": ("H2O", 0),
+    "pi_c": ("HO4P", -2),
+    "x_c": ("C2H4(OH)", None),
+    "q8_c": ("C49H74O4", float("nan")),
+    "q8h2_c": ("C49H76O4", 0),
+}
+
+# id: {source: (metabolites, lower bound, upper bound, gene reaction rule)}
+REACTIONS = {
+    "EX_glc__D_e": {s: ({"glc__D_e": -1}, -10.0, 1000.0, "") for s in ["A", "B", "C"]},
+    "EX_nh4_e": {s: ({"nh4_e": -1}, -1000.0, 1000.0, "") for s in ["A", "B", "C"]},
+    "GLCt": {
+        "A": ({"glc__D_e": -1, "glc__D_c": 1}, 0.0, 1000.0, "g1"),
+        "B": ({"glc__D_e": -1, "glc__D_c": 1}, -1000.0, 1000.0, "g1 or g2"),
+    },
+    "NH4t": {"C": ({"nh4_e": -1, "nh4_c": 1}, -1000.0, 1000.0, "g4")},
+    "HEX1": {
+        "A": (
+            {"glc__D_c": -1, "atp_c": -1, "g6p_c": 1, "adp_c": 1, "h_c": 1},
+            0.0,
+            1000.0,
+            "g3",
+        ),
+        "B": (
+            {"glc__D_c": -1, "atp_c": -1, "g6p_c": 1, "adp_c": 1, "h_c": 1},
+            0.0,
+            1000.0,
+            "g3",
+        ),
+        "C": ({"glc__D_c": -1, "atp_c": -1, "g6p_c": 1, "adp_c": 1}, 0.0, 1000.0, "g3"),
+    },
+    "ATPM": {
+        "A": ({"atp_c": -1, "h2o_c": -1, "adp_c": 1, "pi_c": 1}, 0.0, 0.0, "g2"),
+        "B": (
+            {"atp_c": -1, "h2o_c": -1, "adp_c": 1, "pi_c": 1, "h_c": 1},
+            3.0,
+            3.0,
+            "g2 and g3",
+        ),
+        "C": (
+            {"atp_c": -1, "h2o_c": -1, "adp_c": 1, "pi_c": 1, "h_c": 0},
+            0.0,
+            1000.0,
+            "",
+        ),
+    },
+    "XR": {"C": ({"x_c": -1, "g6p_c": 1}, 0.0, 1000.0, "g4")},
+    "Q8R": {"A": ({"q8_c": -1, "h_c": -2, "q8h2_c": 1}, 0.0, 1000.0, "g5")},
+    "Biomass": {
+        s: (
+            {"atp_c": -1, "h2o_c": -1, "g6p_c": -0.5, "adp_c": 1, "pi_c": 1},
+            0.0,
+            1000.0,
+            "",
+        )
+        for s in ["A", "B", "C"]
+    },
+}
+
+
+def get_supermodel() -> SuperModel:
+    """Small supermodel of three sources in the format of supermodel JSON file.
+    Assembly attributes are taken from core1 level like in SuperModel."""
+    in_sources = {"metabolites": {}, "genes": {}}
+    for r_id, r_sources in REACTIONS.items():
+        for source, (metabolites, lower_bound, upper_bound, gpr) in r_sources.items():
+            for met_id in metabolites:
+                in_sources["metabolites"].setdefault(met_id, {})
+                in_sources["metabolites"][met_id].setdefault(source, []).append(r_id)
+            for gene_id in gpr.replace("(", " ").replace(")", " ").split():
+                if gene_id not in ("and", "or"):
+                    in_sources["genes"].setdefault(gene_id, {})
+                    gene_reactions = in_sources["genes"][gene_id].setdefault(source, [])
+                    if r_id not in gene_reactions:
+                        gene_reactions.append(r_id)
+
+    def get_element(e_id, e_sources, **kwargs):
+        models_list = [s for s in SOURCES if s in e_sources]
+        return {
+            "new_id": e_id,
+            "compartments": {s: [e_id[-1]] for s in models_list + ["assembly"]},
+            "sources": {s: int(s in e_sources) for s in SOURCES},
+            "in_models": {
+                "models_amount": len(models_list),
+                "models_list": models_list,
+            },
+            "annotation": {s: [e_id] if s in e_sources else [] for s in SOURCES},
+            "converted": True,
+            **kwargs,
+        }
+
+    def get_tags(ids_by_source):
+        tags = {s: [f"~{x}" for x in ids_by_source.get(s, [])] for s in SOURCES}
+        tags.update({"assembly": [], "comparison": {}})
+        return tags
+
+    metabolites = {}
+    for met_id, met_sources in in_sources["metabolites"].items():
+        formula, charge = METABOLITES[met_id]
+        metabolites[met_id] = get_element(
+            met_id,
+            met_sources,
+            type="NewMetabolite",
+            name=met_id,
+            formula={s: [formula] if s in met_sources else [] for s in SOURCES},
+            charge={s: [charge] if s in met_sources else [] for s in SOURCES},
+            formula_bigg=formula,
+            charge_bigg=charge,
+            reactions=get_tags(met_sources),
+        )
+    reactions = {}
+    for r_id, r_sources in REACTIONS.items():
+        get_sources = {
+            s: {
+                "reactants": [m for m, k in r_sources[s][0].items() if k < 0],
+                "products": [m for m, k in r_sources[s][0].items() if k > 0],
+                "genes": [
+                    g
+                    for g, g_sources in in_sources["genes"].items()
+                    if r_id in g_sources.get(s, [])
+                ],
+            }
+            for s in r_sources
+        }
+        reactions[r_id] = get_element(
+            r_id,
+            r_sources,
+            type="NewReaction",
+            name=r_id,
+            reaction=None,
+            reactants=get_tags({s: v["reactants"] for s, v in get_sources.items()}),
+            products=get_tags({s: v["products"] for s, v in get_sources.items()}),
+            genes=get_tags({s: v["genes"] for s, v in get_sources.items()}),
+            metabolites={
+                **{
+                    s: (
+                        {f"~{m}": k for m, k in r_sources[s][0].items()}
+                        if s in r_sources
+                        else {}
+                    )
+                    for s in SOURCES
+                },
+                "assembly": {},
+                "comparison": {},
+            },
+            lower_bound={
+                **{s: [r_sources[s][1]] if s in r_sources else [] for s in SOURCES},
+                "assembly": [],
+                "comparison": {},
+            },
+            upper_bound={
+                **{s: [r_sources[s][2]] if s in r_sources else [] for s in SOURCES},
+                "assembly": [],
+                "comparison": {},
+            },
+            subsystem={s: ["test"] if s in r_sources else [] for s in SOURCES},
+            gene_reaction_rule={
+                **{
+                    s: [r_sources[s][3]] if s in r_sources and r_sources[s][3] else []
+                    for s in SOURCES
+                },
+                **{s + "_mixed": [] for s in SOURCES},
+                "assembly": [],
+                "comparison": {},
+            },
+        )
+    genes = {
+        gene_id: {
+            key: value
+            for key, value in get_element(gene_id, gene_sources).items()
+            if key != "compartments"
+        }
+        | {"reactions": get_tags(gene_sources)}
+        for gene_id, gene_sources in in_sources["genes"].items()
+    }
+
+    def get_set(elements):
+        return json.dumps(
+            {
+                "assembly": {e_id: json.dumps(e) for e_id, e in elements.items()},
+                "comparison": {},
+                "notconverted": {},
+            }
+        )
+
+    supermodel = SuperModel(
+        True,
+        {
+            "type": "SuperModel",
+            "args": {
+                "sources": SOURCES,
+                "metabolites": get_set(metabolites),
+                "reactions": get_set(reactions),
+                "genes": get_set(genes),
+            },
+        },
+    )
+    assembly = ComparisonView(supermodel, "core", core_size=1)
+    for met in supermodel.metabolites.assembly.values():
+        met.reactions["assembly"] = assembly.get(met, "reactions")
+    for gene in supermodel.genes.assembly.values():
+        gene.reactions["assembly"] = assembly.get(gene, "reactions")
+    for r in supermodel.reactions.assembly.values():
+        for attr in [
+            "reactants",
+            "products",
+            "genes",
+            "gene_reaction_rule",
+            "lower_bound",
+            "upper_bound",
+            "metabolites",
+        ]:
+            getattr(r, attr)["assembly"] = assembly.get(r, attr)
+    return supermodel
+
+
+def check_cobra_mass_balance(metabolites: dict) -> dict:
+    """Balance of supermodel metabolites with coefficients calculated by cobra"""
+    reaction = Reaction("balance")
+    reaction.add_metabolites(
+        {
+            Metabolite(met.id, formula=met.formula_bigg, charge=met.charge_bigg): k
+            for met, k in metabolites.items()
+        }
+    )
+    return reaction.check_mass_balance()
+
+
+def assert_same_balance(balance: dict, expected: dict):
+    assert list(balance.keys()) == list(expected.keys())
+    numpy.testing.assert_allclose(list(balance.values()), list(expected.values()))
+
+
+def get_model_one_by_one(supermodel: SuperModel, level: str) -> Model:
+    """Model of level without curation made like before ModelBuilder: new
+    metabolites for every reaction and reactions added one by one."""
+    level = get_interest_level(supermodel, level)
+    if isinstance(level, ComparisonView):
+        reactions = level.reactions.values()
+    else:
+        reactions = getattr(supermodel.reactions, level).values()
+    model = Model("model")
+    for r in reactions:
+        if r.id == "Biomass":
+            continue
+        out_reaction = Reaction(r.id)
+        out_reaction.name = r.name
+        out_reaction.subsystem = "".join(
+            "#" + source + "#" + r.subsystem.get(source)[0]
+            for source in r.in_models["models_list"]
+        )
+        out_reaction.lower_bound = get_level_attribute(r, "lower_bound", level)[0]
+        out_reaction.upper_bound = get_level_attribute(r, "upper_bound", level)[0]
+        for met, k in get_level_attribute(r, "metabolites", level).items():
+            out_met = Metabolite(
+                met.id,
+                name=met.name,
+                compartment=met.compartments["assembly"][0],
+                formula=met.formula_bigg,
+                charge=met.charge_bigg,
+            )
+            out_reaction.add_metabolites({out_met: k})
+        gene_reaction_rule = get_level_attribute(r, "gene_reaction_rule", level)
+        out_reaction.gene_reaction_rule = (
+            gene_reaction_rule[0] if gene_reaction_rule else ""
+        )
+        model.add_reactions([out_reaction])
+    return model
+
+
+def gapfill_transport_r_one_by_one(cobra_model: Model, supermodel: SuperModel):
+    """Transport gap-filling like before transport index: checking reactions of
+    every exchanged metabolite in supermodel and adding reactions one by one."""
+    transport_r = []
+    for exchange in cobra_model.exchanges:
+        met_e = list(exchange.reactants)[0].id
+        met_c = list(exchange.reactants)[0].id[:-1] + "c"
+        cobra_transport = False
+        for r in cobra_model.metabolites.get_by_id(met_e).reactions:
+            r_react = [m.id for m in r.reactants]
+            r_pro = [m.id for m in r.products]
+            if ((met_e in r_react) & (met_c in r_pro)) | (
+                (met_e in r_pro) & (met_c in r_react)
+            ):
+                cobra_transport = True
+        if not cobra_transport:
+            if met_c in supermodel.metabolites.assembly.keys():
+                for r_super in supermodel.metabolites.assembly.get(met_e).reactions.get(
+                    "assembly"
+                ):
+                    rs_react = [m.id for m in r_super.reactants.get("assembly")]
+                    rs_pro = [m.id for m in r_super.products.get("assembly")]
+                    if ((met_e in rs_react) & (met_c in rs_pro)) | (
+                        (met_e in rs_pro) & (met_c in rs_react)
+                    ):
+                        transport_r.append(r_super)
+    for tr in list(set(transport_r)):
+        tr_r = Reaction(tr.id)
+        tr_r.name = tr.name if tr.name else ""
+        tr_r.subsystem = "".join(
+            "#" + source + "#" + tr.subsystem.get(source)[0]
+            for source in tr.in_models["models_list"]
+        )
+        tr_r.lower_bound = tr.lower_bound.get("assembly")[0]
+        tr_r.upper_bound = tr.upper_bound.get("assembly")[0]
+        for met, k in tr.metabolites.get("assembly").items():
+            tr_met = Metabolite(met.id, name=met.name, compartment=met.id[-1])
+            tr_r.add_metabolites({tr_met: k})
+        cobra_model.add_reactions([tr_r])
+
+
+def get_model_summary(model: Model) -> dict:
+    return {
+        "reactions": sorted(
+            (
+                r.id,
+                r.name,
+                r.reaction,
+                r.bounds,
+                r.gene_reaction_rule,
+                r.subsystem,
+                sorted((m.id, k) for m, k in r.metabolites.items()),
+            )
+            for r in model.reactions
+        ),
+        "metabolites": sorted(
+            (m.id, m.name, m.compartment, m.formula, str(m.charge))
+            for m in model.metabolites
+        ),
+        "genes": sorted(g.id for g in model.genes),
+    }
+
+
+class TestAnticreation:
+    def test_supermodel(self):
+        supermodel = get_supermodel()
+        assert supermodel.reactions.assembly["GLCt"].lower_bound["assembly"] == [
+            -1000.0
+        ]
+        assert supermodel.reactions.assembly["GLCt"].gene_reaction_rule["assembly"] == [
+            "g1 or g2"
+        ]
+        assert list(supermodel.reactions.C) == [
+            "EX_glc__D_e",
+            "EX_nh4_e",
+            "NH4t",
+            "HEX1",
+            "ATPM",
+            "XR",
+            "Biomass",
+        ]
+
+    def test_levels_matrices(self, tmp_path):
+        supermodel = get_supermodel()
+        matrices = get_levels_matrices(supermodel)
+        assert matrices["metabolites"] == list(supermodel.metabolites.assembly)
+        assert matrices["reactions"] == list(supermodel.reactions.assembly)
+        assert list(matrices["levels"]) == ["A", "B", "C", "core3", "core2", "assembly"]
+
+        # Matrices are the same after writing and reading them
+        write_levels_matrices(supermodel, tmp_path / "levels.npz")
+        read_matrices = read_levels_matrices(tmp_path / "levels.npz")
+        assert read_matrices["metabolites"] == matrices["metabolites"]
+        assert read_matrices["reactions"] == matrices["reactions"]
+        assert list(read_matrices["levels"]) == list(matrices["levels"])
+        for level, level_matrices in matrices["levels"].items():
+            read_level = read_matrices["levels"][level]
+            assert read_level["S"].shape == level_matrices["S"].shape
+            assert (read_level["S"] != level_matrices["S"]).nnz == 0
+            for attr in ["reactions", "lower_bound", "upper_bound"]:
+                numpy.testing.assert_array_equal(read_level[attr], level_matrices[attr])
+            assert read_level["gene_reaction_rule"] == (
+                level_matrices["gene_reaction_rule"]
+            )
+
+        # Level is the same as model of interest without curation
+        for level in ["A", "C", "core2", "assembly"]:
+            model = get_model_of_interest(
+                supermodel,
+                level,
+                simple_biomass_products=False,
+                extend_zero_bounds=False,
+                gapfill_transport=False,
+                do_balance=False,
+            )
+            level_matrices = matrices["levels"][level]
+            r_index = [matrices["reactions"].index(r.id) for r in model.reactions]
+            m_index = [matrices["metabolites"].index(m.id) for m in model.metabolites]
+            assert sorted(r_index) == list(
+                numpy.flatnonzero(level_matrices["reactions"])
+            )
+            numpy.testing.assert_array_equal(
+                level_matrices["S"][m_index][:, r_index].toarray(),
+                create_stoichiometric_matrix(model),
+            )
+            assert level_matrices["S"][:, r_index].nnz == (
+                level_matrices["S"][m_index][:, r_index].nnz
+            )
+            for attr in ["lower_bound", "upper_bound"]:
+                numpy.testing.assert_array_equal(
+                    level_matrices[attr][r_index],
+                    [getattr(r, attr) for r in model.reactions],
+                )
+            assert [level_matrices["gene_reaction_rule"][j] for j in r_index] == [
+                r.gene_reaction_rule for r in model.reactions
+            ]
+
+    @pytest.mark.parametrize(
+        "metabolites",
+        [
+            {"glc__D_c": -1, "atp_c": -1, "g6p_c": 1, "adp_c": 1, "h_c": 1},
+            # zero coefficients
+            {"glc__D_c": -1, "atp_c": -1, "g6p_c": 1, "adp_c": 1, "h_c": 1, "pi_c": 0},
+            # charge imbalance
+            {"glc__D_c": -1, "atp_c": -1, "g6p_c": 1, "adp_c": 1},
+            # mass imbalance
+            {"glc__D_e": -1, "g6p_c": 1},
+            {"glc__D_c": -2, "h_c": 0.5},
+            # nan charges
+            {"q8_c": -1, "h_c": -2, "q8h2_c": 1},
+            {"q8h2_c": 1},
+            # not parsed formula
+            {"x_c": -1, "g6p_c": 1},
+            {"x_c": 0, "g6p_c": 1},
+        ],
+    )
+    def test_mass_balance(self, metabolites):
+        supermodel = get_supermodel()
+        mass_balance = MassBalance(supermodel)
+        metabolites = {
+            supermodel.metabolites.assembly[met_id]: k
+            for met_id, k in metabolites.items()
+        }
+        try:
+            expected = check_cobra_mass_balance(metabolites)
+        except ValueError as error:
+            with pytest.raises(ValueError, match=str(error)):
+                mass_balance.check_mass_balance(metabolites)
+        else:
+            assert_same_balance(mass_balance.check_mass_balance(metabolites), expected)
+
+    @pytest.mark.parametrize("level", SOURCES + ["assembly", "core2", "core3"])
+    def test_level_mass_balance(self, level):
+        supermodel = get_supermodel()
+        mass_balance = MassBalance(supermodel)
+        if level.startswith("core"):
+            level = ComparisonView(supermodel, "core", core_size=int(level[-1]))
+            reactions = {
+                r: level.get(r, "metabolites") for r in level.reactions.values()
+            }
+        else:
+            reactions = {
+                r: r.metabolites[level]
+                for r in getattr(supermodel.reactions, level).values()
+            }
+        for r, metabolites in reactions.items():
+            try:
+                expected = check_cobra_mass_balance(metabolites)
+            except ValueError as error:
+                with pytest.raises(ValueError, match=str(error)):
+                    mass_balance.get_balance(r, level)
+            else:
+                assert_same_balance(mass_balance.get_balance(r, level), expected)
+
+    def test_models_with_all_confidence_levels(self, tmp_path, capsys):
+        supermodel = get_supermodel()
+        xr = supermodel.reactions.assembly["XR"]
+        models = {}
+        written = {}
+        for n_jobs in [1, 2]:
+            output_dir = tmp_path / str(n_jobs)
+            models[n_jobs] = get_models_with_all_confidence_levels(
+                supermodel, output_dir, reactions_exclude=[xr], n_jobs=n_jobs
+            )
+            written[n_jobs] = {
+                path.name: path.read_text() for path in output_dir.iterdir()
+            }
+            # validation reports are printed in the order of levels
+            printed = capsys.readouterr().out
+            assert printed.count("SBML_ERROR") == len(models[n_jobs])
+
+        # Models are the same with and without worker processes. Models of
+        # workers are read from written files, so coefficients are floats.
+        assert list(models[1]) == list(models[2])
+        for level, model in models[1].items():
+            assert [
+                (
+                    r.id,
+                    sorted((m.id, float(k)) for m, k in r.metabolites.items()),
+                    r.bounds,
+                    r.gene_reaction_rule,
+                )
+                for r in model.reactions
+            ] == [
+                (
+                    r.id,
+                    sorted((m.id, k) for m, k in r.metabolites.items()),
+                    r.bounds,
+                    r.gene_reaction_rule,
+                )
+                for r in models[2][level].reactions
+            ]
+        assert written[1] == written[2]
+        assert sorted(written[1]) == sorted(level + ".xml" for level in models[1])
+
+    @pytest.mark.parametrize("level", SOURCES + ["core3", "core2", "assembly"])
+    def test_model_builder(self, level):
+        supermodel = get_supermodel()
+        model = get_model_of_interest(
+            supermodel,
+            level,
+            extend_zero_bounds=False,
+            gapfill_transport=False,
+            do_balance=False,
+        )
+        model.remove_reactions(["Biomass"], remove_orphans=True)
+        assert get_model_summary(model) == get_model_summary(
+            get_model_one_by_one(supermodel, level)
+        )
+
+    def test_gapfill_transport(self):
+        supermodel = get_supermodel()
+        gapfilled = {}
+        for level in SOURCES + ["core3", "core2", "assembly"]:
+            model = get_model_of_interest(
+                supermodel, level, gapfill_transport=False, do_balance=False
+            )
+            model_one_by_one = model.copy()
+            level_reactions = [r.id for r in model.reactions]
+            gapfill_transport_r(model, supermodel)
+            gapfill_transport_r_one_by_one(model_one_by_one, supermodel)
+            assert get_model_summary(model) == get_model_summary(model_one_by_one)
+            gapfilled[level] = sorted(
+                r.id for r in model.reactions if r.id not in level_reactions
+            )
+        assert gapfilled == {
+            "A": ["NH4t"],
+            "B": ["NH4t"],
+            "C": ["GLCt"],
+            "core3": ["GLCt", "NH4t"],
+            "core2": ["NH4t"],
+            "assembly": [],
+        }
+
+    def test_saved_level_views(self):
+        supermodel = get_supermodel()
+        supermodel.at_least_in(2, and_as_solid=True)
+        supermodel.present(yes=["A"], no=["C"])
+        atpm = supermodel.reactions.assembly["ATPM"]
+        assert atpm.gene_reaction_rule["comparison"]["core2"] == []
+
+        # Saved levels keep sources and and_as_solid, views are taken from the
+        # bounded cache of comparison views and calculated again lazily
+        core2 = supermodel.get_level_view("core2")
+        assert core2.and_as_solid
+        assert core2 is supermodel.get_comparison_view("core", 2, and_as_solid=True)
+        assert core2.get(atpm, "gene_reaction_rule") == []
+        assert supermodel.get_level_view("core2", and_as_solid=False) is core2
+        present = supermodel.get_level_view("Yes_A_No_C")
+        assert (present.yes, present.no) == (["A"], ["C"])
+        assert present is supermodel.get_level_view("Yes_A_No_C")
+
+        # Views used for saving are not kept in supermodel
+        supermodel.exactly_in(1)
+        gc.collect()
+        assert not [
+            x
+            for x in gc.get_objects()
+            if isinstance(x, ComparisonView) and x.name == "In1"
+        ]
+        assert "In1" in supermodel.reactions.comparison
+
+        # Levels saved only in elements are read from them
+        supermodel._saved_levels.clear()
+        assert isinstance(supermodel.get_level_view("core2"), StoredComparisonView)
@@ -0,0 +1,259 @@
+import gc
+import itertools
+import operator
+import weakref
+from collections import defaultdict
+
+import numpy
+import pytest
+from scipy.stats import mode
+
+from gemsembler.comparison import (
+    ComparisonView,
+    CoreBounds,
+    SourceIndex,
+    StoredComparisonView,
+    getCoreCoefficients,
+    getCoreGPR,
+    getCoreLowerBounds,
+    getCoreUpperBounds,
+    getDifConnections,
+    getDifferenceName,
+    getDifferenceSources,
+    getGPRClauseSupport,
+    getModesMeanByCounting,
+    writeComparisonView,
+)
+
+
+class TestComparison:
+    def test_core_gpr(self):
+        gprs = {
+            "A": ["(a and b) or c"],
+            "B": ["(a and b and d)"],
+            "C": ["c or (a and e)"],
+            "D": [],
+        }
+        sources = list(gprs.keys())
+        expected = {
+            1: ["(a and b and d) or (a and b) or (a and e) or c"],
+            2: ["(a and b) or c"],
+            3: ["a"],
+            4: [],
+        }
+        for core_size, core_gpr in expected.items():
+            assert getCoreGPR(gprs, core_size, operator.ge, sources, False) == core_gpr
+            assert getCoreGPR(gprs, core_size, operator.eq, sources, False) == core_gpr
+        assert getCoreGPR(gprs, 2, operator.ge, sources, True) == ["c"]
+        assert getCoreGPR(gprs, 5, operator.ge, sources, False) == []
+
+        # Support of gene sets is counted once per reaction
+        original_clauses, support = getGPRClauseSupport(
+            ("(a and b) or c", "(a and b and d)", "c or (a and e)", None)
+        )
+        assert frozenset(["a", "b"]) in original_clauses
+        assert dict(support)[frozenset(["a"])] == 3
+
+    def test_core_coefficients(self):
+        metabolites = {
+            "A": {"m1": -1.0, "m2": 1.0},
+            "B": {"m1": -2.0, "m2": 2.0},
+            "C": {"m1": -2.0, "m2": 0},
+            "D": {"m1": -1.0},
+        }
+        sources = list(metabolites.keys())
+        for core_size in range(1, 5):
+            core_metabolites = getCoreCoefficients(
+                metabolites, {"c": ["m1"]}, {"c": ["m2"]}, "c", core_size, sources
+            )
+            # the same as mean of modes for all combinations one by one
+            for met, k in core_metabolites.items():
+                k_mean = []
+                for combination in itertools.combinations(sources, core_size):
+                    k_mod = [
+                        metabolites[c][met]
+                        for c in combination
+                        if metabolites[c].get(met)
+                    ]
+                    if k_mod:
+                        k_mean.append(mode(k_mod, keepdims=False)[0])
+                assert k == numpy.mean(k_mean)
+        assert core_metabolites == {"m1": -2.0, "m2": 1.0}
+
+        # counting combinations gives the same mean as enumerating them
+        assert getModesMeanByCounting([-1.0, -2.0, -2.0, -1.0], 4, 2) == -11 / 6
+        assert getModesMeanByCounting([1.0, 2.0], 4, 3) == 1.25
+        assert numpy.isnan(getModesMeanByCounting([], 4, 2))
+
+    def test_core_bounds(self):
+        class Reaction:
+            def __init__(self, lower_bound, upper_bound):
+                self.lower_bound = {s: [b] for s, b in lower_bound.items()}
+                self.upper_bound = {s: [b] for s, b in upper_bound.items()}
+                self.in_models = {"models_list": list(lower_bound.keys())}
+
+        reactions = {
+            "r1": Reaction(
+                {"A": -1000.0, "B": -5.0, "C": 0.0}, {"A": 1000.0, "B": 5.0, "C": 0.0}
+            ),
+            "r2": Reaction({"A": -2000.0, "B": -10.0}, {"A": 2000.0, "B": -10.0}),
+            "r3": Reaction({"C": 3.0}, {"C": 3.0}),
+        }
+        expected = {
+            1: {"r1": ([-1000], [1000]), "r2": ([-1000], [1000]), "r3": ([0], [3.0])},
+            2: {"r1": ([-5.0], [5.0]), "r2": ([-10.0], [0]), "r3": ([], [])},
+            3: {"r1": ([0], [0]), "r2": ([], []), "r3": ([], [])},
+            4: {"r1": ([], []), "r2": ([], []), "r3": ([], [])},
+        }
+        core_bounds = CoreBounds(reactions)
+        for core_size, bounds in expected.items():
+            assert core_bounds.getBounds(core_size) == bounds
+            # the same as for reactions one by one
+            for r_id, r in reactions.items():
+                sources = r.in_models["models_list"]
+                assert bounds[r_id] == (
+                    getCoreLowerBounds(r.lower_bound, core_size, sources),
+                    getCoreUpperBounds(r.upper_bound, core_size, sources),
+                )
+
+    def test_comparison_view(self):
+        class Element:
+            def __init__(self, element_id, sources, **attributes):
+                self.id = element_id
+                self.sources = {s: int(s in sources) for s in "ABC"}
+                self.in_models = {
+                    "models_list": sources,
+                    "models_amount": len(sources),
+                }
+                for attr, values in attributes.items():
+                    setattr(self, attr, values | {"comparison": {}})
+
+        class Elements:
+            def __init__(self, elements):
+                self.assembly = {e.id: e for e in elements}
+                self.comparison = defaultdict(dict)
+
+        class Supermodel:
+            def __init__(self):
+                self.sources = ["A", "B", "C"]
+                self.m1 = Element("m1", ["A", "B", "C"], reactions={})
+                self.m2 = Element("m2", ["A", "B"], reactions={})
+                bounds = {"A": [-1000.0], "B": [0.0], "C": [-10.0]}
+                self.r1 = Element(
+                    "r1",
+                    ["A", "B", "C"],
+                    reactants={"A": [self.m1], "B": [self.m1], "C": [self.m1]},
+                    products={"A": [self.m2], "B": [self.m2], "C": []},
+                    genes={"A": [], "B": [], "C": []},
+                    gene_reaction_rule={"A": ["a or b"], "B": ["a"], "C": []},
+                    lower_bound=bounds,
+                    upper_bound={s: [1000.0] for s in bounds.keys()},
+                    metabolites={
+                        "A": {self.m1: -1.0, self.m2: 1.0},
+                        "B": {self.m1: -2.0, self.m2: 2.0},
+                        "C": {self.m1: -2.0},
+                    },
+                )
+                for m in [self.m1, self.m2]:
+                    m.reactions.update(
+                        {s: [self.r1] for s in m.in_models["models_list"]}
+                    )
+                    m.reactions.update({s: [] for s in "ABC" if s not in m.reactions})
+                self.metabolites = Elements([self.m1, self.m2])
+                self.reactions = Elements([self.r1])
+                self.genes = Elements([])
+
+        supermodel = Supermodel()
+        core2 = ComparisonView(supermodel, "core", core_size=2)
+        assert core2.name == "core2"
+        assert list(core2.metabolites) == ["m1", "m2"]
+        assert core2.get(supermodel.r1, "products") == [supermodel.m2]
+        assert core2.get(supermodel.r1, "gene_reaction_rule") == ["a"]
+        assert core2.get(supermodel.r1, "lower_bound") == [-10.0]
+        assert core2.get(supermodel.r1, "metabolites") == {
+            supermodel.m1: -2.0,
+            supermodel.m2: 4 / 3,
+        }
+        in3 = ComparisonView(supermodel, "in", core_size=3)
+        assert list(in3.metabolites) == ["m1"]
+        present = ComparisonView(supermodel, "present", no=["C"], short_name_len=1)
+        assert present.name == "No_C"
+        assert list(present.metabolites) == ["m2"]
+        assert present.reactions == {}
+        assert present.get(supermodel.m2, "reactions") == [supermodel.r1]
+        assert present.get(supermodel.r1, "gene_reaction_rule") == []
+
+        # Supermodel is not changed and not kept in memory by views
+        assert supermodel.r1.reactants["comparison"] == {}
+        assert supermodel.reactions.comparison == {}
+
+        # Saved levels are read back with the same interface
+        with pytest.raises(ValueError):
+            StoredComparisonView(supermodel, "core2")
+        writeComparisonView(supermodel, core2)
+        stored = StoredComparisonView(supermodel, "core2")
+        assert list(stored.reactions) == ["r1"]
+        assert stored.get(supermodel.r1, "lower_bound") == [-10.0]
+        assert stored.get(supermodel.m2, "reactions") == [supermodel.r1]
+        del stored
+
+        supermodel_ref = weakref.ref(supermodel)
+        del supermodel
+        gc.collect()
+        assert supermodel_ref() is None
+        with pytest.raises(ReferenceError):
+            core2.supermodel
+
+    def test_dif_connections(self):
+        class Element:
+            def __init__(self, element_id, **attributes):
+                self.id = element_id
+                for attr, value in attributes.items():
+                    setattr(self, attr, value)
+
+        a, b, c = Element("a"), Element("b"), Element("c")
+        connections = {"A": [a, b, c], "B": [b, c], "C": [c], "D": []}
+        assert getDifConnections(connections, ["A", "B"], ["C"]) == [b]
+        assert getDifConnections(connections, ["A"], ["B", "D"]) == [a]
+        assert getDifConnections(connections, ["D"], []) == []
+
+        source_index = SourceIndex(["D", "C", "B", "A"])
+        element = Element(
+            "r", sources={"A": 1, "B": 2, "C": 0, "D": 0}, reactants=connections
+        )
+        present, absent = source_index.getElementMasks(element)
+        assert source_index.getSources(present) == ["A", "B"]
+        assert present == source_index.getMask(["B", "A"])
+        assert absent == source_index.getMask(["C", "D"])
+        connection_sets = source_index.getConnectionSets(element, "reactants")
+        assert connection_sets["B"] == frozenset(["b", "c"])
+        assert getDifConnections(connections, ["A"], ["B"], connection_sets) == [a]
+
+    def test_difference_sources(self):
+        sources = ["carveme_BU", "gapseq_BU", "agora_BU", "modelseed_BU"]
+        # Names made with other short names are resolved to the same sources
+        for yes, no in [(["carveme_BU"], ["gapseq_BU"]), (["modelseed_BU"], [])]:
+            for nletter in [1, 2, 3, 10]:
+                name = getDifferenceName(yes, no, nletter)
+                assert {
+                    (tuple(y), tuple(n))
+                    for y, n, _ in getDifferenceSources(name, sources)
+                } == {(tuple(yes), tuple(no))}
+        assert getDifferenceSources("No_gm", sources) == [
+            ([], ["gapseq_BU", "modelseed_BU"], 1)
+        ]
+        # Short names of sources in both lists or not in sorted order
+        assert getDifferenceSources("Yes_ca_No_a", sources) == []
+        assert getDifferenceSources("Yes_ca", sources) == [(["carveme_BU"], [], 2)]
+        assert getDifferenceSources("core2", sources) == []
+        # Names, which can be made from different sources
+        variants = getDifferenceSources("Yes_ag", sources)
+        assert {(tuple(y), tuple(n)) for y, n, _ in variants} == {
+            (("agora_BU", "gapseq_BU"), ()),
+            (("agora_BU",), ()),
+        }
+        variants = getDifferenceSources("Yes_ab", ["a", "ab", "b"])
+        assert {(tuple(y), tuple(n)) for y, n, _ in variants} == {
+            (("a", "b"), ()),
+            (("ab",), ()),
+        }
@@ -1,3 +1,4 @@
+import sys
 from importlib.resources import files
 
 from gemsembler import load_sbml_model
@@ -7,6 +8,7 @@ from gemsembler.conversion import (
     ConvCarveme,
     ConvGapseq,
     ConvModelseed,
+    Converted,
 )
 from gemsembler.data import BU
 
@@ -25,14 +27,14 @@ class TestConversion:
 
         # Check the converion of the metabolite
         assert conv_mb.compartments == ["c"]
-        assert conv_mb.highest == ["2dmmq8_c"]
+        assert conv_mb.highest == ("2dmmq8_c",)
         assert conv_mb.level == "annot_and_main"
-        assert conv_mb.annot_and_main == ["2dmmq8_c"]
-        assert conv_mb.annot == []
-        assert conv_mb.main == []
-        assert conv_mb.addit == []
-        assert conv_mb.pattern == []
-        assert conv_mb.no_conv == []
+        assert conv_mb.annot_and_main == ("2dmmq8_c",)
+        assert conv_mb.annot == ()
+        assert conv_mb.main == ()
+        assert conv_mb.addit == ()
+        assert conv_mb.pattern == ()
+        assert conv_mb.no_conv == ()
 
         # Convert a reaction
         reac = model.reactions.get_by_id("ADNCNT3tc")
@@ -40,14 +42,14 @@ class TestConversion:
 
         # Check the converion of the reaction
         assert set(conv_reac.compartments) == {"c", "e"}
-        assert conv_reac.highest == ["ADNt2"]
+        assert conv_reac.highest == ("ADNt2",)
         assert conv_reac.level == "main"
-        assert conv_reac.annot_and_main == []
-        assert conv_reac.annot == []
-        assert conv_reac.main == ["ADNt2"]
-        assert conv_reac.addit == []
-        assert conv_reac.pattern == []
-        assert conv_reac.no_conv == []
+        assert conv_reac.annot_and_main == ()
+        assert conv_reac.annot == ()
+        assert conv_reac.main == ("ADNt2",)
+        assert conv_reac.addit == ()
+        assert conv_reac.pattern == ()
+        assert conv_reac.no_conv == ()
 
         # Convert the whole model and count number of all conversions
         conv_mbs, conv_reacs = conv.convert_model(model).values()
@@ -113,14 +115,14 @@ class TestConversion:
 
         # Check the converion of the metabolite
         assert conv_mb.compartments == ["c"]
-        assert conv_mb.highest == ["2h3oppan_c"]
+        assert conv_mb.highest == ("2h3oppan_c",)
         assert conv_mb.level == "annot_and_main"
-        assert conv_mb.annot_and_main == ["2h3oppan_c"]
+        assert conv_mb.annot_and_main == ("2h3oppan_c",)
         assert set(conv_mb.annot) == set(["2h3opp_c", "hop_c"])
-        assert conv_mb.main == []
-        assert conv_mb.addit == []
-        assert conv_mb.pattern == []
-        assert conv_mb.no_conv == []
+        assert conv_mb.main == ()
+        assert conv_mb.addit == ()
+        assert conv_mb.pattern == ()
+        assert conv_mb.no_conv == ()
 
         # Convert a reaction
         reac = model.reactions.get_by_id("rxn01301_c0")
@@ -128,14 +130,14 @@ class TestConversion:
 
         # Check the converion of the reaction
         assert conv_reac.compartments == ["c"]
-        assert conv_reac.highest == ["HSDxi"]
+        assert conv_reac.highest == ("HSDxi",)
         assert conv_reac.level == "annot_and_main"
-        assert conv_reac.annot_and_main == ["HSDxi"]
-        assert conv_reac.annot == []
-        assert conv_reac.main == []
+        assert conv_reac.annot_and_main == ("HSDxi",)
+        assert conv_reac.annot == ()
+        assert conv_reac.main == ()
         assert set(conv_reac.addit) == {"HSDH_h", "HSDH_m"}
-        assert conv_reac.pattern == []
-        assert conv_reac.no_conv == []
+        assert conv_reac.pattern == ()
+        assert conv_reac.no_conv == ()
 
         # Convert the whole model and count number of all conversions
         conv_mbs, conv_reacs = conv.convert_model(model).values()
@@ -203,12 +205,12 @@ class TestConversion:
         assert conv_mb.compartments == ["e"]
         assert set(conv_mb.highest) == set(["nh4_e", "nh3_e"])
         assert conv_mb.level == "main"
-        assert conv_mb.annot_and_main == []
-        assert conv_mb.annot == []
+        assert conv_mb.annot_and_main == ()
+        assert conv_mb.annot == ()
         assert set(conv_mb.main) == set(["nh4_e", "nh3_e"])
-        assert conv_mb.addit == []
-        assert conv_mb.pattern == []
-        assert conv_mb.no_conv == []
+        assert conv_mb.addit == ()
+        assert conv_mb.pattern == ()
+        assert conv_mb.no_conv == ()
 
         # Convert a reaction
         reac = model.reactions.get_by_id("rxn03108_c0")
@@ -216,14 +218,14 @@ class TestConversion:
 
         # Check the converion of the reaction
         assert conv_reac.compartments == ["c"]
-        assert conv_reac.highest == ["PMPK"]
+        assert conv_reac.highest == ("PMPK",)
         assert conv_reac.level == "main"
-        assert conv_reac.annot_and_main == []
-        assert conv_reac.annot == []
-        assert conv_reac.main == ["PMPK"]
-        assert conv_reac.addit == ["PMPK_h"]
-        assert conv_reac.pattern == []
-        assert conv_reac.no_conv == []
+        assert conv_reac.annot_and_main == ()
+        assert conv_reac.annot == ()
+        assert conv_reac.main == ("PMPK",)
+        assert conv_reac.addit == ("PMPK_h",)
+        assert conv_reac.pattern == ()
+        assert conv_reac.no_conv == ()
 
         # Convert the whole model and count number of all conversions
         conv_mbs, conv_reacs = conv.convert_model(model).values()
@@ -289,14 +291,14 @@ class TestConversion:
 
         # Check the converion of the metabolite
         assert conv_mb.compartments == ["c"]
-        assert conv_mb.highest == ["dhlam_c"]
+        assert conv_mb.highest == ("dhlam_c",)
         assert conv_mb.level == "main"
-        assert conv_mb.annot_and_main == []
-        assert conv_mb.annot == []
-        assert conv_mb.main == ["dhlam_c"]
-        assert conv_mb.addit == []
-        assert conv_mb.pattern == []
-        assert conv_mb.no_conv == []
+        assert conv_mb.annot_and_main == ()
+        assert conv_mb.annot == ()
+        assert conv_mb.main == ("dhlam_c",)
+        assert conv_mb.addit == ()
+        assert conv_mb.pattern == ()
+        assert conv_mb.no_conv == ()
 
         # Convert a reaction
         reac = model.reactions.get_by_id("AACPS3")
@@ -304,14 +306,14 @@ class TestConversion:
 
         # Check the converion of the reaction
         assert conv_reac.compartments == ["c"]
-        assert conv_reac.highest == ["AACPS3"]
+        assert conv_reac.highest == ("AACPS3",)
         assert conv_reac.level == "main"
-        assert conv_reac.annot_and_main == []
-        assert conv_reac.annot == []
-        assert conv_reac.main == ["AACPS3"]
-        assert conv_reac.addit == []
-        assert conv_reac.pattern == []
-        assert conv_reac.no_conv == []
+        assert conv_reac.annot_and_main == ()
+        assert conv_reac.annot == ()
+        assert conv_reac.main == ("AACPS3",)
+        assert conv_reac.addit == ()
+        assert conv_reac.pattern == ()
+        assert conv_reac.no_conv == ()
 
         # Convert the whole model and count number of all conversions
         conv_mbs, conv_reacs = conv.convert_model(model).values()
@@ -363,3 +365,29 @@ class TestConversion:
 
         num_no_conv = sum([len(x.no_conv) for x in conv_reacs.values()])
         assert num_no_conv == 0
+
+    def test_converted(self):
+        check_db = {"a", "b", "c", "d"}
+        conv = Converted(
+            check_db, ["c"], annot=["a", "x"], main=["a", "b"], addit=["b", "d"]
+        )
+
+        # Prioritised levels with compartment suffix
+        assert conv.level == "annot_and_main"
+        assert conv.highest == ("a_c",)
+        assert conv.annot == ()
+        assert conv.main == ("b_c",)
+        assert conv.addit == ("d_c",)
+        assert conv.no_conv == ()
+
+        # Ids are stored once without compartment suffix
+        assert not hasattr(conv, "__dict__")
+        assert conv._levels[2] == ("b",)
+
+        # Suffixed ids are interned and cached at first access
+        assert conv.main is conv.main
+        assert conv.main[0] is sys.intern("b_c")
+
+        conv = Converted(check_db, ["c", "e"], main=["x"], metabolite=False)
+        assert conv.level == "no_conv"
+        assert conv.highest == ()
@@ -1,8 +1,9 @@
 from importlib.resources import files
 
+import pytest
 from cobra.core.model import Model
 
-from gemsembler import GatheredModels
+from gemsembler import GatheredModels, bu_example
 from gemsembler.conversion import (
     ConvAgora,
     ConvBase,
@@ -11,6 +12,7 @@ from gemsembler.conversion import (
     ConvModelseed,
 )
 from gemsembler.data import BU
+from gemsembler.gathering import ModelCache, load_sbml_model, model_cache
 
 
 class TestGathering:
@@ -96,3 +98,96 @@ class TestGathering:
         }
         # TODO: finish the tests for gathered models
         g.run()
+
+    def test_add_models_parallel(self):
+        g = GatheredModels()
+        g.add_models_and_run(bu_example, n_jobs=2)
+
+        # Models are added in the order of the list
+        assert list(g.get_model_attrs().keys()) == [x["model_id"] for x in bu_example]
+        model_attrs = g.get_model_attrs("carveme_BU")
+        assert len(model_attrs["preprocess_model"].reactions) == 1849
+        assert len(g.first_stage_selected_reactions["carveme_BU"]) == 1849
+
+        # Repeated model ids are checked before loading
+        with pytest.raises(AssertionError):
+            GatheredModels().add_models_and_run(bu_example + bu_example[:1], n_jobs=2)
+
+    def test_model_cache(self, tmp_path):
+        path_to_model = files(BU) / "BU_carveme_hom.xml.gz"
+        content_hash = ModelCache.get_hash(path_to_model)
+
+        cache = ModelCache(maxsize=1, path_to_cache=tmp_path)
+        assert cache.get(content_hash) is None
+        # Models are not cached by default
+        cache_info = model_cache.cache_info()
+        cache.set(content_hash, load_sbml_model(path_to_model))
+        assert model_cache.cache_info() == cache_info
+
+        # Every read returns a new copy of the model
+        model1 = cache.get(content_hash)
+        model2 = cache.get(content_hash)
+        assert model1 is not model2
+        assert len(model1.reactions) == 1849
+        assert cache.cache_info()["memory_hits"] == 2
+
+        # Model is read from disk by other cache object
+        other_cache = ModelCache(path_to_cache=tmp_path)
+        assert len(other_cache.get(content_hash).reactions) == 1849
+        assert other_cache.cache_info()["disk_hits"] == 1
+        assert other_cache.cache_info()["misses"] == 0
+
+        # In-memory part of the cache is bounded
+        cache.set("other", model1)
+        assert cache.cache_info()["memory_size"] == 1
+
+        # Disk part of the cache is bounded too
+        small_cache = ModelCache(path_to_cache=tmp_path / "small", disk_maxsize=1)
+        small_cache.set(content_hash, model1)
+        small_cache.set("other", model1)
+        assert len(list((tmp_path / "small").glob("model_*.pkl"))) == 1
+        assert ModelCache(path_to_cache=tmp_path / "small").get("other") is not None
+
+    def test_read_only_views(self):
+        g = GatheredModels()
+        g.add_model("test_carveme", files(BU) / "BU_carveme_hom.xml.gz", "carveme")
+
+        # Views can't be modified, copies are independent from GatheredModels
+        conf = g.get_conf("carveme")
+        with pytest.raises(TypeError):
+            conf["remove_b"] = True
+        conf_copy = g.get_conf("carveme", copy=True)
+        conf_copy["remove_b"] = True
+        assert g.get_conf("carveme")["remove_b"] == False
+
+        model_attrs = g.get_model_attrs("test_carveme")
+        with pytest.raises(TypeError):
+            model_attrs["model_type"] = "agora"
+        with pytest.raises(TypeError):
+            g.get_model_attrs()["test_carveme"]["model_type"] = "agora"
+        assert g.get_model_attrs("missing_model") is None
+
+        # Without preprocessing original model is not copied
+        assert model_attrs["original_model"] is model_attrs["preprocess_model"]
+        model_copy = g.get_model_attrs("test_carveme", "preprocess_model", copy=True)
+        assert model_copy is not model_attrs["preprocess_model"]
+
+    def test_model_index(self):
+        g = GatheredModels()
+        g.add_model("test_modelseed", files(BU) / "BU_modelSEED.sbml.gz", "modelseed")
+        model_attrs = g.get_model_attrs("test_modelseed")
+        model = model_attrs["preprocess_model"]
+        model_index = model_attrs["model_index"]
+
+        # Index is made once for the preprocessed model
+        assert model_index["duplicated_reactions"] == set(
+            model_attrs["duplicated_reactions"]["ID"]
+        )
+        assert len(model_index["reaction_metabolites"]) == len(model.reactions)
+        r = model.reactions[0]
+        assert model_index["reaction_metabolites"][r.id] == (
+            [m.id for m in r.reactants],
+            [m.id for m in r.products],
+        )
+        m = model.metabolites[0]
+        assert model_index["metabolite_reactions"][m.id] == len(m.reactions)
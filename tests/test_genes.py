@@ -0,0 +1,206 @@
+import gzip
+import os
+import stat
+import sys
+
+import pandas as pd
+import pytest
+
+from gemsembler.genes import (
+    BlastCache,
+    FastaIndex,
+    check_nt_or_aa,
+    get_file_hash,
+    get_genome,
+    get_locus_tag_genes,
+    get_sequence_index,
+    match_exact_sequences,
+    run_commands,
+    split_threads,
+    read_fasta,
+    write_blast_results,
+)
+
+STUB_BLAST = f"""#!{sys.executable}
+import sys
+args = sys.argv[1:]
+print("stub", *args)
+if "-out" in args:
+    with open(args[args.index("-out") + 1], "w") as out_file:
+        out_file.write("query\\tsubject\\n")
+sys.exit(1 if "-fail" in args else 0)
+"""
+
+
+@pytest.fixture
+def stub_env(tmp_path):
+    # Stub BLAST executables, which only write their arguments and output file
+    bin_path = tmp_path / "bin"
+    bin_path.mkdir()
+    for program in ["makeblastdb", "blastp"]:
+        stub = bin_path / program
+        stub.write_text(STUB_BLAST)
+        stub.chmod(stub.stat().st_mode | stat.S_IEXEC)
+    env = os.environ.copy()
+    env["PATH"] = f"{bin_path}{os.pathsep}{env['PATH']}"
+    return env
+
+
+class TestGenes:
+    def test_split_threads(self):
+        assert split_threads(10, 4) == (4, 1)
+        assert split_threads(2, 8) == (2, 4)
+        assert split_threads(3, 8) == (3, 2)
+        assert split_threads(0, 8) == (1, 8)
+        n_workers, n_threads = split_threads(5)
+        assert n_workers * n_threads <= os.cpu_count()
+
+    @pytest.mark.skipif(sys.platform == "win32", reason="stub needs shebang")
+    def test_run_commands(self, tmp_path, stub_env):
+        commands = {
+            f"blastp_model{i}": [
+                "blastp",
+                "-query",
+                tmp_path / "genes with space.faa",
+                "-out",
+                tmp_path / f"model{i}_blast.tsv",
+                "-num_threads",
+                2,
+            ]
+            for i in range(3)
+        }
+        logs = run_commands(commands, tmp_path, 2, stub_env)
+
+        # Every job has its own log and arguments are passed without shell
+        assert list(logs.keys()) == list(commands.keys())
+        for i in range(3):
+            assert (tmp_path / f"model{i}_blast.tsv").exists()
+            log = logs[f"blastp_model{i}"].read_text()
+            assert "genes with space.faa" in log
+            assert "-num_threads 2" in log
+
+        # Failed job raises error with its output
+        with pytest.raises(OSError, match="stub -fail"):
+            run_commands(
+                {"makeblastdb": ["makeblastdb", "-fail"]}, tmp_path, 1, stub_env
+            )
+        with pytest.raises(OSError, match="not found"):
+            run_commands({"blastx": ["blastx"]}, tmp_path, 1, {"PATH": ""})
+
+    def test_blast_cache(self, tmp_path):
+        query = tmp_path / "genes.faa"
+        query.write_text(">g1\nMKV\n")
+        target = tmp_path / "genome.faa"
+        target.write_text(">t1\nMKV\n")
+        out_blast_file = tmp_path / "model_blast.tsv"
+        out_blast_file.write_text("g1\tt1\n")
+
+        cache = BlastCache(tmp_path / "cache")
+        key = BlastCache.get_key(
+            get_file_hash(query), get_file_hash(target), "blastp", "-evalue", 0.001
+        )
+        assert not cache.get(key, tmp_path / "copy_blast.tsv")
+        cache.set(key, out_blast_file)
+
+        # Results are found by other cache object with the same key only
+        other_cache = BlastCache(tmp_path / "cache")
+        assert other_cache.get(key, tmp_path / "copy_blast.tsv")
+        assert (tmp_path / "copy_blast.tsv").read_text() == "g1\tt1\n"
+        assert other_cache.hits == 1
+        other_key = BlastCache.get_key(
+            get_file_hash(query), get_file_hash(target), "blastp", "-evalue", 0.01
+        )
+        assert not other_cache.get(other_key, tmp_path / "copy_blast.tsv")
+        query.write_text(">g1\nMKVL\n")
+        changed_key = BlastCache.get_key(
+            get_file_hash(query), get_file_hash(target), "blastp", "-evalue", 0.001
+        )
+        assert not other_cache.get(changed_key, tmp_path / "copy_blast.tsv")
+        assert other_cache.misses == 2
+
+    def test_exact_matches(self, tmp_path):
+        target = tmp_path / "genome.faa"
+        target.write_text(">t1 protein\nMKV\nLLA*\n>t2\nMAAA\n>t3\nmkvlla\n")
+        query = tmp_path / "genes.faa"
+        query.write_text(">g1\nmkvLLA\n>g2\nMAAC\n>g3\nMAAA\n")
+
+        # Sequences are compared after normalization, first target is used
+        path_remainder = tmp_path / "genes_for_blast.fasta"
+        exact_rows, n_remainder = match_exact_sequences(
+            query, get_sequence_index(target), path_remainder
+        )
+        assert [row[:2] for row in exact_rows] == [["g1", "t1"], ["g3", "t2"]]
+        assert n_remainder == 1
+        assert path_remainder.read_text() == ">g2\nMAAC\n"
+
+        # Exact matches and BLAST results are written in one table
+        path_blast_results = tmp_path / "blast_remainder.tsv"
+        path_blast_results.write_text("g2\tt2\t75.0\t4\t1\t0\t1\t4\t1\t4\t1e-3\t10\n")
+        out_blast_file = tmp_path / "model_blast.tsv"
+        write_blast_results(exact_rows, out_blast_file, path_blast_results)
+        conversion_table = pd.read_csv(out_blast_file, sep="\t", header=None)
+        assert conversion_table.shape == (3, 12)
+        assert conversion_table[0].tolist() == ["g1", "g3", "g2"]
+        assert conversion_table[3].tolist() == [6, 4, 4]
+        # Exact matches have bit score as well
+        assert conversion_table[11].tolist() == [12, 8, 10]
+
+    def test_fasta_readers(self, tmp_path):
+        genome = tmp_path / "genome.fna"
+        genome.write_text(">c1 contig 1\nACGTA\nCGTAC\nGT\n>c2\nTTTTT\nGG\n")
+        genomes = get_genome(genome)
+        assert genomes == {"c1": "ACGTACGTACGT", "c2": "TTTTTGG"}
+
+        # Indexed reader gives the same slices without loading sequences
+        with FastaIndex(genome) as fasta_index:
+            assert "c1" in fasta_index and "c3" not in fasta_index
+            for seq_id, sequence in genomes.items():
+                for start in range(-2, 14):
+                    for end in range(-2, 14):
+                        assert fasta_index.get(seq_id)[start:end] == sequence[start:end]
+
+        # Lines of different width can't be indexed
+        genome.write_text(">c1\nACG\nACGTA\n")
+        with pytest.raises(ValueError):
+            FastaIndex(genome)
+
+        # Amino acids are searched in sample of sequences
+        proteins = tmp_path / "proteins.faa"
+        proteins.write_text(">p1\n" + "ACGT" * 10 + "\n>p2\nMKL\n")
+        assert check_nt_or_aa(proteins)
+        assert not check_nt_or_aa(proteins, sample_size=20)
+        assert not check_nt_or_aa(genome)
+
+    def test_locus_tag_genes(self, tmp_path):
+        with gzip.open(tmp_path / "cds.fna.gz", "wt") as cds:
+            cds.write(">lcl|cds_1 [locus_tag=LT_1] [protein_id=WP_1.1]\nATG\nAAA\n")
+            cds.write(">lcl|cds_2 [locus_tag=LT_2] [protein_id=WP_2.1]\nATGCCC\n")
+        with gzip.open(tmp_path / "protein.faa.gz", "wt") as proteins:
+            proteins.write(">WP_1.1 protein\nMK\n>WP_2.1 protein\nMP\n")
+        pd.DataFrame(
+            [
+                ["gene", "LT_1", None, "old_locus_tag=OLD_1a,OLD_1b"],
+                ["CDS", "LT_1", "WP_1.1", None],
+                ["gene", "LT_2", None, None],
+                ["CDS", "LT_2", "WP_2.1", None],
+            ],
+            columns=["# feature", "locus_tag", "product_accession", "attributes"],
+        ).to_csv(tmp_path / "feature_table.txt.gz", sep="\t", index=False)
+
+        for do_old_locus_tag, ids in [
+            (True, ["OLD_1a", "OLD_1b", "LT_2"]),
+            (False, ["LT_1", "LT_2"]),
+        ]:
+            get_locus_tag_genes(
+                tmp_path / "cds.fna.gz",
+                tmp_path / "protein.faa.gz",
+                tmp_path / "feature_table.txt.gz",
+                tmp_path / "final_nt.fna",
+                tmp_path / "final_aa.faa",
+                do_old_locus_tag,
+            )
+            final_nt = list(read_fasta(tmp_path / "final_nt.fna"))
+            final_aa = list(read_fasta(tmp_path / "final_aa.faa"))
+            assert [seq_id for seq_id, _ in final_nt] == ids
+            assert [seq_id for seq_id, _ in final_aa] == ids
+            assert final_nt[0][1] == "ATGAAA" and final_aa[-1][1] == "MP"
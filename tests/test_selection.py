@@ -1,5 +1,11 @@
 from gemsembler import GatheredModels, bu_example
-from gemsembler.selection import run_selection
+from gemsembler.conversion import Converted
+from gemsembler.selection import (
+    STATUS_CHANGED,
+    STATUS_NOT_CONSISTENT,
+    checkDBConsistency,
+    run_selection,
+)
 
 
 class TestSelection:
@@ -55,3 +61,79 @@ class TestSelection:
         assert sel_mb.to_one_id is True
         assert sel_mb.from_many_other_ids == []
         assert sel_mb.in_other_models == {"modelseed_BU": [True, True]}
+
+    def test_consistency_check(self):
+        check_db = {"a", "b", "c"}
+        same_db_models = {"seed": {"m1": "modelseed", "m2": "gapseq", "m3": "gapseq"}}
+        converted = {
+            "m1": {
+                "x": Converted(check_db, ["c"], main=["a", "b"]),
+                "y": Converted(check_db, ["c"], main=["c"]),
+                "z": Converted(check_db, ["c"]),
+            },
+            "m2": {
+                "x": Converted(check_db, ["c"], main=["b", "c"]),
+                "y": Converted(check_db, ["c"], main=["a"]),
+            },
+            "m3": {
+                "x": Converted(check_db, ["c"]),
+                "z": Converted(check_db, ["c"]),
+            },
+        }
+
+        sel = checkDBConsistency(same_db_models, converted, "highest", True)
+        assert list(sel["m1"].keys()) == ["x", "y", "z"]
+        assert list(sel["m3"].keys()) == ["x", "z"]
+
+        # Intersection is done only for not empty conversions
+        assert sel["m1"]["x"].highest_consistent == ["b_c"]
+        assert sel["m1"]["x"].status == STATUS_CHANGED
+        assert sel["m1"]["x"].consistent.startswith("Changed: from ")
+        assert " to b_c. In other models bigg ids were {'m2': " in (
+            sel["m1"]["x"].consistent
+        )
+        assert sel["m2"]["x"].highest_consistent == ["b_c"]
+        assert sel["m3"]["x"].highest_consistent == ["b_c"]
+        assert sel["m1"]["x"].in_other_models == {"m2": [], "m3": []}
+
+        # No intersection
+        assert sel["m2"]["y"].highest_consistent == []
+        assert sel["m2"]["y"].status == STATUS_NOT_CONSISTENT
+        assert sel["m2"]["y"].consistent.startswith("Not consistent")
+        assert sel["m2"]["y"].to_one_id is None
+
+        # Not converted in any model
+        assert sel["m1"]["z"].consistent == "Not converted"
+        assert sel["m1"]["z"].in_other_models == {"m3": []}
+
+    def test_from_one_from_many(self):
+        check_db = {"a", "b"}
+        same_db_models = {
+            "seed": {"m1": "modelseed", "m2": "gapseq"},
+            "bigg": {"m3": "carveme"},
+        }
+        converted = {
+            "m1": {
+                "x": Converted(check_db, ["c"], main=["a"]),
+                "y": Converted(check_db, ["c"], main=["a"]),
+                "z": Converted(check_db, ["c"], main=["b"]),
+            },
+            "m2": {
+                "x": Converted(check_db, ["c"], main=["a"]),
+                "z": Converted(check_db, ["c"], main=["b"]),
+            },
+            "m3": {"a": Converted(check_db, ["c"], main=["a"])},
+        }
+
+        sel = run_selection(same_db_models, converted, "highest")
+        assert sel["m1"]["x"].from_one_id is False
+        assert sel["m1"]["x"].from_many_other_ids == ["y"]
+        assert sel["m1"]["y"].from_many_other_ids == ["x"]
+        assert sel["m1"]["z"].from_one_id is True
+        assert sel["m1"]["z"].from_many_other_ids == []
+        assert sel["m2"]["x"].from_one_id is True
+
+        # Results from other models with the same original id
+        assert sel["m1"]["x"].in_other_models == {"m2": [True, True]}
+        assert sel["m2"]["x"].in_other_models == {"m1": [True, False]}
+        assert sel["m3"]["a"].in_other_models == {}
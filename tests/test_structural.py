@@ -0,0 +1,44 @@
+from gemsembler.selection import Selected
+from gemsembler.structural import (
+    StructuralCache,
+    convertReactionViaNetworkStructure,
+    getNetworkHash,
+    getReactionSignature,
+)
+
+
+class TestStructuralCache:
+    def test_structural_cache(self, tmp_path):
+        # Small BiGG network and selected metabolites converted 1-1
+        bigg_network = {"a_c b_c<->c_c": "R1"}
+        selected_met = {}
+        for orig_id, bigg_id in [("m1", "a_c"), ("m2", "b_c"), ("m3", "c_c")]:
+            selected_met[orig_id] = Selected(["c"], True, [bigg_id])
+            selected_met[orig_id].from_one_id = True
+
+        bigg_r = convertReactionViaNetworkStructure(
+            ["m1", "m2"], ["m3"], selected_met, bigg_network, False
+        )
+        assert bigg_r == {"R1": "Found_via_pure_reaction_equation"}
+
+        # Signature depends on the order of sides and on periplasmic option
+        sig = getReactionSignature(["m1", "m2"], ["m3"], selected_met, False)
+        assert sig == getReactionSignature(["m1", "m2"], ["m3"], selected_met, False)
+        assert sig != getReactionSignature(["m3"], ["m1", "m2"], selected_met, False)
+        assert sig != getReactionSignature(["m1", "m2"], ["m3"], selected_met, True)
+
+        # Results written by one cache object are visible to another one
+        path_to_cache = tmp_path / "structural_cache.sqlite"
+        cache = StructuralCache(bigg_network, path_to_cache)
+        assert cache.get_many([sig]) == {}
+        assert cache.misses == 1
+        cache.set_many({sig: bigg_r})
+
+        other_cache = StructuralCache(bigg_network, path_to_cache)
+        assert other_cache.get_many([sig]) == {sig: bigg_r}
+        assert other_cache.hits == 1
+
+        # Different network does not reuse the results
+        other_network = {"a_c b_c<->c_c": "R2"}
+        assert getNetworkHash(other_network) != getNetworkHash(bigg_network)
+        assert StructuralCache(other_network, path_to_cache).get_many([sig]) == {}